@@ -0,0 +1,75 @@
+# pytest-benchmark suite for the alignment, detection and acquisition hot paths
+#
+# usage:
+#   python -m pytest benchmarks --benchmark-autosave --benchmark-storage=benchmarks/results
+#   python -m pytest benchmarks --benchmark-json=benchmark.json
+#
+# compare against the previous saved run (fail on a 10% mean regression):
+#   python -m pytest benchmarks --benchmark-storage=benchmarks/results --benchmark-compare --benchmark-compare-fail=mean:10%
+#
+# select resolutions with FIBSEM_BENCHMARK_RESOLUTIONS (e.g. FIBSEM_BENCHMARK_RESOLUTIONS=768x512,1536x1024)
+
+import os
+from functools import lru_cache
+
+import pytest
+from autoscript_sdb_microscope_client.structures import AdornedImage, GrabFrameSettings, StagePosition
+
+from fibsem import acquire
+from fibsem.simulator import SimulatedMicroscope, SimulatorSettings
+from fibsem.structures import BeamType
+
+RESOLUTIONS = ["768x512", "1536x1024", "3072x2048", "6144x4096"]
+HFW = 150e-6
+SEED = 0
+
+# shift between the reference and new images (pixels)
+SHIFT_PX = (13, -7)
+
+
+def _resolutions() -> list[str]:
+    resolutions = os.environ.get("FIBSEM_BENCHMARK_RESOLUTIONS")
+    return resolutions.split(",") if resolutions else RESOLUTIONS
+
+
+@lru_cache(maxsize=None)
+def image_pair(resolution: str, beam_type: BeamType = BeamType.ELECTRON) -> tuple[AdornedImage, AdornedImage]:
+    """Fixed synthetic reference and shifted images (from the simulated microscope)"""
+    microscope = SimulatedMicroscope(SimulatorSettings(seed=SEED))
+    beam = microscope.beams.electron_beam if beam_type is BeamType.ELECTRON else microscope.beams.ion_beam
+    beam.horizontal_field_width.value = HFW
+
+    settings = GrabFrameSettings(resolution=resolution, dwell_time=1e-6)
+    ref_image = acquire.acquire_image(microscope, settings, beam_type)
+
+    pixel_size = HFW / int(resolution.split("x")[0])
+    microscope.specimen.stage.relative_move(StagePosition(x=SHIFT_PX[0] * pixel_size, y=SHIFT_PX[1] * pixel_size))
+    new_image = acquire.acquire_image(microscope, settings, beam_type)
+
+    return ref_image, new_image
+
+
+def _copy_image(image: AdornedImage) -> AdornedImage:
+    return AdornedImage(data=image.data.copy(), metadata=image.metadata)
+
+
+@pytest.fixture(scope="session")
+def copy_image():
+    """Copy an image (new image with the same data), so per image caches aren't reused between rounds"""
+    return _copy_image
+
+
+@pytest.fixture(scope="session", params=_resolutions())
+def resolution(request) -> str:
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def images(resolution) -> tuple[AdornedImage, AdornedImage]:
+    return image_pair(resolution)
+
+
+@pytest.fixture(scope="session")
+def shape(resolution) -> tuple[int, int]:
+    width, height = (int(v) for v in resolution.split("x"))
+    return height, width
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fibsem import alignment
+from fibsem.imaging import fft
+
+
+@pytest.mark.parametrize("backend", fft.available_backends())
+def test_crosscorrelation(benchmark, images, backend):
+    ref_image, new_image = images
+
+    benchmark.group = f"crosscorrelation-{ref_image.width}x{ref_image.height}"
+    xcorr = benchmark(alignment.crosscorrelation, ref_image.data, new_image.data, bp=True, backend=backend)
+
+    assert xcorr.shape == ref_image.data.shape
+
+
+@pytest.mark.parametrize("pyramid_levels", [0, 3])
+@pytest.mark.parametrize("subpixel", [None, "parabolic"])
+def test_shift_from_crosscorrelation(benchmark, images, subpixel, pyramid_levels):
+    ref_image, new_image = images
+
+    benchmark.group = f"shift_from_crosscorrelation-{ref_image.width}x{ref_image.height}"
+    dx, dy, _ = benchmark(
+        alignment.shift_from_crosscorrelation, ref_image, new_image, use_rect_mask=True, subpixel=subpixel,
+        pyramid_levels=pyramid_levels,
+    )
+
+    assert dx != 0 and dy != 0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from scipy.spatial import distance
+
+from fibsem.detection import detection
+from fibsem.detection.utils import DetectionFeature, DetectionType
+from fibsem.structures import Point
+
+# closest edge search points (fraction of the image width, height)
+EDGE_POINTS = [(0.25, 0.25), (0.5, 0.5), (0.75, 0.3), (0.1, 0.9)]
+MAX_LOOP_EDGES = 50_000  # the python loop baseline is skipped for larger edge maps
+
+
+def _closest_edge_loop(mask: np.ndarray, landing_pt: Point) -> Point:
+    # original python loop implementation (baseline)
+    min_dst, closest = np.inf, (0, 0)
+    for px in zip(*np.where(mask)):
+        dst = distance.euclidean((landing_pt.y, landing_pt.x), px)
+        if dst < min_dst:
+            min_dst, closest = dst, px
+    return Point(x=closest[1], y=closest[0])
+
+
+CLOSEST_EDGE = {
+    "loop": lambda mask, points: [_closest_edge_loop(mask, pt) for pt in points],
+    "detect_closest_edge_v2": lambda mask, points: [detection.detect_closest_edge_v2(mask, pt) for pt in points],
+    "detect_closest_edges": detection.detect_closest_edges,
+}
+
+
+@pytest.fixture(scope="session")
+def edge_mask(images) -> np.ndarray:
+    ref_image, _ = images
+    return detection.edge_detection(ref_image.data, sigma=3)
+
+
+@pytest.mark.parametrize("det_type", list(DetectionType), ids=lambda t: t.name)
+def test_detect_features(benchmark, images, copy_image, det_type):
+    ref_image, _ = images
+    features = (DetectionFeature(detection_type=det_type, feature_px=None),)
+
+    # a new image each round, so no derived images are reused
+    def setup():
+        return (copy_image(ref_image), ref_image, features), {}
+
+    benchmark.group = f"detect_features-{ref_image.width}x{ref_image.height}"
+    detected = benchmark.pedantic(detection.detect_features, setup=setup, rounds=3, warmup_rounds=1)
+
+    assert detected[0].detection_type is det_type
+
+
+@pytest.mark.parametrize("name", CLOSEST_EDGE)
+def test_closest_edge(benchmark, edge_mask, name):
+    h, w = edge_mask.shape
+    if name == "loop" and edge_mask.sum() > MAX_LOOP_EDGES:
+        pytest.skip(f"python loop baseline is too slow for {int(edge_mask.sum())} edge pixels")
+
+    points = [Point(x=int(fx * w), y=int(fy * h)) for fx, fy in EDGE_POINTS]
+
+    benchmark.group = f"closest_edge-{w}x{h}"
+    closest = benchmark.pedantic(CLOSEST_EDGE[name], args=(edge_mask, points), rounds=3, warmup_rounds=1)
+
+    expected = [detection.detect_closest_edge_v2(edge_mask, pt) for pt in points]
+    assert [(p.x, p.y) for p in closest] == [(p.x, p.y) for p in expected]
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fibsem import acquire
+from fibsem.imaging import utils as image_utils
+from fibsem.structures import GammaSettings
+
+
+def test_cosine_stretch(benchmark, images):
+    ref_image, _ = images
+
+    benchmark.group = f"imaging-{ref_image.width}x{ref_image.height}"
+    stretched = benchmark(image_utils.cosine_stretch, ref_image, tilt_degrees=25)
+
+    assert stretched.data.ndim == 2
+
+
+def test_gamma_correction(benchmark, images):
+    ref_image, _ = images
+
+    benchmark.group = f"imaging-{ref_image.width}x{ref_image.height}"
+    corrected = benchmark(acquire.gamma_correction, ref_image, GammaSettings(enabled=True))
+
+    assert corrected.data.shape == ref_image.data.shape
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fibsem.imaging import masks
+
+LAMELLA_PROTOCOL = {"lamella_width": 10e-6, "lamella_height": 800e-9}
+
+
+def _mask_params(shape: tuple) -> dict:
+    return {"lp": int(max(shape) / 6), "hp": int(max(shape) / 256), "sigma": 6}
+
+
+MASK_BUILDERS = {
+    "bandpass_mask": lambda shape, p: masks.bandpass_mask((shape[1], shape[0]), p["lp"], p["hp"], p["sigma"]),
+    "circ_mask": lambda shape, p: masks.circ_mask((shape[1], shape[0]), p["lp"], p["sigma"]),
+    "create_circle_mask": lambda shape, p: masks.create_circle_mask(shape, p["lp"], p["sigma"]),
+    "create_bandpass_mask": lambda shape, p: masks.create_bandpass_mask(shape, p["lp"], p["hp"], p["sigma"]),
+    "_mask_rectangular": lambda shape, p: masks._mask_rectangular(shape, p["sigma"]),
+    "soft_rect_mask": lambda shape, p: masks.soft_rect_mask(shape, sigma=p["sigma"]),
+    "soft_circle_mask": lambda shape, p: masks.soft_circle_mask(shape, p["lp"], p["sigma"]),
+    "soft_bandpass_mask": lambda shape, p: masks.soft_bandpass_mask(shape, p["lp"], p["hp"], p["sigma"]),
+    "get_bandpass_mask": lambda shape, p: masks.get_bandpass_mask(shape, p["lp"], p["hp"], p["sigma"]),
+    "get_circle_mask": lambda shape, p: masks.get_circle_mask(shape, p["lp"], p["sigma"]),
+    "get_rectangular_mask": lambda shape, p: masks.get_rectangular_mask(shape, p["sigma"]),
+}
+
+
+@pytest.mark.parametrize("name", MASK_BUILDERS)
+def test_mask(benchmark, shape, name):
+    build, params = MASK_BUILDERS[name], _mask_params(shape)
+
+    # the cached builders are timed uncached (i.e. the first call for a shape)
+    benchmark.group = f"masks-{shape[1]}x{shape[0]}"
+    mask = benchmark.pedantic(
+        build, args=(shape, params), setup=masks.clear_mask_cache, rounds=3, warmup_rounds=1
+    )
+
+    assert mask.shape == shape
+
+
+def test_create_rect_mask(benchmark, images):
+    ref_image, _ = images
+
+    benchmark.group = f"masks-{ref_image.width}x{ref_image.height}"
+    mask = benchmark(masks.create_rect_mask, ref_image.data, w=ref_image.width // 2, h=ref_image.height // 4, sigma=3)
+
+    assert mask.shape == ref_image.data.shape
+
+
+@pytest.mark.parametrize("circ", [False, True])
+def test_create_lamella_mask(benchmark, images, circ):
+    ref_image, _ = images
+
+    benchmark.group = f"masks-{ref_image.width}x{ref_image.height}"
+    mask = benchmark.pedantic(
+        masks.create_lamella_mask, args=(ref_image, LAMELLA_PROTOCOL), kwargs={"circ": circ}, rounds=3, warmup_rounds=1
+    )
+
+    assert mask.shape == ref_image.data.shape
@@ -73,13 +73,18 @@ def main():
     # setup milling
     milling.setup_milling(microscope, settings.system.application_file)
 
+    # precompute the reference spectra for beam shift alignment
+    reference_bank = alignment.beam_shift_reference_bank()
+    for lamella_no, lamella in enumerate(sample):
+        reference_bank.add(lamella_no, lamella.reference_image.data, source=lamella.reference_image)
+
     # mill (fiducial, trench, thin, polish)
     for stage_no, milling_dict in enumerate(settings.protocol["lamella"]["protocol_stages"], 1):
         
         logging.info(f"Starting milling stage {stage_no}")
 
         lamella: Lamella
-        for lamella_no, lamella in sample:
+        for lamella_no, lamella in enumerate(sample):
 
             logging.info(f"Starting lamella {lamella_no}")
 
@@ -87,7 +92,10 @@ def main():
             calibration.set_microscope_state(microscope, lamella.state)
 
             # realign
-            alignment.beam_shift_alignment(microscope, settings.image, lamella.reference_image)
+            alignment.beam_shift_alignment(
+                microscope, settings.image, lamella.reference_image,
+                reference_bank=reference_bank, key=lamella_no
+            )
                        
             if stage_no == 0:
                 print("TODO: microexpansion joints")
@@ -101,6 +109,10 @@ def main():
             settings.image.save_path = lamella.path
             settings.image.label = f"ref_mill_stage_{stage_no}"
             lamella.reference_image = acquire.new_image(microscope, settings.image)
+            reference_bank.add(lamella_no, lamella.reference_image.data, source=lamella.reference_image)
+
+        # wait for the stage images to be written (when saving in the background)
+        utils.flush_image_writer()
    
     logging.info(f"Finished autolamella: {settings.protocol['name']}")
 
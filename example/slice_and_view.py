@@ -7,11 +7,10 @@ import logging
 from pprint import pprint
 
 import fibsem
-from fibsem import acquire, milling, utils, alignment
+from fibsem import acquire, milling, utils, alignment, volume
 from fibsem.structures import ImageSettings, MillingSettings
 
 import napari
-import zarr 
 
 
 def main():
@@ -30,9 +29,8 @@ def main():
     settings.image.label = "reference"
     eb_image, ib_image = acquire.take_reference_images(microscope, settings.image)
 
-    # TODO: persistent zarr?
-    # ebz: zarr.Array = zarr.array(eb_image.data)
-    # ibz: zarr.Array = zarr.array(ib_image.data) 
+    # persistent volume store (chunked, compressed)
+    store = volume.VolumeStore(os.path.join(settings.image.save_path, "volume.zarr"))
 
 
     for slice_idx in range(settings.protocol["steps"]):
@@ -53,15 +51,17 @@ def main():
         settings.image.label = f"slice_{slice_idx}"
         eb_image, ib_image = acquire.take_reference_images(microscope, settings.image)
 
-        # visualise
-        # ebz.append(eb_image.data)
-        # ibz.append(ib_image.data)
+        # store
+        store.append_slice(eb_image, ib_image, stage_position=microscope.specimen.stage.current_position)
 
         # move?
 
         # align?
         # alignment.align_using_reference_images(microscope, settings, ref_image, eb_image)
 
+    # wait for the slice images to be written (when saving in the background)
+    utils.flush_image_writer()
+
 
     
 
@@ -1,4 +1,7 @@
+import copy
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import numpy as np
 from autoscript_sdb_microscope_client import SdbMicroscopeClient
@@ -10,11 +13,17 @@ from autoscript_sdb_microscope_client.structures import (
 )
 from skimage import exposure
 
-from fibsem import utils
+from fibsem import config, property_cache, tracing, utils
 from fibsem.structures import BeamType, GammaSettings, ImageSettings, ReferenceImages
 
+# post-processing (gamma correction, saving) runs on this pool while the next frame is grabbed
+ACQUISITION_WORKERS = 4
+_executor: ThreadPoolExecutor = None
+_executor_lock = threading.Lock()
 
 
+
+@tracing.traced("acquisition")
 def autocontrast(microscope: SdbMicroscopeClient, beam_type=BeamType.ELECTRON) -> None:
     """Automatically adjust the microscope image contrast."""
     microscope.imaging.set_active_view(beam_type.value)
@@ -28,6 +37,7 @@ def autocontrast(microscope: SdbMicroscopeClient, beam_type=BeamType.ELECTRON) -
     microscope.auto_functions.run_auto_cb()
 
 
+@tracing.traced("acquisition")
 def take_reference_images(
     microscope: SdbMicroscopeClient, image_settings: ImageSettings
 ) -> list[AdornedImage]:
@@ -40,15 +50,36 @@ def take_reference_images(
     Returns:
         list[AdornedImage]: electron and ion reference image pair
     """
+    eb_future, ib_future = take_reference_images_async(microscope, image_settings)
+    return eb_future.result(), ib_future.result()
+
+
+def take_reference_images_async(
+    microscope: SdbMicroscopeClient,
+    image_settings: ImageSettings,
+    executor: ThreadPoolExecutor = None,
+) -> tuple[Future, Future]:
+    """Take a reference image using both beams. The electron image is post-processed
+    while the ion image is grabbed.
+
+    Args:
+        microscope (SdbMicroscopeClient): autoscript microscope instance
+        image_settings (ImageSettings): imaging settings
+        executor (ThreadPoolExecutor, optional): post-processing pool. Defaults to the shared acquisition pool.
+
+    Returns:
+        tuple[Future, Future]: electron and ion reference image futures
+    """
     tmp_beam_type = image_settings.beam_type
     image_settings.beam_type = BeamType.ELECTRON
-    eb_image = new_image(microscope, image_settings)
+    eb_future = new_image_async(microscope, image_settings, executor=executor)
     image_settings.beam_type = BeamType.ION
-    ib_image = new_image(microscope, image_settings)
+    ib_future = new_image_async(microscope, image_settings, executor=executor)
     image_settings.beam_type = tmp_beam_type  # reset to original beam type
-    return eb_image, ib_image
+    return eb_future, ib_future
 
 
+@tracing.traced("acquisition")
 def take_set_of_reference_images(
     microscope: SdbMicroscopeClient,
     image_settings: ImageSettings,
@@ -57,20 +88,45 @@ def take_set_of_reference_images(
 ) -> ReferenceImages:
     """Take a set of reference images at low and high magnification"""
 
+    future = take_set_of_reference_images_async(microscope, image_settings, hfws, label)
+
+    return future.result()
+
+
+def take_set_of_reference_images_async(
+    microscope: SdbMicroscopeClient,
+    image_settings: ImageSettings,
+    hfws: tuple[float],
+    label: str = "ref_image",
+    executor: ThreadPoolExecutor = None,
+) -> Future:
+    """Take a set of reference images at low and high magnification. All frames are grabbed
+    on the calling thread, and returned once post-processing has finished.
+    Use asyncio.wrap_future to await the result.
+
+    Args:
+        microscope (SdbMicroscopeClient): autoscript microscope instance
+        image_settings (ImageSettings): imaging settings
+        hfws (tuple[float]): low and high resolution horizontal field widths
+        label (str, optional): image label. Defaults to "ref_image".
+        executor (ThreadPoolExecutor, optional): post-processing pool. Defaults to the shared acquisition pool.
+
+    Returns:
+        Future: ReferenceImages future
+    """
+
     # force save
     image_settings.save = True
 
     image_settings.hfw = hfws[0]
     image_settings.label = f"{label}_low_res"
-    low_eb, low_ib = take_reference_images(microscope, image_settings)
+    low_eb, low_ib = take_reference_images_async(microscope, image_settings, executor)
 
     image_settings.hfw = hfws[1]
     image_settings.label = f"{label}_high_res"
-    high_eb, high_ib = take_reference_images(microscope, image_settings)
-
-    reference_images = ReferenceImages(low_eb, high_eb, low_ib, high_ib)
+    high_eb, high_ib = take_reference_images_async(microscope, image_settings, executor)
 
-    return reference_images
+    return _gather([low_eb, high_eb, low_ib, high_ib], ReferenceImages)
 
 
 def gamma_correction(image: AdornedImage, settings: GammaSettings) -> AdornedImage:
@@ -91,6 +147,7 @@ def gamma_correction(image: AdornedImage, settings: GammaSettings) -> AdornedIma
     return reference
 
 
+@tracing.traced("acquisition")
 def new_image(
     microscope: SdbMicroscopeClient,
     settings: ImageSettings,
@@ -106,6 +163,45 @@ def new_image(
     Returns:
             AdornedImage: new autoscript adorned image
     """
+    tracing.annotate(beam_type=settings.beam_type.name, resolution=settings.resolution, label=settings.label)
+    image, label = _grab_new_image(microscope, settings, reduced_area)
+
+    return _process_image(image, settings.gamma, settings.save, settings.save_path, label)
+
+
+def new_image_async(
+    microscope: SdbMicroscopeClient,
+    settings: ImageSettings,
+    reduced_area: Rectangle = None,
+    executor: ThreadPoolExecutor = None,
+) -> Future:
+    """Apply the image settings and take a new image. The frame is grabbed on the calling
+    thread, and gamma correction and saving run on the post-processing pool.
+
+    Args:
+        microscope (SdbMicroscopeClient): autoscript microscope client connection
+        settings (ImageSettings): image settings to take the image with
+        reduced_area (Rectangle, optional): image with the reduced area . Defaults to None.
+        executor (ThreadPoolExecutor, optional): post-processing pool. Defaults to the shared acquisition pool.
+
+    Returns:
+        Future: AdornedImage future
+    """
+    image, label = _grab_new_image(microscope, settings, reduced_area)
+
+    # copy the settings, callers reuse (and modify) them for the next frame while this one is processed
+    settings = copy.deepcopy(settings)
+    executor = executor or _get_executor()
+    return executor.submit(
+        _process_image, image, settings.gamma, settings.save, settings.save_path, label
+    )
+
+
+def _grab_new_image(
+    microscope: SdbMicroscopeClient,
+    settings: ImageSettings,
+    reduced_area: Rectangle = None,
+) -> tuple[AdornedImage, str]:
 
     # set frame settings
     frame_settings = GrabFrameSettings(
@@ -118,7 +214,7 @@ def new_image(
     if settings.beam_type is BeamType.ELECTRON:
         hfw_limits = microscope.beams.electron_beam.horizontal_field_width.limits
         settings.hfw = np.clip(settings.hfw, hfw_limits.min, hfw_limits.max)
-        microscope.beams.electron_beam.horizontal_field_width.value = settings.hfw
+        property_cache.write_property(microscope, "beams.electron_beam.horizontal_field_width", settings.hfw)
         label = f"{settings.label}_eb"
 
 
@@ -126,7 +222,7 @@ def new_image(
     if settings.beam_type is BeamType.ION:
         hfw_limits = microscope.beams.ion_beam.horizontal_field_width.limits
         settings.hfw = np.clip(settings.hfw, hfw_limits.min, hfw_limits.max)
-        microscope.beams.ion_beam.horizontal_field_width.value = settings.hfw
+        property_cache.write_property(microscope, "beams.ion_beam.horizontal_field_width", settings.hfw)
         label = f"{settings.label}_ib"
 
     # run autocontrast
@@ -140,17 +236,60 @@ def new_image(
         beam_type=settings.beam_type,
     )
 
+    return image, label
+
+
+@tracing.traced("acquisition")
+def _process_image(
+    image: AdornedImage, gamma: GammaSettings, save: bool, save_path: str, label: str
+) -> AdornedImage:
+    tracing.annotate(label=label, image_size=image.data.shape)
+
     # apply gamma correction
-    if settings.gamma.enabled:
-        image = gamma_correction(image, settings.gamma)
+    if gamma.enabled:
+        image = gamma_correction(image, gamma)
 
     # save image
-    if settings.save:
-        utils.save_image(image=image, save_path=settings.save_path, label=label)
-    
+    if save:
+        utils.save_image(image=image, save_path=save_path, label=label, asynch=config.IMAGE_WRITER_ASYNC)
+
     return image
 
 
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=ACQUISITION_WORKERS, thread_name_prefix="fibsem-acquire"
+            )
+
+    return _executor
+
+
+def _gather(futures: list[Future], fn) -> Future:
+    # future for fn(*results), resolved when all futures are done
+    result = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        try:
+            result.set_result(fn(*[future.result() for future in futures]))
+        except Exception as e:
+            result.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(_done)
+
+    return result
+
+
 def last_image(
     microscope: SdbMicroscopeClient, beam_type: BeamType =BeamType.ELECTRON
 ) -> AdornedImage:
@@ -169,6 +308,7 @@ def last_image(
     return image
 
 
+@tracing.traced("acquisition")
 def acquire_image(
     microscope: SdbMicroscopeClient,
     settings: GrabFrameSettings = None,
@@ -184,10 +324,11 @@ def acquire_image(
     Returns:
         AdornedImage: new image
     """
-    logging.info(f"acquiring new {beam_type.name} image.")
+    logging.info("acquiring new %s image.", beam_type.name, extra={"beam": beam_type.name})
     # microscope.imaging.set_active_device(beam_type.value)
     microscope.imaging.set_active_view(beam_type.value)
     image = microscope.imaging.grab_frame(settings)
+    tracing.annotate(beam_type=beam_type.name, image_size=image.data.shape)
 
     return image
 
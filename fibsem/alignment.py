@@ -6,15 +6,15 @@ from autoscript_sdb_microscope_client.structures import (AdornedImage,
                                                          MoveSettings,
                                                          Rectangle,
                                                          StagePosition)
-from scipy import fftpack
 
-from fibsem import acquire, calibration, movement, utils, validation
-from fibsem.imaging import masks
+from fibsem import acquire, calibration, movement, property_cache, tracing, utils, validation
+from fibsem.imaging import correlation, masks
 from fibsem.imaging import utils as image_utils
 from fibsem.structures import (BeamType, ImageSettings, MicroscopeSettings,
                                ReferenceImages)
 
 
+@tracing.traced("alignment")
 def correct_stage_eucentric_alignment(microscope: SdbMicroscopeClient, image_settings: ImageSettings, tilt_degrees: float = 25) -> None:
 
     # iteratively?
@@ -56,13 +56,17 @@ def coarse_eucentric_alignment(microscope: SdbMicroscopeClient, hfw: float = 30e
     move_settings = MoveSettings(link_z_y=True)
     z_move = StagePosition(z=eucentric_height, coordinate_system="Specimen")
     stage.absolute_move(z_move, move_settings)
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
 
 
+@tracing.traced("alignment")
 def beam_shift_alignment(
     microscope: SdbMicroscopeClient,
     image_settings: ImageSettings,
     ref_image: AdornedImage,
-    reduced_area: Rectangle,
+    reduced_area: Rectangle = None,
+    reference_bank: correlation.ReferenceBank = None,
+    key=None,
 ):
     """Align the images by adjusting the beam shift, instead of moving the stage
             (increased precision, lower range)
@@ -73,20 +77,49 @@ def beam_shift_alignment(
         image_settings (acquire.ImageSettings): settings for taking image
         ref_image (AdornedImage): reference image to align to
         reduced_area (Rectangle): The reduced area to image with.
+        reference_bank (correlation.ReferenceBank, optional): bank of precomputed reference spectra,
+            see beam_shift_reference_bank. Defaults to None.
+        key (optional): reference key in the reference bank (e.g. lamella number). Defaults to None.
     """
 
     # # align using cross correlation
     new_image = acquire.new_image(
         microscope, settings=image_settings, reduced_area=reduced_area
     )
-    dx, dy, _ = shift_from_crosscorrelation(
-        ref_image, new_image, lowpass=50, highpass=4, sigma=5, use_rect_mask=True
-    )
+
+    if reference_bank is not None:
+        # (re)compute the reference spectrum if the reference image has changed
+        if not reference_bank.is_source(key, ref_image):
+            reference_bank.add(key, ref_image.data, source=ref_image)
+
+        dx, dy, _ = reference_bank.shift(key, new_image.data)
+
+        # convert from pixels to metres
+        pixel_size = new_image.metadata.binary_result.pixel_size
+        dx, dy = dx * pixel_size.x, dy * pixel_size.y
+    else:
+        dx, dy, _ = shift_from_crosscorrelation(
+            ref_image, new_image, lowpass=50, highpass=4, sigma=5, use_rect_mask=True
+        )
 
     # adjust beamshift
     microscope.beams.ion_beam.beam_shift.value += (-dx, dy)
 
 
+def beam_shift_reference_bank(max_workers: int = None) -> correlation.ReferenceBank:
+    """Create a reference bank with the beam shift alignment filter settings, to align
+    many positions (e.g. lamellae) without recomputing the reference spectra each time.
+
+    Args:
+        max_workers (int, optional): thread pool size for batched alignment. Defaults to None.
+
+    Returns:
+        correlation.ReferenceBank: empty reference bank
+    """
+    return correlation.ReferenceBank(lp=50, hp=4, sigma=5, use_rect_mask=True, max_workers=max_workers)
+
+
+@tracing.traced("alignment")
 def correct_stage_drift(
     microscope: SdbMicroscopeClient,
     settings: MicroscopeSettings,
@@ -94,8 +127,20 @@ def correct_stage_drift(
     alignment: tuple(BeamType) = (BeamType.ELECTRON, BeamType.ELECTRON),
     rotate: bool = False,
     use_ref_mask: bool = False,
+    subpixel: str = None,
+    skip_confidence: float = None,
+    pyramid_levels: int = 0,
+    pyramid_min_level: int = 0,
 ) -> bool:
-    """Correct the stage drift by crosscorrelating low-res and high-res reference images"""
+    """Correct the stage drift by crosscorrelating low-res and high-res reference images
+
+    If skip_confidence is set, the high-res alignment is skipped when the low-res
+    crosscorrelation peak confidence (peak to second peak ratio) is at least skip_confidence.
+    Use with subpixel refinement so the low-res shift is not limited to whole pixels.
+
+    If pyramid_levels > 0, the crosscorrelation is calculated coarse-to-fine on gaussian
+    pyramids (see correlation.pyramid_shift).
+    """
 
     # set reference images
     if alignment[0] is BeamType.ELECTRON:
@@ -130,21 +175,32 @@ def correct_stage_drift(
         new_image = acquire.new_image(microscope, settings.image)
 
         # crosscorrelation alignment
-        ret = align_using_reference_images(
-            microscope, settings, ref_image, new_image, ref_mask=ref_mask
+        ret, confidence = align_using_reference_images(
+            microscope, settings, ref_image, new_image, ref_mask=ref_mask,
+            subpixel=subpixel, return_confidence=True,
+            pyramid_levels=pyramid_levels, pyramid_min_level=pyramid_min_level,
         )
 
         if ret is False:
             break # cross correlation has failed...
 
+        if skip_confidence is not None and confidence >= skip_confidence:
+            logging.info(f"alignment confidence {confidence:.2f} >= {skip_confidence:.2f}, skipping remaining alignment.")
+            break
+
     return ret
 
+@tracing.traced("alignment")
 def align_using_reference_images(
     microscope: SdbMicroscopeClient,
     settings: MicroscopeSettings,
     ref_image: AdornedImage,
     new_image: AdornedImage,
-    ref_mask: np.ndarray = None
+    ref_mask: np.ndarray = None,
+    subpixel: str = None,
+    return_confidence: bool = False,
+    pyramid_levels: int = 0,
+    pyramid_min_level: int = 0,
 ) -> bool:
 
     # import matplotlib.pyplot as plt
@@ -169,8 +225,11 @@ def align_using_reference_images(
 
     dx, dy, xcorr = shift_from_crosscorrelation(
         ref_image, new_image, lowpass=lp_px, highpass=hp_px, sigma=sigma, 
-        use_rect_mask=True, ref_mask=ref_mask
+        use_rect_mask=True, ref_mask=ref_mask, subpixel=subpixel,
+        pyramid_levels=pyramid_levels, pyramid_min_level=pyramid_min_level,
     )
+    confidence = correlation.peak_confidence(xcorr)
+    logging.info(f"cross-correlation peak confidence: {confidence:.2f}")
 
     shift_within_tolerance = validation.check_shift_within_tolerance(
         dx=dx, dy=dy, ref_image=ref_image, limit=0.5
@@ -186,8 +245,12 @@ def align_using_reference_images(
             dy=-dy, 
             beam_type=new_beam_type)
 
+    if return_confidence:
+        return shift_within_tolerance, confidence
+
     return shift_within_tolerance
 
+@tracing.traced("alignment")
 def shift_from_crosscorrelation(
     ref_image: AdornedImage,
     new_image: AdornedImage,
@@ -195,20 +258,63 @@ def shift_from_crosscorrelation(
     highpass: int = 6,
     sigma: int = 6,
     use_rect_mask: bool = False,
-    ref_mask: np.ndarray = None
+    ref_mask: np.ndarray = None,
+    subpixel: str = None,
+    pyramid_levels: int = 0,
+    pyramid_min_level: int = 0,
 ) -> tuple[float, float, np.ndarray]:
+    """Calculate the shift (in metres) between two images using crosscorrelation
+
+    Args:
+        ref_image (AdornedImage): reference image
+        new_image (AdornedImage): new image
+        lowpass (int, optional): lowpass. Defaults to 128.
+        highpass (int, optional): highpass. Defaults to 6.
+        sigma (int, optional): sigma (gaussian blur). Defaults to 6.
+        use_rect_mask (bool, optional): apply a soft rectangular mask to both images. Defaults to False.
+        ref_mask (np.ndarray, optional): mask to apply to the reference image. Defaults to None.
+        subpixel (str, optional): sub-pixel peak refinement ("parabolic", "gaussian" or "upsampled").
+            Defaults to None (whole pixel shifts).
+        pyramid_levels (int, optional): number of gaussian pyramid levels for coarse-to-fine
+            crosscorrelation. Defaults to 0 (single full resolution crosscorrelation).
+        pyramid_min_level (int, optional): finest pyramid level to refine, whole pixel shifts
+            are multiples of 2**pyramid_min_level px. Defaults to 0.
+
+    Returns:
+        tuple[float, float, np.ndarray]: x shift (m), y shift (m), crosscorrelation map (of the
+            coarsest level for pyramid crosscorrelation)
+    """
+
+    tracing.annotate(image_size=new_image.data.shape, pyramid_levels=pyramid_levels)
 
     # get pixel_size
     pixelsize_x = new_image.metadata.binary_result.pixel_size.x
     pixelsize_y = new_image.metadata.binary_result.pixel_size.y
 
+    if pyramid_levels > 0:
+        dx_px, dy_px, xcorr, levels = correlation.pyramid_shift(
+            ref_image.data, new_image.data, levels=pyramid_levels,
+            lp=lowpass, hp=highpass, sigma=sigma, use_rect_mask=use_rect_mask, ref_mask=ref_mask,
+            subpixel=subpixel, min_level=pyramid_min_level,
+        )
+        x_shift, y_shift = dx_px * pixelsize_x, dy_px * pixelsize_y
+
+        for level in levels:
+            logging.debug(
+                "pyramid cross-correlation level %s %s: x: %spx, y: %spx, time: %.3fs",
+                level.level, level.shape, level.dx, level.dy, level.time,
+            )
+        _log_shift("pyramid cross-correlation", new_image, dx_px, dy_px, x_shift, y_shift)
+
+        return x_shift, y_shift, xcorr
+
     # normalise both images
     ref_data_norm = image_utils.normalise_image(ref_image)
     new_data_norm = image_utils.normalise_image(new_image)
 
     # cross-correlate normalised images
     if use_rect_mask:
-        rect_mask = masks._mask_rectangular(new_data_norm.shape)
+        rect_mask = masks.get_rectangular_mask(new_data_norm.shape)
         ref_data_norm = rect_mask * ref_data_norm
         new_data_norm = rect_mask * new_data_norm
 
@@ -220,36 +326,48 @@ def shift_from_crosscorrelation(
     # plt.show()
 
     # run crosscorrelation
-    xcorr = crosscorrelation(
-        ref_data_norm, new_data_norm, bp=True, lp=lowpass, hp=highpass, sigma=sigma
+    engine = correlation.get_correlation_engine(
+        ref_data_norm.shape, ref_data_norm.dtype, lp=lowpass, hp=highpass, sigma=sigma, bp=True
     )
-
-    # calculate maximum crosscorrelation
-    maxX, maxY = np.unravel_index(np.argmax(xcorr), xcorr.shape)
-    cen = np.asarray(xcorr.shape) / 2
-    err = np.array(cen - [maxX, maxY], int)
+    dx_px, dy_px, xcorr = engine.shift(ref_data_norm, new_data_norm, subpixel=subpixel)
 
     # calculate shift in metres
-    x_shift = err[1] * pixelsize_x
-    y_shift = err[0] * pixelsize_y # this could be the issue?
+    x_shift = dx_px * pixelsize_x
+    y_shift = dy_px * pixelsize_y # this could be the issue?
     
-    logging.info(f"pixelsize: x: {pixelsize_x}, y: {pixelsize_y}")
-
-    logging.info(f"cross-correlation:")
-    logging.info(f"maxX: {maxX}, {maxY}, centre: {cen}")
-    logging.info(f"x: {err[1]}px, y: {err[0]}px")
-    logging.info(f"x: {x_shift:.2e}m, y: {y_shift:.2e} meters")
+    _log_shift("cross-correlation", new_image, dx_px, dy_px, x_shift, y_shift)
 
     # metres
     return x_shift, y_shift, xcorr
 
 
+def _log_shift(method: str, image: AdornedImage, dx_px: float, dy_px: float, dx: float, dy: float) -> None:
+    # single (lazily formatted) record, with typed fields for structured logs
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+
+    pixelsize = image.metadata.binary_result.pixel_size
+    logging.info(
+        "%s: x: %spx, y: %spx, x: %.2em, y: %.2em (pixelsize: x: %s, y: %s)",
+        method, dx_px, dy_px, dx, dy, pixelsize.x, pixelsize.y,
+        extra={
+            "beam": image.metadata.acquisition.beam_type,
+            "hfw": image.width * pixelsize.x,
+            "dx_px": float(dx_px),
+            "dy_px": float(dy_px),
+            "dx": float(dx),
+            "dy": float(dy),
+        },
+    )
+
+
 # TODO
 
 
 
+@tracing.traced("alignment")
 def crosscorrelation(img1: np.ndarray, img2: np.ndarray,  
-    lp: int = 128, hp: int = 6, sigma: int = 6, bp: bool = False) -> np.ndarray:
+    lp: int = 128, hp: int = 6, sigma: int = 6, bp: bool = False, backend: str = None) -> np.ndarray:
     """Cross-correlate images (fourier convolution matching)
 
     Args:
@@ -259,6 +377,8 @@ def crosscorrelation(img1: np.ndarray, img2: np.ndarray,
         hp (int, optional): highpass . Defaults to 6.
         sigma (int, optional): sigma (gaussian blur). Defaults to 6.
         bp (bool, optional): use a bandpass. Defaults to False.
+        backend (str, optional): fft backend ("scipy", "numpy", "fftw"). Defaults to the current backend,
+            see fibsem.imaging.fft.set_backend and config.FFT_BACKEND.
 
     Returns:
         np.ndarray: crosscorrelation map
@@ -268,81 +388,16 @@ def crosscorrelation(img1: np.ndarray, img2: np.ndarray,
         logging.error(err)
         raise ValueError(err)
 
-    if bp: 
-        bandpass = masks.bandpass_mask(
-            size=(img1.shape[1], img1.shape[0]), 
-            lp=lp, hp=hp, sigma=sigma
-        )
-        n_pixels = img1.shape[0] * img1.shape[1]
-        
-        img1ft = fftpack.ifftshift(bandpass * fftpack.fftshift(fftpack.fft2(img1)))
-        tmp = img1ft * np.conj(img1ft)
-        img1ft = n_pixels * img1ft / np.sqrt(tmp.sum())
-        
-        img2ft = fftpack.ifftshift(bandpass * fftpack.fftshift(fftpack.fft2(img2)))
-        img2ft[0, 0] = 0
-        tmp = img2ft * np.conj(img2ft)
-        
-        img2ft = n_pixels * img2ft / np.sqrt(tmp.sum())
-
-        # import matplotlib.pyplot as plt
-        # fig, ax = plt.subplots(1, 2, figsize=(15, 15))
-        # ax[0].imshow(fftpack.ifft2(img1ft).real)
-        # ax[1].imshow(fftpack.ifft2(img2ft).real)
-        # plt.show()
-
-        xcorr = np.real(fftpack.fftshift(fftpack.ifft2(img1ft * np.conj(img2ft))))
-    else: # TODO: why are these different...
-        img1ft = fftpack.fft2(img1)
-        img2ft = np.conj(fftpack.fft2(img2))
-        img1ft[0, 0] = 0
-        xcorr = np.abs(fftpack.fftshift(fftpack.ifft2(img1ft * img2ft)))
-    
+    tracing.annotate(image_size=img1.shape)
+    engine = correlation.get_correlation_engine(
+        img1.shape, img1.dtype, lp=lp, hp=hp, sigma=sigma, bp=bp, backend=backend
+    )
+    xcorr = engine.correlate(img1, img2)
+
     return xcorr
 
 # numpy version
 def crosscorrelation_v2_np(img1: np.ndarray, img2: np.ndarray,  
     lp: int = 128, hp: int = 6, sigma: int = 6, bp: bool = False) -> np.ndarray:
-    """Cross-correlate images (fourier convolution matching)
-
-    Args:
-        img1 (np.ndarray): reference_image
-        img2 (np.ndarray): new image
-        lp (int, optional): lowpass. Defaults to 128.
-        hp (int, optional): highpass . Defaults to 6.
-        sigma (int, optional): sigma (gaussian blur). Defaults to 6.
-        bp (bool, optional): use a bandpass. Defaults to False.
-
-    Returns:
-        np.ndarray: crosscorrelation map
-    """
-    if img1.shape != img2.shape:
-        err = f"Image 1 {img1.shape} and Image 2 {img2.shape} need to have the same shape"
-        logging.error(err)
-        raise ValueError(err)
-
-    if bp: 
-        bandpass = masks.bandpass_mask(
-            size=(img1.shape[1], img1.shape[0]), 
-            lp=lp, hp=hp, sigma=sigma
-        )
-        n_pixels = img1.shape[0] * img1.shape[1]
-        
-        img1ft = np.fft.ifftshift(bandpass * np.fft.fftshift(np.fft.fft2(img1)))
-        tmp = img1ft * np.conj(img1ft)
-        img1ft = n_pixels * img1ft / np.sqrt(tmp.sum())
-        
-        img2ft = np.fft.ifftshift(bandpass * np.fft.fftshift(np.fft.fft2(img2)))
-        img2ft[0, 0] = 0
-        tmp = img2ft * np.conj(img2ft)
-        
-        img2ft = n_pixels * img2ft / np.sqrt(tmp.sum())
-
-        xcorr = np.real(np.fft.fftshift(np.fft.ifft2(img1ft * np.conj(img2ft))))
-    else: # TODO: why are these different...
-        img1ft = np.fft.fft2(img1)
-        img2ft = np.conj(np.fft.fft2(img2))
-        img1ft[0, 0] = 0
-        xcorr = np.abs(np.fft.fftshift(np.fft.ifft2(img1ft * img2ft)))
-    
-    return xcorr
+    """Cross-correlate images using the numpy fft backend, see crosscorrelation"""
+    return crosscorrelation(img1, img2, lp=lp, hp=hp, sigma=sigma, bp=bp, backend="numpy")
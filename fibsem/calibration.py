@@ -7,7 +7,7 @@ from autoscript_sdb_microscope_client import SdbMicroscopeClient
 from autoscript_sdb_microscope_client.enumerations import CoordinateSystem, ManipulatorCoordinateSystem
 from autoscript_sdb_microscope_client.structures import StagePosition
 
-from fibsem import acquire, movement
+from fibsem import acquire, movement, property_cache, tracing
 from fibsem.structures import (BeamSettings, MicroscopeState, BeamType, ImageSettings, MicroscopeSettings)
 
 from pathlib import Path
@@ -25,13 +25,15 @@ def auto_link_stage(microscope: SdbMicroscopeClient, hfw: float = 150e-6) -> Non
 
     microscope.imaging.set_active_view(BeamType.ELECTRON.value)
     original_hfw = microscope.beams.electron_beam.horizontal_field_width.value
-    microscope.beams.electron_beam.horizontal_field_width.value = hfw
+    property_cache.write_property(microscope, "beams.electron_beam.horizontal_field_width", hfw)
     acquire.autocontrast(microscope, beam_type=BeamType.ELECTRON)
     microscope.auto_functions.run_auto_focus()
+    property_cache.invalidate(microscope, "beams.electron_beam.working_distance")
     microscope.specimen.stage.link()
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
     # NOTE: replace with auto_focus_and_link if performance of focus is poor
     # # Restore original settings
-    microscope.beams.electron_beam.horizontal_field_width.value = original_hfw
+    property_cache.write_property(microscope, "beams.electron_beam.horizontal_field_width", original_hfw)
 
 def auto_discharge_beam(microscope: SdbMicroscopeClient, image_settings: ImageSettings, n_iterations: int = 10):
 
@@ -73,6 +75,7 @@ def auto_needle_calibration(microscope: SdbMicroscopeClient, settings: Microscop
     # focus on the needle
     acquire.autocontrast(microscope, BeamType.ELECTRON)
     microscope.auto_functions.run_auto_focus()
+    property_cache.invalidate(microscope, "beams.electron_beam.working_distance")
     acquire.take_reference_images(microscope, settings.image)
 
     # set coordinate system
@@ -84,6 +87,7 @@ def auto_needle_calibration(microscope: SdbMicroscopeClient, settings: Microscop
     # focus on needle
     acquire.autocontrast(microscope, BeamType.ELECTRON)
     microscope.auto_functions.run_auto_focus()
+    property_cache.invalidate(microscope, "beams.electron_beam.working_distance")
     acquire.take_reference_images(microscope, settings.image)
 
     # medium res alignment
@@ -174,17 +178,19 @@ def auto_home_and_link(microscope: SdbMicroscopeClient, state: MicroscopeState)
     # home the stage
     logging.info(f"Homing stage...")
     microscope.specimen.stage.home()
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
 
     # move to saved eucentric state
     set_microscope_state(microscope, state)
 
     # set the working distances to 3.91mm, 16.5mm
-    microscope.beams.electron_beam.working_distance.value = 3.91e-3 # MAGIC_NUMBER
-    microscope.beams.ion_beam.working_distance.value = 16.5e-3      # MAGIC_NUMBER
+    property_cache.write_property(microscope, "beams.electron_beam.working_distance", 3.91e-3) # MAGIC_NUMBER
+    property_cache.write_property(microscope, "beams.ion_beam.working_distance", 16.5e-3)      # MAGIC_NUMBER
 
     # link
     logging.info("Linking stage...")
     microscope.specimen.stage.link()
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
 
 
 # STATE MANAGEMENT
@@ -197,38 +203,61 @@ def get_raw_stage_position(microscope: SdbMicroscopeClient) -> StagePosition:
 
     return stage_position
 
+@tracing.traced("calibration")
 def get_current_microscope_state(
-    microscope: SdbMicroscopeClient
+    microscope: SdbMicroscopeClient, use_cache: bool = True
 ) -> MicroscopeState:
-    """Get the current microscope state v2 """
+    """Get the current microscope state v2
+
+    Property values are read through the property cache (see fibsem.property_cache), so values
+    read within config.PROPERTY_CACHE_TTL (and not changed by fibsem since) aren't read again.
+
+    Args:
+        microscope (SdbMicroscopeClient): autoscript microscope instance
+        use_cache (bool, optional): reuse cached property values. Defaults to True.
+
+    Returns:
+        MicroscopeState: current microscope state
+    """
+    cache = property_cache.get_property_cache(microscope)
+    if not use_cache:
+        cache.invalidate()
+
+    beams = {BeamType.ELECTRON: "electron_beam", BeamType.ION: "ion_beam"}
+    values = cache.read_many([
+        property_cache.beam_property(beam, name) for beam in beams.values() for name in property_cache.BEAM_PROPERTIES
+    ])
+
+    # get absolute stage coordinates (RAW)
+    position = cache.get(property_cache.RAW_STAGE_POSITION, lambda: get_raw_stage_position(microscope))
+
+    beam_settings = {
+        beam_type: BeamSettings(
+            beam_type=beam_type,
+            working_distance=values[property_cache.beam_property(beam, "working_distance")],
+            beam_current=values[property_cache.beam_property(beam, "beam_current")],
+            hfw=values[property_cache.beam_property(beam, "horizontal_field_width")],
+            resolution=values[property_cache.beam_property(beam, "scanning.resolution")],
+            dwell_time=values[property_cache.beam_property(beam, "scanning.dwell_time")],
+        )
+        for beam_type, beam in beams.items()
+    }
 
     current_microscope_state = MicroscopeState(
         timestamp=datetime.timestamp(datetime.now()),
-        # get absolute stage coordinates (RAW)
-        absolute_position=get_raw_stage_position(microscope),
-        # electron beam settings
-        eb_settings=BeamSettings(
-            beam_type=BeamType.ELECTRON,
-            working_distance=microscope.beams.electron_beam.working_distance.value,
-            beam_current=microscope.beams.electron_beam.beam_current.value,
-            hfw=microscope.beams.electron_beam.horizontal_field_width.value,
-            resolution=microscope.beams.electron_beam.scanning.resolution.value,
-            dwell_time=microscope.beams.electron_beam.scanning.dwell_time.value,
-        ),
-        # ion beam settings
-        ib_settings=BeamSettings(
-            beam_type=BeamType.ION,
-            working_distance=microscope.beams.ion_beam.working_distance.value,
-            beam_current=microscope.beams.ion_beam.beam_current.value,
-            hfw=microscope.beams.ion_beam.horizontal_field_width.value,
-            resolution=microscope.beams.ion_beam.scanning.resolution.value,
-            dwell_time=microscope.beams.ion_beam.scanning.dwell_time.value,
+        # copied, as the cached position is shared
+        absolute_position=StagePosition(
+            x=position.x, y=position.y, z=position.z, r=position.r, t=position.t,
+            coordinate_system=position.coordinate_system,
         ),
+        eb_settings=beam_settings[BeamType.ELECTRON],
+        ib_settings=beam_settings[BeamType.ION],
     )
 
     return current_microscope_state
 
 
+@tracing.traced("calibration")
 def set_microscope_state(microscope: SdbMicroscopeClient, microscope_state: MicroscopeState):
     """Reset the microscope state to the provided state"""
 
@@ -241,45 +270,17 @@ def set_microscope_state(microscope: SdbMicroscopeClient, microscope_state: Micr
         microscope=microscope, stage_position=microscope_state.absolute_position
     )
 
-    # restore electron beam
-    logging.info(f"restoring electron beam settings...")
-    microscope.beams.electron_beam.working_distance.value = (
-        microscope_state.eb_settings.working_distance
-    )
-    microscope.beams.electron_beam.beam_current.value = (
-        microscope_state.eb_settings.beam_current
-    )
-    microscope.beams.electron_beam.horizontal_field_width.value = (
-        microscope_state.eb_settings.hfw
-    )
-    microscope.beams.electron_beam.scanning.resolution.value = (
-        microscope_state.eb_settings.resolution
-    )
-    microscope.beams.electron_beam.scanning.dwell_time.value = (
-        microscope_state.eb_settings.dwell_time
-    )
-    # microscope.beams.electron_beam.stigmator.value = (
-    #     microscope_state.eb_settings.stigmation
-    # )
-
-    # restore ion beam
-    logging.info(f"restoring ion beam settings...")
-    microscope.beams.ion_beam.working_distance.value = (
-        microscope_state.ib_settings.working_distance
-    )
-    microscope.beams.ion_beam.beam_current.value = (
-        microscope_state.ib_settings.beam_current
-    )
-    microscope.beams.ion_beam.horizontal_field_width.value = (
-        microscope_state.ib_settings.hfw
-    )
-    microscope.beams.ion_beam.scanning.resolution.value = (
-        microscope_state.ib_settings.resolution
-    )
-    microscope.beams.ion_beam.scanning.dwell_time.value = (
-        microscope_state.ib_settings.dwell_time
-    )
-    # microscope.beams.ion_beam.stigmator.value = microscope_state.ib_settings.stigmation
+    # restore beam settings (stigmation isn't restored)
+    for beam, settings in (("electron_beam", microscope_state.eb_settings), ("ion_beam", microscope_state.ib_settings)):
+        logging.info(f"restoring {beam.replace('_', ' ')} settings...")
+        for name, value in (
+            ("working_distance", settings.working_distance),
+            ("beam_current", settings.beam_current),
+            ("horizontal_field_width", settings.hfw),
+            ("scanning.resolution", settings.resolution),
+            ("scanning.dwell_time", settings.dwell_time),
+        ):
+            property_cache.write_property(microscope, property_cache.beam_property(beam, name), value)
 
     logging.info(f"microscope state restored")
     return
@@ -1,5 +1,4 @@
-
-
+import os
 
 # sputtering rates, from microscope application files
 MILLING_SPUTTER_RATE = {
@@ -12,4 +11,37 @@ MILLING_SPUTTER_RATE = {
     6.2e-9: 2.907,  # 20kv
     7.6e-9: 3.041,  # 30kv
     28.0e-9: 1.18e1   # 30 kv
-}
\ No newline at end of file
+}
+
+# fft backend for image correlation ("scipy", "numpy" or "fftw")
+FFT_BACKEND = "scipy"
+# number of fft threads (negative: relative to cpu count, -1 for all cores). Defaults to half the
+# cores, leaving the rest for the acquisition and image writer threads
+FFT_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+FFT_AUTOTUNE = False  # pick the fastest fft backend at session setup
+FFT_AUTOTUNE_RESOLUTIONS = ["1536x1024", "3072x2048"]
+FFTW_PLANNER_EFFORT = "FFTW_MEASURE"
+
+# per user cache directory (e.g. fftw wisdom)
+if os.name == "nt":
+    USER_CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "fibsem", "cache")
+else:
+    USER_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "fibsem")
+FFTW_WISDOM_PATH = os.path.join(USER_CACHE_DIR, "fftw_wisdom.json")
+
+# background image writer (see utils.ImageWriter)
+IMAGE_WRITER_ASYNC = False  # save acquired images in the background (flushed at session / protocol stage boundaries)
+IMAGE_WRITER_QUEUE_SIZE = 32  # max queued images, saving blocks when full
+IMAGE_WRITER_BATCH_SIZE = 16  # max images written per batch
+
+# span tracing (see fibsem.tracing), saved to the session directory
+TRACING_ENABLED = False
+TRACING_MAX_SPANS = 1_000_000  # the oldest spans are dropped
+
+# session logging (see utils.configure_logging)
+LOGGING_ASYNC = False  # write the log on a background thread (QueueHandler / QueueListener)
+LOGGING_STRUCTURED = False  # write the log file as json lines
+
+# microscope property read cache (see fibsem.property_cache)
+PROPERTY_CACHE_TTL = 1.0  # seconds
+PROPERTY_CACHE_WORKERS = 1  # concurrent property reads (1: sequential)
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fibsem.detection import utils as det_utils
+from fibsem.detection.utils import DetectionResult
+
+INDEX_NAME = "dataset_index"
+INDEX_VERSION = 1
+
+# dataset path: (modification times, index entries)
+_INDEX_CACHE = {}
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+def build_index(path: Path, use_cache: bool = True) -> list[dict]:
+    """Build the index of a labelled detection dataset (data.csv and the labelled images).
+
+    The index is cached in memory and on disk under config.USER_CACHE_DIR (nothing is
+    written to the dataset directory), and rebuilt when data.csv or the directory
+    (i.e. the images in it) have been modified.
+
+    Args:
+        path (Path): dataset directory
+        use_cache (bool, optional): use the cached index. Defaults to True.
+
+    Returns:
+        list[dict]: index entries (detection log row, with the image filename)
+    """
+    path = os.path.abspath(str(path))
+    key = [
+        os.stat(os.path.join(path, "data.csv")).st_mtime_ns,
+        os.stat(path).st_mtime_ns,
+    ]
+
+    if use_cache:
+        with _INDEX_CACHE_LOCK:
+            cached = _INDEX_CACHE.get(path)
+        if cached is not None and cached[0] == key:
+            return list(cached[1])
+
+        index = det_utils.read_index_cache(path, INDEX_NAME, INDEX_VERSION)
+        if index is not None and index["key"] == key:
+            with _INDEX_CACHE_LOCK:
+                _INDEX_CACHE[path] = (key, index["entries"])
+            return list(index["entries"])
+
+    # list the images once, labels are the image filename stems
+    filenames = {
+        os.path.splitext(entry.name)[0]: entry.name for entry in os.scandir(path) if entry.name.endswith(".tif")
+    }
+
+    entries = []
+    for row in det_utils.read_detection_log(path):
+        fname = filenames.get(row["label"])
+        if fname is None:
+            logging.warning(f"No image found for label {row['label']} in {path}, skipping.")
+            continue
+
+        entries.append({**row, "filename": fname})
+
+    if use_cache:
+        with _INDEX_CACHE_LOCK:
+            _INDEX_CACHE[path] = (key, entries)
+        det_utils.write_index_cache(path, INDEX_NAME, INDEX_VERSION, {"key": key, "entries": entries})
+
+    return list(entries)
+
+
+class DetectionDataset:
+    """Indexed, lazily loaded labelled detection dataset.
+
+    Images are only loaded when an item is requested. Iterating the dataset loads the
+    next items on a thread pool while the current one is being used.
+
+    Args:
+        path (Path): dataset directory (containing data.csv and the labelled images)
+        prefetch (int, optional): number of items loaded ahead when iterating. Defaults to 4.
+        num_workers (int, optional): number of loading threads. Defaults to 2.
+        use_cache (bool, optional): use the cached dataset index. Defaults to True.
+    """
+
+    def __init__(self, path: Path, prefetch: int = 4, num_workers: int = 2, use_cache: bool = True) -> None:
+        self.path = str(path)
+        self.prefetch = max(1, prefetch)
+        self.num_workers = max(1, num_workers)
+        self.entries = build_index(self.path, use_cache=use_cache)
+        self._labels = {entry["label"]: i for i, entry in enumerate(self.entries)}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, idx: int) -> DetectionResult:
+        entry = self.entries[idx]
+        return det_utils.load_detection_result(
+            self.path, entry, filenames=[os.path.join(self.path, entry["filename"])]
+        )
+
+    def __iter__(self):
+        indices = iter(range(len(self)))
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = deque(executor.submit(self.__getitem__, i) for _, i in zip(range(self.prefetch), indices))
+
+            while futures:
+                result = futures.popleft().result()
+
+                idx = next(indices, None)
+                if idx is not None:
+                    futures.append(executor.submit(self.__getitem__, idx))
+
+                yield result
+
+    @property
+    def labels(self) -> list[str]:
+        return [entry["label"] for entry in self.entries]
+
+    def filename(self, label: str) -> str:
+        """Get the image filename for a label"""
+        return os.path.join(self.path, self.entries[self._labels[label]]["filename"])
+
+    def get(self, label: str) -> DetectionResult:
+        """Get the detection result for a label"""
+        return self[self._labels[label]]
@@ -2,17 +2,19 @@
 
 
 import logging
+import threading
 
 import numpy as np
 import PIL
 import scipy.ndimage as ndi
 from autoscript_sdb_microscope_client.structures import AdornedImage
-from fibsem import calibration
+from fibsem import calibration, tracing
 from fibsem.structures import Point
 from fibsem.detection import utils as det_utils
+from fibsem.imaging import utils as image_utils
 from fibsem.detection.utils import (DetectionFeature, DetectionResult,
                                      DetectionType)
-from scipy.spatial import distance
+from scipy.spatial import cKDTree
 from skimage import feature
 
 # TODO:
@@ -32,6 +34,60 @@ DETECTION_COLOURS_UINT8 = {
     DetectionType.LandingPost: (255, 255, 255),
 }
 
+class FeatureContext:
+    """Derived images (edge maps, edge pixel coordinates) for a single image, computed once
+    and shared between the feature detections on that image (e.g. within one detect_features call).
+    The image must not be modified while the context is in use.
+
+    args:
+        img: the image data (np.array)
+    """
+
+    def __init__(self, img: np.ndarray) -> None:
+        self.image = img
+        self._edges = {}  # (sigma, roi bounds): edge map
+        self._edge_px = {}  # sigma: edge pixel coordinates
+        self._lock = threading.Lock()
+
+    def edges(self, sigma: float = 3, roi: tuple[slice, slice] = None) -> np.ndarray:
+        """Canny edge map (read only) of the full image, or of the region of interest only.
+        Region edge maps are cropped from the full edge map if it has already been calculated.
+
+        args:
+            sigma: canny sigma (float)
+            roi: region of interest (slice, slice), see roi_around_point
+
+        return:
+            edges: edge map, with the shape of the region of interest (np.array)
+        """
+        full_key = (sigma, None)
+        with self._lock:
+            if roi is not None:
+                if full_key in self._edges:
+                    return self._edges[full_key][roi]
+                key = (sigma, roi_bounds(self.image.shape, roi))
+            else:
+                key = full_key
+
+            if key not in self._edges:
+                if roi is None:
+                    edges = edge_detection(self.image, sigma=sigma)
+                else:
+                    edges = edge_detection_roi(self.image, roi, sigma=sigma)
+                edges.flags.writeable = False
+                self._edges[key] = edges
+            return self._edges[key]
+
+    def edge_px(self, sigma: float = 3) -> np.ndarray:
+        """Canny edge pixel coordinates (n, 2) in (y, x) row-major order"""
+        edges = self.edges(sigma)
+        with self._lock:
+            if sigma not in self._edge_px:
+                self._edge_px[sigma] = np.argwhere(edges)
+            return self._edge_px[sigma]
+
+
+@tracing.traced("detection")
 def detect_features(img: AdornedImage, ref_image:AdornedImage, features: tuple[DetectionFeature]) -> list[DetectionFeature]:
     """
 
@@ -44,8 +100,13 @@ def detect_features(img: AdornedImage, ref_image:AdornedImage, features: tuple[D
         detection_features [DetectionFeature, DetectionFeature]: the detected feature coordinates and types
     """
 
+    tracing.annotate(image_size=img.data.shape, features=[feature.detection_type.name for feature in features])
+
     detection_features = []
 
+    # edge maps are shared between the features on this image
+    context = FeatureContext(img.data)
+
     for feature in features:
         
         det_type = feature.detection_type
@@ -62,16 +123,16 @@ def detect_features(img: AdornedImage, ref_image:AdornedImage, features: tuple[D
             feature_px = initial_point
 
         if det_type == DetectionType.NeedleTip:
-            feature_px = detect_needle_tip_v3(img, initial_point)
+            feature_px = detect_needle_tip_v3(img, initial_point, context=context)
 
         if det_type == DetectionType.LamellaCentre:
-            feature_px = detect_landing_post_v2(img, initial_point) # TODO: fix 
+            feature_px = detect_landing_post_v2(img, initial_point, context=context) # TODO: fix 
 
         if det_type == DetectionType.LamellaEdge:
-            feature_px = detect_lamella_edge(img)
+            feature_px = detect_lamella_edge(img, context=context)
 
         if det_type == DetectionType.LandingPost:
-            feature_px = detect_landing_post_v2(img, initial_point)
+            feature_px = detect_landing_post_v2(img, initial_point, context=context)
 
         detection_features.append(
             DetectionFeature(detection_type=det_type, feature_px=feature_px)
@@ -79,6 +140,7 @@ def detect_features(img: AdornedImage, ref_image:AdornedImage, features: tuple[D
 
     return detection_features
 
+@tracing.traced("detection")
 def locate_shift_between_features(adorned_img: AdornedImage, ref_image: AdornedImage, features: tuple[DetectionFeature]):
     """
     Calculate the distance between two features in the image coordinate system.
@@ -137,14 +199,11 @@ def filter_selected_masks(mask: np.ndarray, shift_type: tuple[DetectionType]) ->
     """Combine only the masks for the selected detection types"""
     c1 = DETECTION_COLOURS_UINT8[shift_type[0]]
     c2 = DETECTION_COLOURS_UINT8[shift_type[1]]
-    
-    # get mask for first detection type
-    mask1, _ = extract_class_pixels(mask, color=c1)
-    # get mask for second detection type
-    mask2, _ = extract_class_pixels(mask, color=c2)
 
-    # combine masks
-    mask_combined = mask1 + mask2 
+    # label both detection types in a single pass, and map the labels back to their colours
+    mask = np.asarray(mask)
+    palette = np.array([(0, 0, 0), c1, c2], dtype=mask.dtype)
+    mask_combined = palette[label_mask(mask, [c1, c2])]
 
     return mask_combined
 
@@ -163,11 +222,96 @@ def extract_class_pixels(mask, color):
     """
     # extract only label pixels to find edges
     class_mask = np.zeros_like(mask)
-    idx = np.where(np.all(mask == color, axis=-1))
+    idx = np.nonzero(pack_rgb(mask) == _pack_colour(color))
     class_mask[idx] = color
 
     return class_mask, idx
 
+
+def pack_rgb(mask: np.ndarray) -> np.ndarray:
+    """ Pack an rgb mask into a single uint32 value per pixel (r << 16 | g << 8 | b)
+
+    args:
+        mask: rgb mask (np.array)
+
+    return:
+        packed: packed mask (np.array)
+    """
+    mask = np.asarray(mask)
+    packed = mask[..., 0].astype(np.uint32) << 16
+    packed |= mask[..., 1].astype(np.uint32) << 8
+    packed |= mask[..., 2].astype(np.uint32)
+    return packed
+
+
+def _pack_colour(color: tuple) -> int:
+    return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+
+
+def label_mask(mask: np.ndarray, colours: list[tuple]) -> np.ndarray:
+    """ Convert an rgb mask into an integer label image
+
+    args:
+        mask: rgb detection mask (np.array)
+        colours: the class colours (list of rgb tuples)
+
+    return:
+        labels: label image, 0 for unlisted colours and i + 1 for colours[i] (np.array)
+    """
+    packed = pack_rgb(mask)
+    if len(colours) == 0:
+        return np.zeros(packed.shape, dtype=np.int32)
+
+    lut = np.array([_pack_colour(c) for c in colours], dtype=np.uint32)
+
+    order = np.argsort(lut, kind="stable")
+    sorted_lut = lut[order]
+    idx = np.searchsorted(sorted_lut, packed)
+    idx_clipped = np.minimum(idx, len(lut) - 1)
+    found = sorted_lut[idx_clipped] == packed
+
+    labels = np.zeros(packed.shape, dtype=np.int32)
+    labels[found] = order[idx_clipped[found]] + 1
+
+    return labels
+
+
+def mask_statistics(mask: np.ndarray, colours: list[tuple]) -> dict[tuple, det_utils.ClassStatistics]:
+    """ Calculate the pixel count, centre (mean) point and bounding box of each class in a single pass
+
+    args:
+        mask: rgb detection mask (np.array)
+        colours: the class colours (list of rgb tuples)
+
+    return:
+        statistics: class statistics for each colour, empty classes have a zero count, centre and bbox (dict)
+    """
+    colours = [tuple(c) for c in colours]
+    labels = label_mask(mask, colours)
+    n = len(colours) + 1
+
+    # per row and per column class histograms (one bincount each)
+    h, w = labels.shape
+    row_hist = np.bincount((labels + n * np.arange(h)[:, None]).ravel(), minlength=h * n).reshape(h, n)
+    col_hist = np.bincount((labels + n * np.arange(w)[None, :]).ravel(), minlength=w * n).reshape(w, n)
+
+    counts = row_hist.sum(axis=0)
+    sum_y = np.arange(h) @ row_hist
+    sum_x = np.arange(w) @ col_hist
+
+    statistics = {}
+    for i, colour in enumerate(colours, 1):
+        count = int(counts[i])
+        centre, bbox = Point(x=0, y=0), (0, 0, 0, 0)
+        if count:
+            centre = Point(x=int(sum_x[i] / count), y=int(sum_y[i] / count))
+            rows, cols = np.flatnonzero(row_hist[:, i]), np.flatnonzero(col_hist[:, i])
+            bbox = (int(rows[0]), int(cols[0]), int(rows[-1]), int(cols[-1]))
+
+        statistics[colour] = det_utils.ClassStatistics(colour=colour, count=count, centre=centre, bbox=bbox)
+
+    return statistics
+
 def draw_overlay(img: np.ndarray, mask: np.ndarray, alpha:float=0.2) -> np.ndarray:
     """ Draw the detection overlay onto base image. Required to blend mixed grayscale / rgb images
 
@@ -198,47 +342,75 @@ def draw_overlay(img: np.ndarray, mask: np.ndarray, alpha:float=0.2) -> np.ndarr
 
     return np.array(alpha_blend)
 
-def detect_lamella_edge(img:AdornedImage):
+def detect_lamella_edge(img:AdornedImage, context: FeatureContext = None, roi: tuple[slice, slice] = None):
     
-    beam_type = img.metadata.acquisition.beam_type
+    # region of interest (bottom left of the image)
+    if roi is None:
+        beam_type = img.metadata.acquisition.beam_type
 
-    if beam_type == "Electron":
-        pt = Point(x=int(img.data.shape[1] // 2.4), y=int(img.data.shape[0]*0.47)) # eb mask
-    if beam_type == "Ion":
-        pt = Point(x=int(img.data.shape[1] // 2.2), y=int(img.data.shape[0]*0.3)) # ib mask
+        if beam_type == "Electron":
+            pt = Point(x=int(img.data.shape[1] // 2.4), y=int(img.data.shape[0]*0.47)) # eb mask
+        if beam_type == "Ion":
+            pt = Point(x=int(img.data.shape[1] // 2.2), y=int(img.data.shape[0]*0.3)) # ib mask
 
-    # ib mask
-    mask = np.zeros_like(img.data)
-    mask[pt.y:, :pt.x] = 1
-    
-    edge = edge_detection(img.data, sigma=3)  
-    edge_mask = edge * mask
+        roi = (slice(pt.y, None), slice(None, pt.x))
+
+    # edge detection only in the region of interest
+    context = context or FeatureContext(img.data)
+    edge_mask = np.zeros(img.data.shape, dtype=bool)
+    edge_mask[roi] = context.edges(sigma=3, roi=roi)
     lamella_edge = detect_right_edge_v2(edge_mask)
 
     return lamella_edge
 
 
-def detect_needle_tip_v2(ref_image: AdornedImage, new_image:AdornedImage, initial_point: Point = Point(400, 200) ) -> Point:
+def needle_quadrant_roi(image: AdornedImage) -> tuple[slice, slice]:
+    """ The image quadrant the needle is expected in, for each beam type
 
-    minus = calibration.normalise_image(ref_image) - calibration.normalise_image(new_image)
+    args:
+        image: the needle image (AdornedImage)
 
-    filt = ndi.filters.gaussian_filter(minus, sigma=12)
+    return:
+        roi: the region of interest (slice, slice)
+    """
+    beam_type = image.metadata.acquisition.beam_type
+    if beam_type == "Electron":
+        pt = Point(x=int(image.data.shape[1] * 0.3), y=int(image.data.shape[0]*0.3)) # eb mask, top left corner
+        return slice(None, pt.y), slice(None, pt.x)
+    if beam_type == "Ion":
+        pt = Point(x=int(image.data.shape[1] * 0.5), y=int(image.data.shape[0]*0.5)) # ib mask, bottom, left corner
+        return slice(pt.y, None), slice(None, pt.x)
 
-    edge = edge_detection(filt, sigma=3)  # edges
+    return slice(None), slice(None)
 
-    # mask after edge detection
-    mask = np.zeros_like(ref_image.data)
-    
+
+def detect_needle_tip_v2(ref_image: AdornedImage, new_image:AdornedImage, initial_point: Point = Point(400, 200), roi: tuple[slice, slice] = None) -> Point:
+    """ Detect the needle tip from the difference between a reference and a new image
+
+    args:
+        ref_image: the reference image (AdornedImage)
+        new_image: the new image (AdornedImage)
+        initial_point: the initial needle point, for electron images (Point)
+        roi: region of interest, e.g. needle_quadrant_roi(ref_image). Defaults to the full image.
+
+    return:
+        needle: the needle tip point (Point)
+    """
     beam_type = ref_image.metadata.acquisition.beam_type
-    if beam_type == "Electron":
-        pt = Point(x=int(ref_image.data.shape[1] * 0.3), y=int(ref_image.data.shape[0]*0.3)) # eb mask, top left corner
-        mask[:pt.y, :pt.x] = 1
-    if beam_type == "Ion":
-        pt = Point(x=int(ref_image.data.shape[1] * 0.5), y=int(ref_image.data.shape[0]*0.5)) # ib mask, bottom, left corner
-        mask[pt.y:, :pt.x] = 1
-        
-    mask = np.ones_like(ref_image.data)
-    edge_mask = edge * mask
+
+    minus = image_utils.normalise_image(ref_image) - image_utils.normalise_image(new_image)
+
+    # filter and detect edges only in the (padded) region of interest
+    if roi is None:
+        roi = slice(None), slice(None)
+    y0, y1, x0, x1 = roi_bounds(minus.shape, roi)
+    crop, inner = _padded_crop(minus.shape, (y0, y1, x0, x1), pad=_edge_pad(3) + int(4 * 12 + 0.5))
+
+    filt = ndi.gaussian_filter(minus[crop], sigma=12)
+    edge = edge_detection(filt, sigma=3)  # edges
+
+    edge_mask = np.zeros(minus.shape, dtype=bool)
+    edge_mask[y0:y1, x0:x1] = edge[inner]
 
     if beam_type == "Electron":
         needle = detect_closest_edge_v2(edge_mask, initial_point)  # closest edge  
@@ -257,9 +429,10 @@ def detect_needle_tip_v2(ref_image: AdornedImage, new_image:AdornedImage, initia
 
     return needle 
 
-def detect_needle_tip_v3(image:AdornedImage, initial_point: Point = None) -> Point:
+def detect_needle_tip_v3(image:AdornedImage, initial_point: Point = None, context: FeatureContext = None) -> Point:
 
-    edge = edge_detection(image.data, sigma=3)  # edges
+    context = context or FeatureContext(image.data)
+    edge = context.edges(sigma=3)  # edges
 
     # needle = detect_closest_edge_v2(edge, initial_point)
     needle = detect_right_edge_v2(edge)   # right most edge
@@ -267,13 +440,54 @@ def detect_needle_tip_v3(image:AdornedImage, initial_point: Point = None) -> Poi
 
     return needle
 
-def detect_landing_post_v2(img: AdornedImage, landing_pt: Point) -> Point:
+def detect_landing_post_v2(img: AdornedImage, landing_pt: Point, context: FeatureContext = None) -> Point:
     landing_pt = Point(x=img.data.shape[1] // 2, y=img.data.shape[0] // 2)
-    edge = edge_detection(img.data, sigma=3)
-    feature_px = detect_closest_edge_v2(edge, landing_pt)
+    context = context or FeatureContext(img.data)
+    feature_px = detect_closest_edge_roi(context, landing_pt, sigma=3)
     return feature_px
 
 
+def detect_closest_edge_roi(context: FeatureContext, landing_pt: Point, sigma: float = 3, size: int = 256) -> Point:
+    """ Identify the closest edge point to the selected point, detecting edges in a region of interest
+    around the point. The region is doubled until the closest edge is nearer than the region boundary,
+    so the result approximates detect_closest_edge_v2 on the full edge map (see edge_detection_roi).
+
+    args:
+        context: the feature context for the image (FeatureContext)
+        landing_pt: the initial landing point pixel (Point)
+        sigma: canny sigma (float)
+        size: the initial region of interest size (int)
+    return:
+        landing_edge_pt: the closest edge point to the selected point (Point)
+    """
+    shape = context.image.shape
+
+    while True:
+        roi = roi_around_point(shape, landing_pt, size)
+        y0, y1, x0, x1 = roi_bounds(shape, roi)
+        full_image = (y0, y1, x0, x1) == (0, shape[0], 0, shape[1])
+
+        edge_px = np.argwhere(context.edges(sigma=sigma, roi=roi))
+        if len(edge_px):
+            pt = detect_closest_edge_v2(None, Point(x=landing_pt.x - x0, y=landing_pt.y - y0), edge_px=edge_px)
+            closest = Point(x=pt.x + x0, y=pt.y + y0)
+
+            # distance to the region boundaries (excluding the image borders)
+            margin = min(
+                landing_pt.y - y0 if y0 > 0 else np.inf,
+                y1 - 1 - landing_pt.y if y1 < shape[0] else np.inf,
+                landing_pt.x - x0 if x0 > 0 else np.inf,
+                x1 - 1 - landing_pt.x if x1 < shape[1] else np.inf,
+            )
+            if full_image or np.hypot(closest.x - landing_pt.x, closest.y - landing_pt.y) <= margin:
+                return closest
+
+        if full_image:
+            return Point(x=0, y=0)
+
+        size *= 2
+
+
 def detect_centre_point(mask: np.ndarray, color: tuple, threshold:int=25) -> Point:
     """ Detect the centre (mean) point of the mask for a given color (label)
 
@@ -286,21 +500,13 @@ def detect_centre_point(mask: np.ndarray, color: tuple, threshold:int=25) -> Poi
 
         centre_px: the pixel coordinates of the centre point of the feature (tuple)
     """
-    centre_px = Point(x=0, y=0)
-
-    # extract class pixels
-    class_mask, idx = extract_class_pixels(mask, color)
+    stats = mask_statistics(mask, [color])[tuple(color)]
 
     # only return a centre point if detection is above a threshold
-    if len(idx[0]) > threshold:
-        # get the centre point of each coordinate
-        y_mid = int(np.mean(idx[0]))
-        x_mid = int(np.mean(idx[1]))
+    if stats.count > threshold:
+        return stats.centre
 
-        # centre coordinate as tuple
-        centre_px = Point(x=x_mid, y=y_mid )
-
-    return centre_px
+    return Point(x=0, y=0)
 
 def detect_right_edge_v2(mask: np.ndarray, threshold=25, left=False) -> Point:
 
@@ -334,40 +540,120 @@ def edge_detection(img: np.ndarray, sigma=3) -> np.ndarray:
     return feature.canny(img, sigma=sigma)  # sigma higher usually better
 
 
-def detect_closest_edge_v2(mask: np.ndarray, landing_pt: Point) -> tuple[Point, np.ndarray]:
+def edge_detection_roi(img: np.ndarray, roi: tuple[slice, slice], sigma=3) -> np.ndarray:
+    """ Canny edge detection in a region of interest only. Edges are detected on a crop padded
+    by the canny filter support, so the gradients and strong edges match the full image edge map
+    inside the region. This is an approximation: hysteresis thresholding is non-local, so weak
+    edges that are only connected to strong edges outside the padded crop can differ.
+
+    args:
+        img: the image (np.array)
+        roi: the region of interest (slice, slice)
+        sigma: canny sigma (float)
+    return:
+        edges: edge map, with the shape of the region of interest (np.array)
+    """
+    crop, inner = _padded_crop(img.shape, roi_bounds(img.shape, roi), pad=_edge_pad(sigma))
+    return edge_detection(img[crop], sigma=sigma)[inner]
+
+
+def roi_around_point(shape: tuple, point: Point, size: int) -> tuple[slice, slice]:
+    """ Square region of interest centred on a point, clipped to the image
+
+    args:
+        shape: the image shape (tuple)
+        point: the centre point (Point)
+        size: the region size (int)
+    return:
+        roi: the region of interest (slice, slice)
+    """
+    half = size // 2
+    y, x = int(point.y), int(point.x)
+    return (
+        slice(max(0, y - half), min(shape[0], y + half + 1)),
+        slice(max(0, x - half), min(shape[1], x + half + 1)),
+    )
+
+
+def roi_bounds(shape: tuple, roi: tuple[slice, slice]) -> tuple[int, int, int, int]:
+    """ Region of interest bounds (y0, y1, x0, x1), clipped to the image"""
+    y0, y1, _ = roi[0].indices(shape[0])
+    x0, x1, _ = roi[1].indices(shape[1])
+    return y0, max(y0, y1), x0, max(x0, x1)
+
+
+def _edge_pad(sigma: float) -> int:
+    # gaussian support (truncate=4) plus the sobel / non-maximum suppression neighbourhood
+    return int(4 * sigma + 0.5) + 2
+
+
+def _padded_crop(shape: tuple, bounds: tuple, pad: int) -> tuple[tuple[slice, slice], tuple[slice, slice]]:
+    # padded crop of the image, and the region of interest within the crop
+    y0, y1, x0, x1 = bounds
+    py0, py1 = max(0, y0 - pad), min(shape[0], y1 + pad)
+    px0, px1 = max(0, x0 - pad), min(shape[1], x1 + pad)
+
+    crop = slice(py0, py1), slice(px0, px1)
+    inner = slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0)
+
+    return crop, inner
+
+
+def detect_closest_edge_v2(mask: np.ndarray, landing_pt: Point, edge_px: np.ndarray = None) -> Point:
     """ Identify the closest edge point to the initially selected point
 
     args:
-        img: base image (np.ndarray)
-        landing_px: the initial landing point pixel (tuple) (y, x) format
+        mask: the edge mask (np.array)
+        landing_pt: the initial landing point pixel (Point)
+        edge_px: precomputed edge pixel coordinates of the mask, see FeatureContext.edge_px (np.array)
     return:
-        landing_edge_pt: the closest edge point to the intitially selected point (tuple)
-        edges: the edge mask (np.array)
+        landing_edge_pt: the closest edge point to the intitially selected point (Point),
+            ties are broken by the first edge pixel in row-major order
     """
 
     # identify edge pixels
-    landing_px = (landing_pt.y, landing_pt.x)
-    edge_mask = np.where(mask)
-    edge_px = list(zip(edge_mask[0], edge_mask[1]))
+    if edge_px is None:
+        edge_px = np.argwhere(mask)
 
-    # set min distance
-    min_dst = np.inf
+    if len(edge_px) == 0:
+        return Point(x=0, y=0)
 
-    # TODO: vectorise this like
-    # https://scikit-learn.org/stable/modules/generated/sklearn.metrics.pairwise.euclidean_distances.html
+    # squared distances are exact for integer pixels, so argmin matches the first minimum
+    diff = edge_px - np.array([landing_pt.y, landing_pt.x], dtype=float)
+    dst = np.einsum("ij,ij->i", diff, diff)
+    landing_edge_px = edge_px[np.argmin(dst)]
 
-    landing_edge_px = (0, 0)
-    for px in edge_px:
+    return Point(x=int(landing_edge_px[1]), y=int(landing_edge_px[0]))
 
-        # distance between edges and landing point
-        dst = distance.euclidean(landing_px, px)
 
-        # select point with min
-        if dst < min_dst:
-            min_dst = dst
-            landing_edge_px = px
+def detect_closest_edges(mask: np.ndarray, landing_pts: list[Point]) -> list[Point]:
+    """ Identify the closest edge point to each of the selected points, using a kd-tree of the edge pixels
 
-    return Point(x=landing_edge_px[1], y=landing_edge_px[0])
+    args:
+        mask: the edge mask (np.array)
+        landing_pts: the initial landing point pixels (list[Point])
+    return:
+        landing_edge_pts: the closest edge point to each point (list[Point]), ties are broken
+            by the first edge pixel in row-major order (as detect_closest_edge_v2)
+    """
+
+    edge_px = np.argwhere(mask)
+
+    if len(edge_px) == 0 or len(landing_pts) == 0:
+        return [Point(x=0, y=0) for _ in landing_pts]
+
+    query_px = np.array([(pt.y, pt.x) for pt in landing_pts], dtype=float)
+
+    tree = cKDTree(edge_px)
+    dst, idx = tree.query(query_px)
+
+    # break ties consistently: the edge pixels are in row-major order, so take the lowest index
+    eps = 1e-9 * np.maximum(dst, 1)
+    for i, candidates in enumerate(tree.query_ball_point(query_px, dst + eps)):
+        if len(candidates) > 1:
+            idx[i] = min(candidates)
+
+    return [Point(x=int(edge_px[i][1]), y=int(edge_px[i][0])) for i in idx]
 
 def detect_bounding_box(mask, color, threshold=25):
     """ Detect the bounding edge points of the mask for a given color (label)
@@ -379,39 +665,14 @@ def detect_bounding_box(mask, color, threshold=25):
 
     return:
 
-        edge_px: the pixel coordinates of the edge points of the feature list((tuple))
+        bbox: the bounding box of the feature (min_row, min_col, max_row, max_col)
     """
+    stats = mask_statistics(mask, [color])[tuple(color)]
 
-    top_px, bottom_px, left_px, right_px = (0, 0), (0, 0), (0, 0), (0, 0)
-
-    # extract class pixels
-    class_mask, idx = extract_class_pixels(mask, color)
-
-    # only return an edge point if detection is above a threshold
-
-    if len(idx[0]) > threshold:
-        # convert mask to coordinates
-        px = list(zip(idx[0], idx[1]))
-
-        # get index of each value
-        top_idx = np.argmin(idx[0])
-        bottom_idx = np.argmax(idx[0])
-        left_idx = np.argmin(idx[1])
-        right_idx = np.argmax(idx[1])
-
-        # pixel coordinates
-        top_px = px[top_idx]
-        bottom_px = px[bottom_idx]
-        left_px = px[left_idx]
-        right_px = px[right_idx]
-
-    # bbox should be (x0, y0), (x1, y1)
-    x0 = top_px[0]
-    y0 = left_px[1]
-    x1 = bottom_px[0]
-    y1 = right_px[1]
-
-    bbox = (x0, y0, x1, y1)
+    # only return a bounding box if detection is above a threshold
+    bbox = (0, 0, 0, 0)
+    if stats.count > threshold:
+        bbox = stats.bbox
 
     return bbox
 
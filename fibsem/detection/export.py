@@ -0,0 +1,189 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MANIFEST_FILENAME = "manifest.jsonl"
+LABELLING_PATTERN = "**/*label*.tif"
+
+
+def find_labelling_images(paths: list[Path], pattern: str = LABELLING_PATTERN) -> list[str]:
+    """Find all the images identified for retraining (with the _label postfix) under the session directories
+
+    Args:
+        paths (list[Path]): session directories
+        pattern (str, optional): glob pattern (relative to each path). Defaults to LABELLING_PATTERN.
+
+    Returns:
+        list[str]: image filenames
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+
+    filenames = []
+    for path in paths:
+        filenames.extend(glob.glob(os.path.join(path, pattern), recursive=True))
+
+    return sorted(set(filenames))
+
+
+def file_hash(filename: Path, chunk_size: int = 1 << 20) -> str:
+    """sha256 of the file contents"""
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def load_manifest(dest: Path) -> list[dict]:
+    """Load the export manifest (one entry per exported source image), skipping incomplete lines"""
+    manifest_path = os.path.join(dest, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return []
+
+    entries = []
+    with open(manifest_path, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logging.warning(f"Skipping incomplete manifest entry: {line!r}")
+
+    return entries
+
+
+class _Manifest:
+    # append only manifest, so an interrupted export can be resumed
+
+    def __init__(self, dest: str) -> None:
+        self.entries = load_manifest(dest)
+        self.sources = {(e["source"], e["size"], e["mtime"]) for e in self.entries}
+        self.hashes = {e["hash"]: e["filename"] for e in self.entries}
+        self._lock = threading.Lock()
+        self._file = open(os.path.join(dest, MANIFEST_FILENAME), "a")
+
+    def claim(self, digest: str, filename: str) -> tuple[bool, str]:
+        # returns (new, filename): only the first source with a given hash is exported
+        with self._lock:
+            if digest in self.hashes:
+                return False, self.hashes[digest]
+            self.hashes[digest] = filename
+            return True, filename
+
+    def release(self, digest: str) -> None:
+        with self._lock:
+            self.hashes.pop(digest, None)
+
+    def append(self, entry: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            self.entries.append(entry)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def export_labelling_images(
+    paths: list[Path],
+    dest: Path,
+    link: bool = False,
+    max_workers: int = 8,
+    pattern: str = LABELLING_PATTERN,
+) -> dict:
+    """Export the images identified for retraining from session directories into a single directory.
+
+    Images are named by content hash, so duplicates (across sessions, or repeated exports)
+    are only exported once. Each exported image is appended to dest/manifest.jsonl, and
+    images already in the manifest are skipped, so an interrupted export can be resumed.
+
+    Args:
+        paths (list[Path]): session directories to search
+        dest (Path): export directory
+        link (bool, optional): hardlink instead of copying (falls back to copying across devices). Defaults to False.
+        max_workers (int, optional): number of export threads. Defaults to 8.
+        pattern (str, optional): glob pattern for the images. Defaults to LABELLING_PATTERN.
+
+    Returns:
+        dict: number of images found, exported, duplicates, skipped (already exported) and failed
+    """
+    dest = str(dest)
+    os.makedirs(dest, exist_ok=True)
+
+    filenames = find_labelling_images(paths, pattern)
+    manifest = _Manifest(dest)
+    summary = {"found": len(filenames), "exported": 0, "duplicate": 0, "skipped": 0, "failed": 0}
+    summary_lock = threading.Lock()
+
+    logging.info(f"Exporting {len(filenames)} images for labelling to {dest}")
+
+    def _export(source: str) -> None:
+        stat = os.stat(source)
+        if (source, stat.st_size, stat.st_mtime_ns) in manifest.sources:
+            result = "skipped"
+        else:
+            result = _export_file(source, stat, dest, manifest, link)
+
+        with summary_lock:
+            summary[result] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(_export, fname) for fname in filenames]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Unable to export image: {e}")
+                    summary["failed"] += 1
+    finally:
+        manifest.close()
+
+    logging.info(f"Exported images for labelling: {summary}")
+
+    return summary
+
+
+def _export_file(source: str, stat: os.stat_result, dest: str, manifest: _Manifest, link: bool) -> str:
+    digest = file_hash(source)
+    new, filename = manifest.claim(digest, f"{digest[:16]}.tif")
+    destination = os.path.join(dest, filename)
+
+    if new:
+        try:
+            if not os.path.exists(destination):
+                _link_or_copy(source, destination, link)
+        except Exception:
+            manifest.release(digest)
+            raise
+
+    manifest.append({
+        "source": source,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": digest,
+        "filename": filename,
+        "duplicate": not new,
+    })
+
+    return "exported" if new else "duplicate"
+
+
+def _link_or_copy(source: str, destination: str, link: bool) -> None:
+    if link:
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass  # e.g. across devices
+
+    # copied to a temporary file and renamed, so an interrupted copy is never exported
+    tmp = f"{destination}.tmp"
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, destination)
@@ -0,0 +1,205 @@
+import glob
+import logging
+import os
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# FIB meta data key, stored as an ascii string tag
+FIB_METADATA_TAG = 34682
+
+INDEX_NAME = "metadata_index"
+INDEX_VERSION = 1
+
+# tiff field type: size in bytes
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 16: 8, 17: 8, 18: 8}
+
+
+def read_tiff_tag(filename: Path, tag: int = FIB_METADATA_TAG) -> bytes:
+    """Read the raw bytes of a tag from the first image file directory of a tiff,
+    without decoding the image.
+
+    Args:
+        filename (Path): tiff filename
+        tag (int, optional): tag id. Defaults to FIB_METADATA_TAG.
+
+    Returns:
+        bytes: tag value (None if the tag is not present)
+    """
+    with open(filename, "rb") as f:
+        header = f.read(16)
+        byteorder = {b"II": "<", b"MM": ">"}.get(header[:2])
+        if byteorder is None:
+            raise ValueError(f"{filename} is not a tiff file")
+
+        version = struct.unpack(f"{byteorder}H", header[2:4])[0]
+        if version == 42:  # classic tiff
+            offset = struct.unpack(f"{byteorder}I", header[4:8])[0]
+            count_fmt, entry_fmt, entry_size, inline_size = "H", "HHII", 12, 4
+        elif version == 43:  # bigtiff
+            offset = struct.unpack(f"{byteorder}Q", header[8:16])[0]
+            count_fmt, entry_fmt, entry_size, inline_size = "Q", "HHQQ", 20, 8
+        else:
+            raise ValueError(f"{filename} is not a tiff file (version {version})")
+
+        f.seek(offset)
+        count_size = struct.calcsize(count_fmt)
+        n_entries = struct.unpack(f"{byteorder}{count_fmt}", f.read(count_size))[0]
+        entries = f.read(n_entries * entry_size)
+
+        for i in range(n_entries):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            entry_tag, entry_type, count, value = struct.unpack(f"{byteorder}{entry_fmt}", entry)
+            if entry_tag != tag:
+                continue
+
+            size = count * _TIFF_TYPE_SIZES.get(entry_type, 1)
+            if size <= inline_size:
+                return entry[entry_size - inline_size:][:size]
+
+            f.seek(value)
+            return f.read(size)
+
+    return None
+
+
+def read_fib_metadata(filename: Path) -> str:
+    """Read the FIB metadata string from a tiff, without decoding the image"""
+    value = read_tiff_tag(filename, FIB_METADATA_TAG)
+    if value is None:
+        return None
+
+    return value.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+
+def parse_metadata_string(metadata: str) -> dict:
+    """Parse the FIB metadata string into a dictionary ({[Category].key: value}), with string values"""
+    metadata_dict = {}
+    category = ""
+    for item in metadata.split("\r\n"):
+
+        if item == "":
+            # skip blank lines
+            pass
+        elif re.match(r"\[(.*?)\]", item):
+            # find category, dont add to dict
+            category = item
+        else:
+            # meta data point
+            datum = item.split("=")
+            if len(datum) > 1:
+                metadata_dict[category + "." + datum[0]] = datum[1]
+
+    return metadata_dict
+
+
+def parse_value(value: str):
+    """Convert a metadata value to int or float where possible"""
+    for dtype in (int, float):
+        try:
+            return dtype(value)
+        except ValueError:
+            pass
+
+    return value
+
+
+def scan_metadata_file(filename: str) -> dict:
+    """Read the typed FIB metadata of a tiff
+
+    Args:
+        filename (str): tiff filename
+
+    Returns:
+        dict: typed metadata ({[Category].key: value}), and the filename
+    """
+    try:
+        metadata = read_fib_metadata(filename)
+    except (OSError, ValueError, struct.error) as e:
+        logging.warning(f"Unable to read metadata from {filename}: {e}")
+        metadata = None
+
+    metadata_dict = {}
+    if metadata is not None:
+        metadata_dict = {key: parse_value(value) for key, value in parse_metadata_string(metadata).items()}
+    metadata_dict["filename"] = filename
+
+    return metadata_dict
+
+
+def _scan_metadata_files(filenames: list[str]) -> list[dict]:
+    return [scan_metadata_file(fname) for fname in filenames]
+
+
+def scan_metadata(
+    path: Path,
+    pattern: str = "**/*.tif",
+    max_workers: int = None,
+    chunk_size: int = 64,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    """Read the FIB metadata of all the tiffs in a directory tree into a single dataframe.
+
+    Only the metadata tag bytes are read (the images aren't decoded). Files are scanned
+    on a process pool, and the results are cached in an index under config.USER_CACHE_DIR
+    (nothing is written to the scanned directory), so only new or modified files are read
+    on subsequent scans.
+
+    Args:
+        path (Path): directory to scan
+        pattern (str, optional): glob pattern (relative to path). Defaults to "**/*.tif".
+        max_workers (int, optional): number of processes, 0 to scan in this process. Defaults to the cpu count.
+        chunk_size (int, optional): number of files per process task. Defaults to 64.
+        use_cache (bool, optional): read / write the cached index. Defaults to True.
+
+    Returns:
+        pd.DataFrame: one row per file (columns are [Category].key, and filename)
+    """
+    from fibsem.detection import utils as det_utils
+
+    path = str(path)
+    filenames = sorted(glob.glob(os.path.join(path, pattern), recursive=True))
+
+    cached = {}
+    if use_cache:
+        index = det_utils.read_index_cache(path, INDEX_NAME, INDEX_VERSION)
+        if index is not None:
+            cached = index["files"]
+
+    # only scan new / modified files
+    files, stale = {}, []
+    for fname in filenames:
+        rel = os.path.relpath(fname, path)
+        stat = os.stat(fname)
+        key = [stat.st_mtime_ns, stat.st_size]
+        entry = cached.get(rel)
+        if entry is not None and entry["key"] == key:
+            files[rel] = entry
+        else:
+            files[rel] = {"key": key}
+            stale.append(fname)
+
+    chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+    if max_workers == 0 or len(chunks) <= 1:
+        results = list(map(_scan_metadata_files, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_scan_metadata_files, chunks))
+
+    for chunk in results:
+        for metadata in chunk:
+            rel = os.path.relpath(metadata.pop("filename"), path)
+            files[rel]["metadata"] = metadata
+
+    if use_cache and stale:
+        det_utils.write_index_cache(path, INDEX_NAME, INDEX_VERSION, {"files": files})
+
+    records = [
+        {**files[os.path.relpath(fname, path)]["metadata"], "filename": fname} for fname in filenames
+    ]
+    df = pd.DataFrame.from_records(records)
+
+    return df
@@ -1,17 +1,24 @@
+import csv
 import glob
+import hashlib
+import json
 import logging
 import os
 import re
 import shutil
+import threading
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator
 
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from autoscript_sdb_microscope_client.structures import AdornedImage
+from fibsem import config
 from fibsem.conversions import pixel_to_realspace_coordinate
 from fibsem.structures import Point
 from PIL import Image
@@ -40,6 +47,14 @@ class DetectionResult:
     microscope_coordinate: list[Point] = None
 
 
+@dataclass
+class ClassStatistics:
+    colour: tuple  # rgb
+    count: int  # number of pixels
+    centre: Point  # mean pixel (x, y)
+    bbox: tuple  # (min_row, min_col, max_row, max_col)
+
+
 # detection colour map
 DETECTION_TYPE_COLOURS = {
     DetectionType.LamellaCentre: (1, 0, 0, 1),
@@ -49,31 +64,59 @@ DETECTION_TYPE_COLOURS = {
     DetectionType.ImageCentre: (1, 1, 1, 1)
 }
 
-def decode_segmap(image, nc=3):
+# 0=background, 1=lamella, 2= needle
+SEGMENTATION_COLOURS = ((0, 0, 0), (255, 0, 0), (0, 255, 0))
+
+
+def decode_segmap(image, nc=3, colours: tuple = None, out: np.ndarray = None):
+
+    """ Decode segmentation class mask into an RGB image mask
+
+    args:
+        image: segmentation class mask, labels >= nc are left black (negative labels are clipped to 0) (np.array)
+        nc: number of classes (int)
+        colours: class colours (rgb tuples), classes without a colour are assigned one. Defaults to SEGMENTATION_COLOURS.
+        out: preallocated output buffer (image.shape + (3, ), uint8) (np.array)
+
+    return:
+        rgb_mask: rgb image mask (np.array)
+    """
+    image = np.asarray(image)
+    lut = _segmap_lut(nc, tuple(map(tuple, colours)) if colours is not None else SEGMENTATION_COLOURS)
+
+    # labels above the table are clipped to its last (black) entry
+    return np.take(lut, image, axis=0, out=out, mode="clip")
+
+
+def decode_segmap_batch(images, nc=3, colours: tuple = None, out: np.ndarray = None):
 
-    """ Decode segmentation class mask into an RGB image mask"""
+    """ Decode a stack of segmentation class masks (n, h, w) into RGB image masks (n, h, w, 3), see decode_segmap"""
+    images = np.asarray(images)
+    if images.ndim != 3:
+        raise ValueError(f"Expected a stack of segmentation masks (n, h, w), got shape {images.shape}")
 
-    # 0=background, 1=lamella, 2= needle
-    label_colors = np.array([(0, 0, 0),
-                                (255, 0, 0),
-                                (0, 255, 0)])
+    return decode_segmap(images, nc=nc, colours=colours, out=out)
 
-    # pre-allocate r, g, b channels as zero
-    r = np.zeros_like(image, dtype=np.uint8)
-    g = np.zeros_like(image, dtype=np.uint8)
-    b = np.zeros_like(image, dtype=np.uint8)
 
-    # apply the class label colours to each pixel
-    for l in range(0, nc):
-        idx = image == l
-        r[idx] = label_colors[l, 0]
-        g[idx] = label_colors[l, 1]
-        b[idx] = label_colors[l, 2]
+@lru_cache(maxsize=16)
+def _segmap_lut(nc: int, colours: tuple) -> np.ndarray:
+    # colour lookup table: classes [0, nc) are coloured, everything above is black
+    size = max(256, nc + 1)
+    lut = np.zeros((size, 3), dtype=np.uint8)
 
-    # stack rgb channels to form an image
-    rgb_mask = np.stack([r, g, b], axis=2)
-    return rgb_mask
+    for l in range(nc):
+        lut[l] = colours[l] if l < len(colours) else _class_colour(l)
 
+    lut.flags.writeable = False
+    return lut
+
+
+def _class_colour(label: int) -> tuple:
+    # distinct colours for additional classes (golden ratio hue steps)
+    import colorsys
+
+    r, g, b = colorsys.hsv_to_rgb((label * 0.618033988749895) % 1.0, 0.8, 1.0)
+    return int(r * 255), int(g * 255), int(b * 255)
 
 
 def convert_pixel_distance_to_metres(p1: Point, p2: Point, adorned_image: AdornedImage):
@@ -125,28 +168,10 @@ def scale_coordinate_to_image(point: Point, shape: tuple) -> Point:
 
 def parse_metadata(filename):
 
-    # FIB meta data key is 34682, comes as a string
-    img = Image.open(filename)
-    img_metadata = img.tag[34682][0]
-
-    # parse metadata
-    parsed_metadata = img_metadata.split("\r\n")
+    # FIB meta data key is 34682, comes as a string (read without decoding the image)
+    from fibsem.detection.metadata import parse_metadata_string, read_fib_metadata
 
-    metadata_dict = {}
-    for item in parsed_metadata:
-
-        if item == "":
-            # skip blank lines
-            pass
-        elif re.match(r"\[(.*?)\]", item):
-            # find category, dont add to dict
-            category = item
-        else:
-            # meta data point
-            datum = item.split("=")
-
-            # save to dictionary
-            metadata_dict[category + "." + datum[0]] = datum[1]
+    metadata_dict = parse_metadata_string(read_fib_metadata(filename))
 
     # add filename to metadata
     metadata_dict["filename"] = filename
@@ -157,73 +182,186 @@ def parse_metadata(filename):
     return df
 
 
-def extract_img_for_labelling(path, show=False):
+def extract_img_for_labelling(path, show=False, link: bool = False, max_workers: int = 8) -> dict:
     """Extract all the images that have been identified for retraining.
 
-    path: path to directory containing logged images
+    path: path to directory containing logged images (or a list of directories)
+    show: show each exported image
+    link: hardlink the images instead of copying
+    max_workers: number of export threads
 
-    """
-    import datetime
-    import random
-    import time
+    return: export summary, see detection.export.export_labelling_images
 
+    """
     import liftout
     import matplotlib.pyplot as plt
     from PIL import Image
 
+    from fibsem.detection import export
+
     # mkdir for copying images to
     data_path = os.path.join(os.path.dirname(liftout.__file__), "data", "retrain")
-    os.makedirs(data_path, exist_ok=True)
-    print(f"Searching in {path} for retraining images...")
-
-    # find all files for retraining (with _label postfix
-    filenames = glob.glob(os.path.join(path, "/**/*label*.tif"), recursive=True)
-    print(f"{len(filenames)} images found for relabelling")
-    print(f"Copying images to {data_path}...")
-
-    for i, fname in enumerate(filenames):
-        # tqdm?
-        print(f"Copying {i}/{len(filenames)}")
-        # basename = os.path.basename(fname)
-        datetime_str = datetime.datetime.fromtimestamp(time.time()).strftime(
-            "%Y%m%d.%H%M%S"
-        )
-        basename = f"{datetime_str}.{random.random()}.tif"  # use a random number to prevent duplicates at seconds time resolution
-        # print(fname, basename)
-        if show:
-            img = Image.open(fname)
+    logging.info(f"Searching in {path} for retraining images...")
+
+    summary = export.export_labelling_images(path, data_path, link=link, max_workers=max_workers)
+
+    if show:
+        for entry in export.load_manifest(data_path):
+            img = Image.open(os.path.join(data_path, entry["filename"]))
             plt.imshow(img, cmap="gray")
             plt.show()
 
-        source_path = os.path.join(fname)
-        destination_path = os.path.join(data_path, basename)
-        # print(f"Source: {source_path}")
-        # print(f"Destination: {destination_path}")
-        print("-" * 50)
-        shutil.copyfile(source_path, destination_path)
-
     # zip the image folder
     # shutil.make_archive(f"{path}/images", 'zip', label_dir)
 
+    return summary
+
+DETECTION_LOG_COLUMNS = ["label", "p1.type", "p1.x", "p1.y", "p2.type", "p2.x", "p2.y"]
+_detection_log_lock = threading.Lock()
+
+
 def write_data_to_csv(path: Path, info: list) -> None:
+    """Append a detection row to path/data.csv (the header is written for new files)"""
 
     dataframe_path = os.path.join(path, "data.csv")
 
-    cols = ["label", "p1.type", "p1.x", "p1.y", "p2.type", "p2.x", "p2.y"]
-    df_tmp = pd.DataFrame([info], columns=cols)
-    if os.path.exists(dataframe_path):
-        df = pd.read_csv(dataframe_path)
-        df = pd.concat([df, df_tmp], axis=0, ignore_index=True)
-    else:
-        df = df_tmp
-    df.to_csv(dataframe_path,index=False)
+    with _detection_log_lock:
+        # terminate a partially written row (e.g. after a crash), checked in binary mode
+        # as seeking to arbitrary offsets is undefined for text files
+        with open(dataframe_path, "ab+") as f:
+            new_file = f.seek(0, os.SEEK_END) == 0
+            if not new_file:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+        # append only, so previous rows are never rewritten
+        with open(dataframe_path, "a", newline="") as f:
+            if new_file:
+                csv.writer(f).writerow(DETECTION_LOG_COLUMNS)
+
+            csv.writer(f).writerow(info)
+            f.flush()
+            os.fsync(f.fileno())
 
     logging.info(f"Logged data to {dataframe_path}.")
 
 
+def read_detection_log(path: Path) -> Iterator[dict]:
+    """Read the detection rows from path/data.csv, skipping incomplete rows
+
+    Args:
+        path (Path): detection log directory
+
+    Yields:
+        dict: detection row (see DETECTION_LOG_COLUMNS), coordinates as float
+    """
+    dataframe_path = os.path.join(path, "data.csv")
+
+    with open(dataframe_path, "r", newline="") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            try:
+                for col in ("p1.x", "p1.y", "p2.x", "p2.y"):
+                    row[col] = float(row[col])
+                DetectionType[row["p1.type"]], DetectionType[row["p2.type"]]
+            except (TypeError, ValueError, KeyError):
+                logging.warning(f"Skipping incomplete detection log row {i}: {row}")
+                continue
+
+            yield row
+
+
+def index_cache_path(path: Path, name: str) -> str:
+    """Get the filename of a cached index of a directory. Indexes are stored in
+    config.USER_CACHE_DIR (keyed by the absolute directory path), never in the directory itself.
+
+    Args:
+        path (Path): indexed directory
+        name (str): index name
+
+    Returns:
+        str: index filename
+    """
+    digest = hashlib.sha1(os.path.abspath(str(path)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(config.USER_CACHE_DIR, "detection", f"{name}_{digest}.json")
+
+
+def read_index_cache(path: Path, name: str, version: int) -> dict:
+    """Read a cached directory index (see index_cache_path)
+
+    Args:
+        path (Path): indexed directory
+        name (str): index name
+        version (int): index format version
+
+    Returns:
+        dict: index, None if there is no index for this directory and version
+    """
+    filename = index_cache_path(path, name)
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename, "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Unable to read the {name} index {filename}: {e}")
+        return None
+
+    if index.get("version") != version or index.get("path") != os.path.abspath(str(path)):
+        return None
+
+    return index
+
 
-def load_detection_result(path: Path, data) -> DetectionResult:
-    """Read detection result from dataframe row, and return"""
+def write_index_cache(path: Path, name: str, version: int, index: dict) -> None:
+    """Write a cached directory index (see index_cache_path). The file is replaced
+    atomically, and failures are only logged.
+
+    Args:
+        path (Path): indexed directory
+        name (str): index name
+        version (int): index format version
+        index (dict): index (json serialisable)
+    """
+    filename = index_cache_path(path, name)
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump({**index, "version": version, "path": os.path.abspath(str(path))}, f)
+        os.replace(tmp, filename)
+    except OSError as e:
+        logging.warning(f"Unable to write the {name} index {filename}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_detection_results(path: Path) -> Iterator[DetectionResult]:
+    """Lazily load all the detection results logged in path (images are loaded as each result is requested)
+
+    Args:
+        path (Path): detection log directory
+
+    Yields:
+        DetectionResult: detection result
+    """
+    from fibsem.detection.dataset import DetectionDataset
+
+    # indexed once (and cached), rather than globbing the directory per row
+    yield from DetectionDataset(path)
+
+
+def load_detection_result(path: Path, data, filenames: list[str] = None) -> DetectionResult:
+    """Read detection result from dataframe row, and return
+
+    Args:
+        path (Path): detection log directory
+        data: detection row (dataframe row or dict)
+        filenames (list[str], optional): image filenames in path (to avoid listing the directory per row).
+            Defaults to None.
+    """
 
     label = data["label"]
     p1_type = DetectionType[data["p1.type"]]
@@ -231,7 +369,16 @@ def load_detection_result(path: Path, data) -> DetectionResult:
     p2_type = DetectionType[data["p2.type"]]
     p2 = Point(x=data["p2.x"], y=data["p2.y"])
 
-    fname = glob.glob(os.path.join(path, f"*{label}*.tif"))[0]
+    if filenames is None:
+        fname = next(iter(glob.glob(os.path.join(path, f"*{label}*.tif"))), None)
+    else:
+        fname = next((fname for fname in filenames if label in os.path.basename(fname)), None)
+
+    if fname is None:
+        err = f"No image found for detection {label} in {path}"
+        logging.error(err)
+        raise FileNotFoundError(err)
+
     img = AdornedImage.load(fname)
 
     p1 = scale_coordinate_to_image(p1, img.data.shape)
@@ -0,0 +1,221 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from autoscript_sdb_microscope_client.structures import AdornedImage
+from PIL import GifImagePlugin, Image
+
+ANIMATION_FORMATS = (".gif", ".mp4", ".webm")
+
+
+def load_frame(filename: Path, downsample: int = 1) -> np.ndarray:
+    """Load an image as an 8-bit animation frame
+
+    Args:
+        filename (Path): image filename
+        downsample (int, optional): downsampling factor (block averaged). Defaults to 1.
+
+    Returns:
+        np.ndarray: uint8 frame
+    """
+    data = AdornedImage.load(filename).data
+    frame = _to_uint8(data)
+
+    if downsample > 1:
+        frame = np.asarray(Image.fromarray(frame).reduce(int(downsample)))
+
+    return frame
+
+
+def iter_frames(filenames: list[Path], downsample: int = 1, max_workers: int = 4, prefetch: int = 8):
+    """Lazily load frames in order. At most prefetch frames are loaded (on a thread pool)
+    ahead of the frame being used, so memory doesn't depend on the number of frames.
+
+    Args:
+        filenames (list[Path]): image filenames, in frame order
+        downsample (int, optional): downsampling factor. Defaults to 1.
+        max_workers (int, optional): number of loading threads. Defaults to 4.
+        prefetch (int, optional): number of frames loaded ahead. Defaults to 8.
+
+    Yields:
+        np.ndarray: uint8 frame
+    """
+    filenames = iter(filenames)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = deque(
+            executor.submit(load_frame, fname, downsample) for _, fname in zip(range(max(1, prefetch)), filenames)
+        )
+
+        while futures:
+            frame = futures.popleft().result()
+
+            fname = next(filenames, None)
+            if fname is not None:
+                futures.append(executor.submit(load_frame, fname, downsample))
+
+            yield frame
+
+
+class GifWriter:
+    """Incremental gif encoder. Each frame is encoded and written as it is appended,
+    so only the current frame is held in memory.
+
+    Args:
+        filename (Path): gif filename
+        duration (int, optional): frame duration (ms). Defaults to 100.
+        loop (int, optional): number of loops (0: forever, None: play once). Defaults to 0.
+    """
+
+    def __init__(self, filename: Path, duration: int = 100, loop: int = 0) -> None:
+        self.filename = str(filename)
+        self.duration = duration
+        self.loop = loop
+        self.n_frames = 0
+        self._file = open(self.filename, "wb")
+
+    def append(self, frame: np.ndarray) -> None:
+        im = _to_gif_image(frame)
+
+        if self.n_frames == 0:
+            info = {"duration": self.duration}
+            if self.loop is not None:
+                info["loop"] = self.loop
+            header, _ = GifImagePlugin.getheader(im, None, info)
+            self._file.write(b"".join(header))
+
+        # each frame has its own (local) colour table, rgb frames are quantized separately
+        for chunk in GifImagePlugin.getdata(im, duration=self.duration, include_color_table=True):
+            self._file.write(chunk)
+        self.n_frames += 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.write(b";")  # gif trailer
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class VideoWriter:
+    """Incremental mp4 / webm encoder (ffmpeg, via imageio-ffmpeg)
+
+    Args:
+        filename (Path): video filename (.mp4 or .webm)
+        fps (float, optional): frames per second. Defaults to 10.
+    """
+
+    def __init__(self, filename: Path, fps: float = 10) -> None:
+        try:
+            import imageio.v2 as imageio
+            import imageio_ffmpeg  # noqa: F401
+        except ImportError as e:
+            err = f"Writing {os.path.splitext(str(filename))[1]} animations requires imageio-ffmpeg (pip install imageio-ffmpeg): {e}"
+            logging.error(err)
+            raise ImportError(err)
+
+        self.filename = str(filename)
+        self.n_frames = 0
+        codec = "libvpx-vp9" if self.filename.endswith(".webm") else "libx264"
+        self._writer = imageio.get_writer(
+            self.filename, format="FFMPEG", mode="I", fps=fps, codec=codec, pixelformat="yuv420p"
+        )
+
+    def append(self, frame: np.ndarray) -> None:
+        self._writer.append_data(frame)
+        self.n_frames += 1
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def get_writer(filename: Path, duration: int = 100, loop: int = 0):
+    """Get an incremental animation writer for the file format (.gif, .mp4, .webm)
+
+    Args:
+        filename (Path): animation filename
+        duration (int, optional): frame duration (ms). Defaults to 100.
+        loop (int, optional): number of loops (gif only). Defaults to 0.
+
+    Returns:
+        GifWriter | VideoWriter: animation writer
+    """
+    ext = os.path.splitext(str(filename))[1].lower()
+    if ext == ".gif":
+        return GifWriter(filename, duration=duration, loop=loop)
+    if ext in (".mp4", ".webm"):
+        return VideoWriter(filename, fps=1000 / duration)
+
+    err = f"Unsupported animation format {ext}, supported formats are {ANIMATION_FORMATS}"
+    logging.error(err)
+    raise ValueError(err)
+
+
+def write_animation(
+    filenames: list[Path],
+    output: Path,
+    duration: int = 100,
+    loop: int = 0,
+    downsample: int = 1,
+    max_workers: int = 4,
+    prefetch: int = 8,
+) -> int:
+    """Stream images into an animation (gif, mp4 or webm). Frames are loaded lazily and
+    encoded as they are loaded, so memory is bounded by the prefetch window, not the
+    number of frames.
+
+    Args:
+        filenames (list[Path]): image filenames, in frame order
+        output (Path): animation filename (the format is set by the extension)
+        duration (int, optional): frame duration (ms). Defaults to 100.
+        loop (int, optional): number of loops (gif only, 0: forever). Defaults to 0.
+        downsample (int, optional): downsampling factor. Defaults to 1.
+        max_workers (int, optional): number of loading threads. Defaults to 4.
+        prefetch (int, optional): number of frames loaded ahead. Defaults to 8.
+
+    Returns:
+        int: number of frames written
+    """
+    if len(filenames) == 0:
+        err = f"No images to write to {output}"
+        logging.error(err)
+        raise ValueError(err)
+
+    with get_writer(output, duration=duration, loop=loop) as writer:
+        for frame in iter_frames(filenames, downsample, max_workers, prefetch):
+            writer.append(frame)
+
+    return writer.n_frames
+
+
+def _to_uint8(data: np.ndarray) -> np.ndarray:
+    if data.dtype == np.uint8:
+        return data
+    if data.dtype == np.uint16:
+        return (data >> 8).astype(np.uint8)
+
+    data = data.astype(np.float32)
+    lo, hi = np.min(data), np.max(data)
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    return ((data - lo) * scale).astype(np.uint8)
+
+
+def _to_gif_image(frame: np.ndarray) -> Image.Image:
+    im = Image.fromarray(frame)
+    if im.mode not in ("L", "P"):
+        im = im.convert("RGB").quantize()  # per frame (local) palette
+    return im
@@ -0,0 +1,876 @@
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from fibsem import config
+from fibsem.imaging import fft, masks
+
+
+class CorrelationEngine:
+    """Fourier cross-correlation for a fixed image shape and dtype.
+
+    The bandpass filter, the fftshift of the output and the spectrum energy weights are
+    folded into precomputed half-spectrum arrays, so each correlation only needs two
+    real-to-complex forward transforms and one inverse transform. The engine holds no
+    per-call state, so a single instance can be shared between threads.
+
+    Args:
+        shape (tuple): image shape (rows, cols)
+        dtype (np.dtype, optional): image dtype (float32 or float64). Defaults to np.float64.
+        lp (int, optional): lowpass. Defaults to 128.
+        hp (int, optional): highpass. Defaults to 6.
+        sigma (int, optional): sigma (gaussian blur). Defaults to 6.
+        bp (bool, optional): use a bandpass. Defaults to True.
+        workers (int, optional): number of fft worker threads. Defaults to config.FFT_WORKERS.
+        backend (str, optional): fft backend name, see fibsem.imaging.fft. Defaults to the current backend.
+    """
+
+    def __init__(
+        self,
+        shape: tuple,
+        dtype: np.dtype = np.float64,
+        lp: int = 128,
+        hp: int = 6,
+        sigma: int = 6,
+        bp: bool = True,
+        workers: int = None,
+        backend: str = None,
+    ) -> None:
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+            self.dtype = np.dtype(np.float64)
+        self.lp, self.hp, self.sigma, self.bp = lp, hp, sigma, bp
+        self.workers = workers if workers is not None else config.FFT_WORKERS
+        self._fft = fft.get_backend(backend)
+        self.backend = self._fft.name
+        self.n_pixels = self.shape[0] * self.shape[1]
+
+        h, w = self.shape
+
+        # fftshift of the output, applied as a phase ramp in fourier space
+        ky = np.arange(h)[:, None] * (h // 2) / h
+        kx = np.arange(w // 2 + 1)[None, :] * (w // 2) / w
+        shift = np.exp(-2j * np.pi * (ky + kx))
+        if h % 2 == 0 and w % 2 == 0:
+            shift = np.round(shift.real)  # (-1)^(kx + ky)
+
+        if bp:
+            bandpass = masks.get_bandpass_mask(self.shape, lp=lp, hp=hp, sigma=sigma)
+            weight = _hermitian_half_spectrum(np.fft.ifftshift(bandpass) ** 2)
+
+            # each half-spectrum column (except dc / nyquist) stands in for its mirror
+            columns = np.full(w // 2 + 1, 2.0)
+            columns[0] = 1.0
+            if w % 2 == 0:
+                columns[-1] = 1.0
+
+            self._energy_weight = (weight * columns).astype(self.dtype)
+            self._filter = weight * shift
+        else:
+            self._energy_weight = None
+            self._filter = shift
+
+        real_dtype = self.dtype
+        complex_dtype = np.result_type(real_dtype, np.complex64)
+        self._filter = self._filter.astype(
+            complex_dtype if np.iscomplexobj(self._filter) else real_dtype
+        )
+
+    def spectrum(self, img: np.ndarray, zero_dc: bool = False) -> tuple[np.ndarray, float]:
+        """Calculate the half spectrum of an image, and its bandpassed energy
+
+        Args:
+            img (np.ndarray): image
+            zero_dc (bool, optional): zero the dc component. Defaults to False.
+
+        Returns:
+            tuple[np.ndarray, float]: half spectrum, bandpassed spectrum energy
+        """
+        ft = self._fft.rfft2(np.asarray(img, dtype=self.dtype), workers=self.workers)
+        if zero_dc:
+            ft[0, 0] = 0
+
+        energy = None
+        if self.bp:
+            abs2 = np.abs(ft)
+            abs2 *= abs2
+            energy = float(np.vdot(self._energy_weight, abs2))
+
+        return ft, energy
+
+    def cross_power_spectrum(
+        self, ft1: np.ndarray, energy1: float, ft2: np.ndarray, energy2: float, overwrite: bool = False
+    ) -> np.ndarray:
+        """Filtered, normalised cross power (half) spectrum of two spectra from CorrelationEngine.spectrum
+
+        Args:
+            ft1 (np.ndarray): reference spectrum
+            energy1 (float): reference spectrum energy
+            ft2 (np.ndarray): new image spectrum
+            energy2 (float): new image spectrum energy
+            overwrite (bool, optional): reuse ft2 as scratch space. Defaults to False.
+
+        Returns:
+            np.ndarray: cross power spectrum
+        """
+        prod = np.conjugate(ft2, out=ft2 if overwrite else None)
+        prod *= ft1
+        prod *= self._filter
+
+        if self.bp:
+            prod *= self.n_pixels**2 / np.sqrt(energy1 * energy2)
+        else:
+            prod[0, 0] = 0
+
+        return prod
+
+    def correlate_spectra(
+        self, ft1: np.ndarray, energy1: float, ft2: np.ndarray, energy2: float, overwrite: bool = False
+    ) -> np.ndarray:
+        """Cross-correlate two half spectra from CorrelationEngine.spectrum
+
+        Args:
+            ft1 (np.ndarray): reference spectrum
+            energy1 (float): reference spectrum energy
+            ft2 (np.ndarray): new image spectrum
+            energy2 (float): new image spectrum energy
+            overwrite (bool, optional): reuse ft2 as scratch space. Defaults to False.
+
+        Returns:
+            np.ndarray: crosscorrelation map
+        """
+        prod = self.cross_power_spectrum(ft1, energy1, ft2, energy2, overwrite=overwrite)
+
+        return self._inverse(prod, overwrite=True)
+
+    def correlate_stack(
+        self, ft_stack: np.ndarray, energies: np.ndarray, ft2: np.ndarray, energy2: float
+    ) -> np.ndarray:
+        """Cross-correlate a stack of reference spectra against one spectrum, in a single batched inverse fft
+
+        Args:
+            ft_stack (np.ndarray): stack of reference spectra (n, rows, cols // 2 + 1)
+            energies (np.ndarray): reference spectrum energies (n, )
+            ft2 (np.ndarray): new image spectrum
+            energy2 (float): new image spectrum energy
+
+        Returns:
+            np.ndarray: stack of crosscorrelation maps (n, rows, cols)
+        """
+        prod = ft_stack * np.conjugate(ft2)
+        prod *= self._filter
+
+        if self.bp:
+            scale = self.n_pixels**2 / np.sqrt(np.asarray(energies, dtype=float) * energy2)
+            prod *= scale.astype(self.dtype)[:, None, None]
+        else:
+            prod[:, 0, 0] = 0
+
+        xcorr = self._fft.irfft2(prod, s=self.shape, workers=self.workers, overwrite_x=True)
+
+        if not self.bp:
+            np.abs(xcorr, out=xcorr)
+
+        return xcorr
+
+    def correlate(self, img1: np.ndarray, img2: np.ndarray) -> np.ndarray:
+        """Cross-correlate images (fourier convolution matching)
+
+        Args:
+            img1 (np.ndarray): reference_image
+            img2 (np.ndarray): new image
+
+        Returns:
+            np.ndarray: crosscorrelation map
+        """
+        self._check_shape(img1, img2)
+
+        ft1, energy1 = self.spectrum(img1)
+        ft2, energy2 = self.spectrum(img2, zero_dc=self.bp)
+
+        return self.correlate_spectra(ft1, energy1, ft2, energy2, overwrite=True)
+
+    def shift(
+        self,
+        img1: np.ndarray,
+        img2: np.ndarray,
+        subpixel: str = None,
+        upsample_factor: int = 20,
+        expected: tuple = None,
+        search: int = 3,
+    ) -> tuple[float, float, np.ndarray]:
+        """Calculate the pixel shift between two images from the crosscorrelation maximum
+
+        Args:
+            img1 (np.ndarray): reference_image
+            img2 (np.ndarray): new image
+            subpixel (str, optional): sub-pixel peak refinement method ("parabolic", "gaussian"
+                or "upsampled"). Defaults to None (whole pixel shifts).
+            upsample_factor (int, optional): upsampling factor for the "upsampled" method. Defaults to 20.
+            expected (tuple, optional): expected shift (dx, dy) in px. If set, the crosscorrelation is
+                only evaluated within search px of the expected shift, with a matrix-multiply DFT
+                instead of the inverse fft, and the returned map is that window. Defaults to None.
+            search (int, optional): search window half width around the expected shift (px). Defaults to 3.
+
+        Returns:
+            tuple[float, float, np.ndarray]: x shift (px), y shift (px), crosscorrelation map
+        """
+        self._check_shape(img1, img2)
+
+        ft1, energy1 = self.spectrum(img1)
+        ft2, energy2 = self.spectrum(img2, zero_dc=self.bp)
+        prod = self.cross_power_spectrum(ft1, energy1, ft2, energy2, overwrite=True)
+
+        if expected is not None:
+            centre = (self.shape[0] // 2 - expected[1], self.shape[1] // 2 - expected[0])
+            peak, xcorr = self.window_peak(prod, centre, search, subpixel=subpixel, upsample_factor=upsample_factor)
+            dy, dx = np.asarray(self.shape) // 2 - np.asarray(peak, dtype=float)
+            return float(dx), float(dy), xcorr
+
+        # the upsampled refinement needs the cross power spectrum after the inverse
+        xcorr = self._inverse(prod, overwrite=subpixel != "upsampled")
+
+        peak = None
+        if subpixel == "upsampled":
+            peak = self.upsampled_peak(prod, np.unravel_index(np.argmax(xcorr), xcorr.shape), upsample_factor)
+        elif subpixel is not None:
+            peak = refine_peak(xcorr, method=subpixel)
+
+        dx, dy = shift_from_peak(xcorr, peak=peak)
+
+        return dx, dy, xcorr
+
+    def upsampled_peak(
+        self, prod: np.ndarray, peak: tuple, upsample_factor: int = 20, spacing: float = 1.0
+    ) -> tuple[float, float]:
+        """Refine the crosscorrelation peak with a matrix-multiply (upsampled) DFT of the
+        cross power spectrum, evaluated in a 1.5 pixel neighbourhood of the peak
+        (Guizar-Sicairos et al., Opt. Lett. 33, 156 (2008)).
+
+        Args:
+            prod (np.ndarray): cross power spectrum from CorrelationEngine.cross_power_spectrum
+            peak (tuple): whole pixel peak (row, col)
+            upsample_factor (int, optional): upsampling factor. Defaults to 20.
+            spacing (float, optional): size of a whole pixel, in pixels of the engine shape
+                (e.g. 0.5 to refine a peak found on a 2x finer grid). Defaults to 1.0.
+
+        Returns:
+            tuple[float, float]: refined peak (row, col)
+        """
+        n = int(np.ceil(1.5 * upsample_factor))
+        offsets = (np.arange(n) - n // 2) * spacing / upsample_factor
+        rows, cols = peak[0] + offsets, peak[1] + offsets
+
+        upsampled = self.evaluate(prod, rows, cols)
+        iy, ix = np.unravel_index(np.argmax(upsampled), upsampled.shape)
+
+        return rows[iy], cols[ix]
+
+    def window_peak(
+        self,
+        prod: np.ndarray,
+        centre: tuple,
+        radius: int,
+        spacing: float = 1.0,
+        subpixel: str = None,
+        upsample_factor: int = 20,
+    ) -> tuple[tuple, np.ndarray]:
+        """Find the crosscorrelation maximum within radius grid points of centre, on a grid
+        spacing px apart, by evaluating only that window of the crosscorrelation.
+
+        Args:
+            prod (np.ndarray): cross power spectrum from CorrelationEngine.cross_power_spectrum
+            centre (tuple): window centre (row, col), in pixels of the crosscorrelation map
+            radius (int): window half width (grid points)
+            spacing (float, optional): grid spacing (px). Defaults to 1.0.
+            subpixel (str, optional): sub-pixel peak refinement ("parabolic", "gaussian" or "upsampled"),
+                relative to the grid spacing. Defaults to None.
+            upsample_factor (int, optional): upsampling factor for the "upsampled" method. Defaults to 20.
+
+        Returns:
+            tuple[tuple, np.ndarray]: peak (row, col), crosscorrelation window
+        """
+        # one extra grid point around the window for the sub-pixel fit
+        offsets = np.arange(-radius - 1, radius + 2) * spacing
+        rows, cols = centre[0] + offsets, centre[1] + offsets
+        window = self.evaluate(prod, rows, cols)
+
+        iy, ix = np.unravel_index(np.argmax(window[1:-1, 1:-1]), (2 * radius + 1, 2 * radius + 1))
+        iy, ix = iy + 1, ix + 1
+
+        if subpixel == "upsampled":
+            peak = self.upsampled_peak(prod, (rows[iy], cols[ix]), upsample_factor, spacing=spacing)
+        elif subpixel is not None:
+            fy, fx = refine_peak(window, method=subpixel, peak=(iy, ix))
+            peak = (rows[0] + fy * spacing, cols[0] + fx * spacing)
+        else:
+            peak = (rows[iy], cols[ix])
+
+        return peak, window
+
+    def evaluate(self, prod: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Evaluate the crosscorrelation map at arbitrary (sub-pixel) rows and cols with a
+        matrix-multiply DFT of the cross power spectrum, without a full inverse fft.
+
+        Args:
+            prod (np.ndarray): cross power spectrum from CorrelationEngine.cross_power_spectrum
+            rows (np.ndarray): row positions (px)
+            cols (np.ndarray): col positions (px)
+
+        Returns:
+            np.ndarray: crosscorrelation values (len(rows), len(cols)), on the scale of the full map
+        """
+        h, w = self.shape
+
+        ky = np.fft.fftfreq(h, 1 / h)
+        kx = np.arange(w // 2 + 1)
+
+        # half spectrum columns (except dc / nyquist) stand in for their conjugate mirror
+        weights = np.full(w // 2 + 1, 2.0)
+        weights[0] = 1.0
+        if w % 2 == 0:
+            weights[-1] = 1.0
+
+        row_kernel = np.exp(2j * np.pi * np.outer(rows, ky) / h)
+        col_kernel = np.exp(2j * np.pi * np.outer(kx, cols) / w)
+        xcorr = (row_kernel @ (prod * weights) @ col_kernel).real / self.n_pixels
+        if not self.bp:
+            xcorr = np.abs(xcorr)
+
+        return xcorr
+
+    def _inverse(self, prod: np.ndarray, overwrite: bool = False) -> np.ndarray:
+        xcorr = self._fft.irfft2(prod, s=self.shape, workers=self.workers, overwrite_x=overwrite)
+
+        if not self.bp:
+            np.abs(xcorr, out=xcorr)
+
+        return xcorr
+
+    def _check_shape(self, img1: np.ndarray, img2: np.ndarray) -> None:
+        if img1.shape != img2.shape:
+            err = f"Image 1 {img1.shape} and Image 2 {img2.shape} need to have the same shape"
+            logging.error(err)
+            raise ValueError(err)
+
+        if img1.shape != self.shape:
+            err = f"Image shape {img1.shape} does not match the correlation engine shape {self.shape}"
+            logging.error(err)
+            raise ValueError(err)
+
+
+@lru_cache(maxsize=16)
+def _get_correlation_engine(shape, dtype, lp, hp, sigma, bp, workers, backend) -> CorrelationEngine:
+    return CorrelationEngine(shape, dtype, lp=lp, hp=hp, sigma=sigma, bp=bp, workers=workers, backend=backend)
+
+
+def get_correlation_engine(
+    shape: tuple,
+    dtype: np.dtype = np.float64,
+    lp: int = 128,
+    hp: int = 6,
+    sigma: int = 6,
+    bp: bool = True,
+    workers: int = None,
+    backend: str = None,
+) -> CorrelationEngine:
+    """Get a (cached) correlation engine for the image shape, dtype, filter parameters and fft backend"""
+    if not bp:
+        lp, hp, sigma = None, None, None  # filter parameters are unused
+    if workers is None:
+        workers = config.FFT_WORKERS
+
+    return _get_correlation_engine(
+        tuple(shape), np.dtype(dtype).str, lp, hp, sigma, bp, workers, backend or fft.current_backend()
+    )
+
+
+@dataclass
+class PyramidLevel:
+    level: int
+    shape: tuple
+    dx: float  # px, at this level
+    dy: float  # px, at this level
+    time: float  # seconds
+
+
+def gaussian_pyramid(img: np.ndarray, levels: int, cache: bool = False) -> list[np.ndarray]:
+    """Gaussian image pyramid, each level is blurred (5-tap binomial, ~gaussian sigma=1)
+    and downsampled by a factor of two.
+
+    Args:
+        img (np.ndarray): image (level 0)
+        levels (int): number of downsampled levels
+        cache (bool, optional): cache the pyramid for this image array (e.g. a reference image
+            that is aligned to repeatedly). The cache is keyed on the array object, so the
+            image must not be modified in place. Only the downsampled levels are cached, so the
+            cache doesn't keep the image alive. Defaults to False.
+
+    Returns:
+        list[np.ndarray]: pyramid, from full resolution (level 0) to coarsest (level levels)
+    """
+    key = (id(img), img.shape, img.dtype.str, levels)
+
+    if cache:
+        with _PYRAMID_CACHE_LOCK:
+            cached = _PYRAMID_CACHE.get(key)
+            if cached is not None and cached[0]() is img:
+                _PYRAMID_CACHE.move_to_end(key)
+                return [img] + cached[1]
+
+    pyramid = [img]
+    for _ in range(levels):
+        pyramid.append(_pyramid_reduce(_pyramid_reduce(np.asarray(pyramid[-1], dtype=float), 0), 1))
+
+    if cache:
+        with _PYRAMID_CACHE_LOCK:
+            _PYRAMID_CACHE[key] = (weakref.ref(img), pyramid[1:])  # level 0 is img
+            while len(_PYRAMID_CACHE) > PYRAMID_CACHE_SIZE:
+                _PYRAMID_CACHE.popitem(last=False)
+
+    return pyramid
+
+
+PYRAMID_CACHE_SIZE = 8
+_PYRAMID_CACHE: OrderedDict = OrderedDict()
+_PYRAMID_CACHE_LOCK = threading.Lock()
+
+
+def pyramid_shift(
+    img1: np.ndarray,
+    img2: np.ndarray,
+    levels: int = 3,
+    lp: int = 128,
+    hp: int = 6,
+    sigma: int = 6,
+    use_rect_mask: bool = False,
+    ref_mask: np.ndarray = None,
+    search: int = 3,
+    subpixel: str = None,
+    min_level: int = 0,
+    workers: int = None,
+) -> tuple[float, float, np.ndarray, list[PyramidLevel]]:
+    """Coarse-to-fine crosscorrelation shift using gaussian pyramids.
+
+    The full crosscorrelation (the only full fft) is only calculated at the coarsest level.
+    Each finer level is refined by evaluating the crosscorrelation on a grid of that level's
+    pixel size, within search px of the (upscaled) previous estimate, with a matrix-multiply
+    DFT of the coarsest level cross power spectrum. The bandpass is defined in cycles per
+    field of view, so it is the same at every level, and the coarsest level holds the whole
+    passband as long as lp + 3 * sigma is below its nyquist frequency (half its size). The
+    reference (img1) pyramid is cached.
+
+    Args:
+        img1 (np.ndarray): reference image
+        img2 (np.ndarray): new image
+        levels (int, optional): number of downsampled levels. Defaults to 3.
+        lp (int, optional): lowpass. Defaults to 128.
+        hp (int, optional): highpass. Defaults to 6.
+        sigma (int, optional): sigma (gaussian blur). Defaults to 6.
+        use_rect_mask (bool, optional): apply a soft rectangular mask to both images. Defaults to False.
+        ref_mask (np.ndarray, optional): mask to apply to the reference image (full resolution). Defaults to None.
+        search (int, optional): search window half width at the finer levels (px). Defaults to 3.
+        subpixel (str, optional): sub-pixel refinement at the final level. Defaults to None.
+        min_level (int, optional): final (finest) level to refine, the whole pixel shift is
+            a multiple of 2**min_level px. Defaults to 0.
+        workers (int, optional): number of fft worker threads. Defaults to config.FFT_WORKERS.
+
+    Returns:
+        tuple[float, float, np.ndarray, list[PyramidLevel]]: x shift (px), y shift (px) at full
+            resolution, crosscorrelation map of the coarsest level, per-level results
+    """
+    from fibsem.imaging import masks
+
+    if img1.shape != img2.shape:
+        err = f"Image 1 {img1.shape} and Image 2 {img2.shape} need to have the same shape"
+        logging.error(err)
+        raise ValueError(err)
+
+    min_level = int(np.clip(min_level, 0, levels))
+
+    t0 = time.perf_counter()
+    ref = _normalise(gaussian_pyramid(img1, levels, cache=True)[levels])
+    new = _normalise(gaussian_pyramid(img2, levels)[levels])
+    if use_rect_mask:
+        rect_mask = masks.get_rectangular_mask(ref.shape, sigma=max(1.0, 5.0 / 2**levels))
+        ref, new = rect_mask * ref, rect_mask * new
+    if ref_mask is not None:
+        ref = gaussian_pyramid(ref_mask, levels)[levels] * ref
+
+    engine = get_correlation_engine(ref.shape, ref.dtype, lp=lp, hp=hp, sigma=sigma, bp=True, workers=workers)
+    ft1, energy1 = engine.spectrum(ref)
+    ft2, energy2 = engine.spectrum(new, zero_dc=True)
+    prod = engine.cross_power_spectrum(ft1, energy1, ft2, energy2, overwrite=True)
+    xcorr = engine._inverse(prod)
+
+    # crosscorrelation map position (row, col) of zero shift and of the current estimate
+    origin = np.asarray(engine.shape) // 2
+    peak = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+
+    results = []
+    for level in range(levels, min_level - 1, -1):
+        spacing = 2.0 ** (level - levels)  # pixel size of this level, in coarsest level px
+        if level < levels or subpixel is not None and level == min_level:
+            peak, _ = engine.window_peak(
+                prod, peak, search, spacing=spacing,
+                subpixel=subpixel if level == min_level else None,
+            )
+
+        dy, dx = (origin - np.asarray(peak, dtype=float)) / spacing
+        shape = tuple(int(np.ceil(n / 2**level)) for n in img1.shape)
+        results.append(PyramidLevel(level=level, shape=shape, dx=float(dx), dy=float(dy), time=time.perf_counter() - t0))
+        t0 = time.perf_counter()
+
+    scale = 2**min_level
+
+    return float(dx) * scale, float(dy) * scale, xcorr, results
+
+
+def _pyramid_reduce(img: np.ndarray, axis: int) -> np.ndarray:
+    """Binomial [1, 4, 6, 4, 1] / 16 blur (mirrored edges) and decimation along one axis,
+    only evaluated at the retained samples."""
+    x = np.moveaxis(np.asarray(img, dtype=float), axis, 0)
+    n = x.shape[0]
+    m = (n + 1) // 2
+    weights = (1.0, 4.0, 6.0, 4.0, 1.0)
+
+    reduced = np.empty(img.shape[:axis] + (m,) + img.shape[axis + 1:])
+    out = np.moveaxis(reduced, axis, 0)
+    if m > 2:
+        # interior samples, in place to avoid full size temporaries
+        even, odd = x[0::2], x[1::2]
+        inner = out[1:m - 1]
+        np.add(odd[0:m - 2], odd[1:m - 1], out=inner)
+        inner *= 4
+        inner += even[0:m - 2]
+        inner += even[2:m]
+        inner += 6 * even[1:m - 1]
+
+    for i in {0, m - 1}:
+        # mirrored edges (d c b | a b c d | c b a), repeated for very short axes
+        idx = [2 * i + k for k in range(-2, 3)]
+        if n > 2:
+            idx = [2 * (n - 1) - abs(j) if abs(j) > n - 1 else abs(j) for j in idx]
+        idx = np.clip(idx, 0, n - 1)
+        out[i] = sum(w * x[j] for w, j in zip(weights, idx))
+
+    reduced /= 16
+
+    return reduced
+
+
+def _normalise(img: np.ndarray) -> np.ndarray:
+    return (img - np.mean(img)) / np.std(img)
+
+
+class ReferenceBank:
+    """Precomputed crosscorrelation spectra for a set of reference images (e.g. one per lamella).
+
+    Each reference is normalised, masked and transformed once when it is added, so aligning
+    a new image only needs the new image spectrum. References are stored by key, and
+    re-adding a key replaces the reference (e.g. after milling).
+
+    Args:
+        lp (int, optional): lowpass. Defaults to 128.
+        hp (int, optional): highpass. Defaults to 6.
+        sigma (int, optional): sigma (gaussian blur). Defaults to 6.
+        use_rect_mask (bool, optional): apply a soft rectangular mask to all images. Defaults to False.
+        workers (int, optional): number of fft worker threads. Defaults to config.FFT_WORKERS.
+        max_workers (int, optional): thread pool size for batched alignment. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        lp: int = 128,
+        hp: int = 6,
+        sigma: int = 6,
+        use_rect_mask: bool = False,
+        workers: int = None,
+        max_workers: int = None,
+    ) -> None:
+        self.lp, self.hp, self.sigma = lp, hp, sigma
+        self.use_rect_mask = use_rect_mask
+        self.workers = workers
+        self.max_workers = max_workers
+
+        self._spectra: dict = {}  # key: (spectrum, energy)
+        self._shapes: dict = {}  # key: image shape
+        self._sources: dict = {}  # key: weakref(source image)
+        self._stacks: dict = {}  # shape: (keys, spectra, energies)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._spectra)
+
+    def __contains__(self, key) -> bool:
+        return key in self._spectra
+
+    def keys(self) -> list:
+        return list(self._spectra.keys())
+
+    def add(self, key, img: np.ndarray, ref_mask: np.ndarray = None, source=None) -> None:
+        """Add (or replace) a reference image
+
+        Args:
+            key: reference key (e.g. lamella number)
+            img (np.ndarray): reference image
+            ref_mask (np.ndarray, optional): mask to apply to the reference. Defaults to None.
+            source (optional): the object the reference was taken from (e.g. the AdornedImage), see is_source.
+                Defaults to img.
+        """
+        ref = self._preprocess(img)
+        if ref_mask is not None:
+            ref = ref_mask * ref
+
+        spectrum = self._engine(ref.shape).spectrum(ref)
+
+        with self._lock:
+            self._spectra[key] = spectrum
+            self._shapes[key] = ref.shape
+            self._sources[key] = _ref(img if source is None else source)
+            self._stacks.clear()
+
+    def is_source(self, key, source) -> bool:
+        """Check if the reference for key was added from source (the same object, not a copy)"""
+        with self._lock:
+            ref = self._sources.get(key)
+        return ref is not None and ref() is source
+
+    def remove(self, key) -> None:
+        with self._lock:
+            self._spectra.pop(key)
+            self._shapes.pop(key)
+            self._sources.pop(key)
+            self._stacks.clear()
+
+    def shift(self, key, img: np.ndarray, subpixel: str = None) -> tuple[float, float, np.ndarray]:
+        """Calculate the pixel shift between a reference and a new image
+
+        Args:
+            key: reference key
+            img (np.ndarray): new image
+            subpixel (str, optional): sub-pixel peak refinement ("parabolic", "gaussian" or "upsampled").
+                Defaults to None.
+
+        Returns:
+            tuple[float, float, np.ndarray]: x shift (px), y shift (px), crosscorrelation map
+        """
+        ft1, energy1 = self._spectra[key]
+        new = self._preprocess(img)
+
+        if self._shapes[key] != new.shape:
+            err = f"Image shape {new.shape} does not match the shape of reference {key} {self._shapes[key]}"
+            logging.error(err)
+            raise ValueError(err)
+
+        engine = self._engine(new.shape)
+
+        ft2, energy2 = engine.spectrum(new, zero_dc=True)
+        prod = engine.cross_power_spectrum(ft1, energy1, ft2, energy2, overwrite=True)
+        xcorr = engine._inverse(prod, overwrite=subpixel != "upsampled")
+
+        peak = None
+        if subpixel == "upsampled":
+            peak = engine.upsampled_peak(prod, np.unravel_index(np.argmax(xcorr), xcorr.shape))
+        elif subpixel is not None:
+            peak = refine_peak(xcorr, method=subpixel)
+
+        dx, dy = shift_from_peak(xcorr, peak=peak)
+
+        return dx, dy, xcorr
+
+    def shift_all(self, img: np.ndarray, chunk_size: int = 8) -> dict:
+        """Calculate the pixel shift between a new image and every reference with the same shape.
+        The new image spectrum is calculated once, and the references are correlated in
+        vectorised chunks.
+
+        Args:
+            img (np.ndarray): new image
+            chunk_size (int, optional): number of references per batched inverse fft. Defaults to 8.
+
+        Returns:
+            dict: key: (x shift (px), y shift (px), crosscorrelation map)
+        """
+        new = self._preprocess(img)
+        engine = self._engine(new.shape)
+        keys, spectra, energies = self._stack(new.shape)
+
+        ft2, energy2 = engine.spectrum(new, zero_dc=True)
+
+        results = {}
+        for i in range(0, len(keys), chunk_size):
+            xcorrs = engine.correlate_stack(spectra[i:i + chunk_size], energies[i:i + chunk_size], ft2, energy2)
+            for key, xcorr in zip(keys[i:i + chunk_size], xcorrs):
+                dx, dy = shift_from_peak(xcorr)
+                results[key] = (dx, dy, xcorr)
+
+        return results
+
+    def shift_batch(self, pairs: list[tuple], subpixel: str = None) -> list[tuple[float, float, np.ndarray]]:
+        """Calculate the pixel shifts for a batch of (key, new image) pairs on a thread pool
+
+        Args:
+            pairs (list[tuple]): (reference key, new image) pairs
+            subpixel (str, optional): sub-pixel peak refinement. Defaults to None.
+
+        Returns:
+            list[tuple[float, float, np.ndarray]]: (x shift (px), y shift (px), crosscorrelation map) for each pair
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.shift, key, img, subpixel) for key, img in pairs]
+            return [future.result() for future in futures]
+
+    def _preprocess(self, img: np.ndarray) -> np.ndarray:
+        from fibsem.imaging import masks
+
+        data = _normalise(img)
+        if self.use_rect_mask:
+            data = masks.get_rectangular_mask(data.shape) * data
+
+        return data
+
+    def _engine(self, shape: tuple) -> CorrelationEngine:
+        return get_correlation_engine(
+            shape, np.float64, lp=self.lp, hp=self.hp, sigma=self.sigma, bp=True, workers=self.workers
+        )
+
+    def _stack(self, shape: tuple) -> tuple[list, np.ndarray, np.ndarray]:
+        with self._lock:
+            if shape not in self._stacks:
+                half_shape = (shape[0], shape[1] // 2 + 1)
+                keys = [key for key in self._spectra if self._shapes[key] == shape]
+                spectra = np.stack([self._spectra[key][0] for key in keys]) if keys else np.empty((0,) + half_shape, complex)
+                energies = np.array([self._spectra[key][1] for key in keys])
+                self._stacks[shape] = (keys, spectra, energies)
+
+            return self._stacks[shape]
+
+
+def _ref(obj):
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
+def shift_from_peak(xcorr: np.ndarray, peak: tuple = None) -> tuple[float, float]:
+    """Calculate the pixel shift of the crosscorrelation maximum from the centre of the map
+
+    Args:
+        xcorr (np.ndarray): crosscorrelation map
+        peak (tuple, optional): (sub-pixel) peak position (row, col). Defaults to the maximum.
+
+    Returns:
+        tuple[float, float]: x shift (px), y shift (px)
+    """
+    if peak is None:
+        maxY, maxX = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+        cen = np.asarray(xcorr.shape) / 2
+        err = np.array(cen - [maxY, maxX], int)
+        return err[1], err[0]
+
+    # zero shift is at the fftshift centre (n // 2), including for odd shapes
+    err = np.asarray(xcorr.shape) // 2 - np.asarray(peak, dtype=float)
+
+    return float(err[1]), float(err[0])
+
+
+def refine_peak(xcorr: np.ndarray, method: str = "parabolic", peak: tuple = None) -> tuple:
+    """Refine the crosscorrelation maximum to sub-pixel precision with a 3-point fit along each axis
+
+    Args:
+        xcorr (np.ndarray): crosscorrelation map
+        method (str, optional): "parabolic" or "gaussian" fit, None returns the whole pixel
+            maximum. Defaults to "parabolic".
+        peak (tuple, optional): whole pixel peak (row, col) to refine. Defaults to the maximum.
+
+    Returns:
+        tuple: peak position (row, col)
+    """
+    if peak is None:
+        peak = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+
+    if method is None:
+        return peak
+
+    if method not in ("parabolic", "gaussian"):
+        raise ValueError(f"Sub-pixel method {method} is not supported.")
+
+    refined = []
+    for axis, (idx, n) in enumerate(zip(peak, xcorr.shape)):
+        # neighbours wrap around, the crosscorrelation is circular
+        neighbours = list(peak)
+        neighbours[axis] = [(idx - 1) % n, idx, (idx + 1) % n]
+        left, centre, right = xcorr[tuple(neighbours)]
+
+        if method == "gaussian" and min(left, centre, right) > 0:
+            left, centre, right = np.log([left, centre, right])
+
+        denominator = left - 2 * centre + right
+        offset = 0.5 * (left - right) / denominator if denominator != 0 else 0.0
+        refined.append(idx + float(np.clip(offset, -0.5, 0.5)))
+
+    return tuple(refined)
+
+
+def peak_confidence(xcorr: np.ndarray, exclusion: int = None) -> float:
+    """Ratio of the crosscorrelation maximum to the second highest peak, outside the
+    neighbourhood of the maximum. Higher is a more reliable alignment.
+
+    Args:
+        xcorr (np.ndarray): crosscorrelation map
+        exclusion (int, optional): half width of the neighbourhood excluded around the maximum (px).
+            Defaults to the extent of the main peak lobe.
+
+    Returns:
+        float: peak to second peak ratio
+    """
+    h, w = xcorr.shape
+    iy, ix = np.unravel_index(np.argmax(xcorr), xcorr.shape)
+
+    if exclusion is None:
+        exclusion = max(
+            _lobe_extent(xcorr[iy, :], ix), _lobe_extent(xcorr[:, ix], iy)
+        )
+
+    rows = np.arange(iy - exclusion, iy + exclusion + 1) % h
+    cols = np.arange(ix - exclusion, ix + exclusion + 1) % w
+
+    masked = np.array(xcorr, copy=True)
+    masked[np.ix_(rows, cols)] = -np.inf
+    second = masked.max()
+
+    if not np.isfinite(second) or second <= 0:
+        return np.inf
+
+    return float(xcorr[iy, ix] / second)
+
+
+def _lobe_extent(profile: np.ndarray, idx: int) -> int:
+    """Distance from the maximum until the (circular) profile stops decreasing, in either direction"""
+    n = len(profile)
+    extent = 1
+    for direction in (-1, 1):
+        steps = 1
+        while steps < n // 2 and profile[(idx + direction * (steps + 1)) % n] < profile[(idx + direction * steps) % n]:
+            steps += 1
+        extent = max(extent, steps)
+
+    return extent
+
+
+def _hermitian_half_spectrum(spectrum: np.ndarray) -> np.ndarray:
+    """Symmetrise a real full spectrum (s[k] = s[-k]) and return its rfft half"""
+    mirror = np.roll(spectrum[::-1, ::-1], shift=(1, 1), axis=(0, 1))
+    symmetric = 0.5 * (spectrum + mirror)
+
+    return symmetric[:, : spectrum.shape[1] // 2 + 1]
@@ -0,0 +1,276 @@
+import abc
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import fft as sfft
+
+from fibsem import config
+
+
+class FFTBackend(abc.ABC):
+    """Real-to-complex 2D fft over the last two axes.
+
+    Backends only need to implement rfft2 / irfft2; the correlation engine handles
+    filtering and normalisation, so every backend produces the same crosscorrelation.
+    """
+
+    name: str = None
+
+    @abc.abstractmethod
+    def rfft2(self, x: np.ndarray, workers: int = None) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def irfft2(self, x: np.ndarray, s: tuple, workers: int = None, overwrite_x: bool = False) -> np.ndarray:
+        pass
+
+
+class NumpyBackend(FFTBackend):
+    """numpy.fft (single threaded, workers are ignored)"""
+
+    name = "numpy"
+
+    def rfft2(self, x: np.ndarray, workers: int = None) -> np.ndarray:
+        return np.fft.rfft2(x)
+
+    def irfft2(self, x: np.ndarray, s: tuple, workers: int = None, overwrite_x: bool = False) -> np.ndarray:
+        return np.fft.irfft2(x, s=s)
+
+
+class ScipyBackend(FFTBackend):
+    """scipy.fft (pocketfft), multithreaded over the leading (batch) axes and rows"""
+
+    name = "scipy"
+
+    def rfft2(self, x: np.ndarray, workers: int = None) -> np.ndarray:
+        return sfft.rfft2(x, workers=workers)
+
+    def irfft2(self, x: np.ndarray, s: tuple, workers: int = None, overwrite_x: bool = False) -> np.ndarray:
+        return sfft.irfft2(x, s=s, workers=workers, overwrite_x=overwrite_x)
+
+
+class FFTWBackend(FFTBackend):
+    """pyFFTW, with the plan cache enabled and wisdom persisted to disk (as json, in the user cache directory)
+
+    Args:
+        wisdom_path (str, optional): path to the wisdom file. Defaults to config.FFTW_WISDOM_PATH.
+        planner_effort (str, optional): fftw planner effort. Defaults to config.FFTW_PLANNER_EFFORT.
+    """
+
+    name = "fftw"
+
+    def __init__(self, wisdom_path: str = None, planner_effort: str = None) -> None:
+        import pyfftw
+        import pyfftw.interfaces.numpy_fft
+
+        self._pyfftw = pyfftw
+        self._fft = pyfftw.interfaces.numpy_fft
+        self.wisdom_path = wisdom_path or config.FFTW_WISDOM_PATH
+        self.planner_effort = planner_effort or config.FFTW_PLANNER_EFFORT
+
+        pyfftw.interfaces.cache.enable()
+        self.load_wisdom()
+        atexit.register(self.save_wisdom)
+
+    def rfft2(self, x: np.ndarray, workers: int = None) -> np.ndarray:
+        return self._fft.rfft2(
+            x, threads=_threads(workers), planner_effort=self.planner_effort
+        )
+
+    def irfft2(self, x: np.ndarray, s: tuple, workers: int = None, overwrite_x: bool = False) -> np.ndarray:
+        return self._fft.irfft2(
+            x, s=s, overwrite_input=overwrite_x, threads=_threads(workers), planner_effort=self.planner_effort
+        )
+
+    def load_wisdom(self) -> None:
+        if self.wisdom_path is None or not os.path.exists(self.wisdom_path):
+            return
+
+        try:
+            with open(self.wisdom_path, "r") as f:
+                self._pyfftw.import_wisdom(tuple(w.encode("ascii") for w in json.load(f)))
+            logging.info(f"loaded fftw wisdom from {self.wisdom_path}")
+        except Exception as e:
+            logging.warning(f"unable to load fftw wisdom from {self.wisdom_path}: {e}")
+
+    def save_wisdom(self) -> None:
+        if self.wisdom_path is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.wisdom_path), exist_ok=True)
+            with open(self.wisdom_path, "w") as f:
+                json.dump([w.decode("ascii") for w in self._pyfftw.export_wisdom()], f)
+        except Exception as e:
+            logging.warning(f"unable to save fftw wisdom to {self.wisdom_path}: {e}")
+
+
+def _threads(workers: int = None) -> int:
+    if workers is None:
+        return 1
+    if workers < 0:
+        return max(1, os.cpu_count() + 1 + workers)
+    return workers
+
+
+########################### REGISTRY
+
+_BACKENDS = {
+    "numpy": NumpyBackend,
+    "scipy": ScipyBackend,
+    "fftw": FFTWBackend,
+}
+_INSTANCES = {}
+_CURRENT = None
+_LOCK = threading.Lock()
+
+
+def register_backend(name: str, factory) -> None:
+    """Register an fft backend
+
+    Args:
+        name (str): backend name
+        factory: callable returning an FFTBackend (e.g. the backend class)
+    """
+    with _LOCK:
+        _BACKENDS[name] = factory
+        _INSTANCES.pop(name, None)
+
+
+def unregister_backend(name: str) -> None:
+    """Remove a registered fft backend (the current backend is reset to the default if it is removed)"""
+    global _CURRENT
+
+    with _LOCK:
+        _BACKENDS.pop(name, None)
+        _INSTANCES.pop(name, None)
+        if _CURRENT == name:
+            _CURRENT = None
+
+
+def available_backends() -> list[str]:
+    """Get the names of the registered backends that can be used (i.e. their dependencies are installed)"""
+    names = []
+    for name in list(_BACKENDS):
+        try:
+            get_backend(name)
+            names.append(name)
+        except ImportError:
+            pass
+
+    return names
+
+
+def get_backend(name: str = None) -> FFTBackend:
+    """Get an fft backend instance
+
+    Args:
+        name (str, optional): backend name. Defaults to the current backend.
+
+    Raises:
+        ValueError: unknown backend
+        ImportError: backend dependencies are not installed
+
+    Returns:
+        FFTBackend: fft backend
+    """
+    name = name or current_backend()
+
+    with _LOCK:
+        if name not in _INSTANCES:
+            if name not in _BACKENDS:
+                err = f"Unknown fft backend {name}, available backends are {list(_BACKENDS)}"
+                logging.error(err)
+                raise ValueError(err)
+
+            backend = _BACKENDS[name]()
+            backend.name = name
+            _INSTANCES[name] = backend
+
+        return _INSTANCES[name]
+
+
+def current_backend() -> str:
+    """Get the name of the current fft backend (defaults to config.FFT_BACKEND)"""
+    return _CURRENT or config.FFT_BACKEND
+
+
+def set_backend(name: str) -> None:
+    """Set the current fft backend
+
+    Args:
+        name (str): backend name
+    """
+    global _CURRENT
+
+    get_backend(name)  # validate
+    _CURRENT = name
+    logging.info(f"fft backend set to {name}")
+
+
+def autotune(
+    shapes: list[tuple] = None,
+    backends: list[str] = None,
+    repeats: int = 3,
+    dtype: np.dtype = np.float64,
+    workers: int = None,
+) -> str:
+    """Time a forward / inverse transform with each backend, and set the fastest as the current backend
+
+    Args:
+        shapes (list[tuple], optional): image shapes (rows, cols) or resolutions ("WIDTHxHEIGHT") to tune for.
+            Defaults to config.FFT_AUTOTUNE_RESOLUTIONS.
+        backends (list[str], optional): backends to compare. Defaults to all available backends.
+        repeats (int, optional): timed repeats per shape (the best is used). Defaults to 3.
+        dtype (np.dtype, optional): image dtype. Defaults to np.float64.
+        workers (int, optional): number of worker threads. Defaults to config.FFT_WORKERS.
+
+    Returns:
+        str: fastest backend name
+    """
+    if shapes is None:
+        shapes = config.FFT_AUTOTUNE_RESOLUTIONS
+    shapes = [_parse_resolution(shape) for shape in shapes]
+    if backends is None:
+        backends = available_backends()
+    if workers is None:
+        workers = config.FFT_WORKERS
+
+    rng = np.random.default_rng(0)
+    images = [rng.random(shape).astype(dtype) for shape in shapes]
+
+    timings = {}
+    for name in backends:
+        backend = get_backend(name)
+        total = 0
+        for img in images:
+            backend.irfft2(backend.rfft2(img, workers), img.shape, workers)  # warmup / planning
+
+            best = np.inf
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                backend.irfft2(backend.rfft2(img, workers), img.shape, workers, overwrite_x=True)
+                best = min(best, time.perf_counter() - t0)
+            total += best
+
+        timings[name] = total
+        logging.info(f"fft backend {name}: {total * 1e3:.2f}ms for shapes {list(shapes)}")
+
+    fastest = min(timings, key=timings.get)
+    set_backend(fastest)
+
+    return fastest
+
+
+def _parse_resolution(resolution) -> tuple[int, int]:
+    # "1536x1024" (width x height) -> (rows, cols)
+    if isinstance(resolution, str):
+        width, height = (int(v) for v in resolution.split("x"))
+        return height, width
+
+    return tuple(resolution)
@@ -1,91 +1,53 @@
 
+from functools import lru_cache
+
 import numpy as np
-import scipy.ndimage as ndi
+from scipy import special, stats
 from autoscript_sdb_microscope_client.structures import AdornedImage
 from fibsem import conversions
-from fibsem.imaging import utils as image_utils
 from fibsem.structures import Point
-from PIL import Image, ImageDraw
 
 
 ### MASKING
 def bandpass_mask(size=(128, 128), lp=32, hp=2, sigma=3):
-    x = size[0]
-    y = size[1]
-    lowpass = circ_mask(size=(x, y), radius=lp, sigma=0)
-    hpass_tmp = circ_mask(size=(x, y), radius=hp, sigma=0)
-    highpass = -1 * (hpass_tmp - 1)
-    tmp = lowpass * highpass
-    if sigma > 0:
-        bandpass = ndi.filters.gaussian_filter(tmp, sigma=sigma)
-    else:
-        bandpass = tmp
-    return bandpass
+    # size is (width, height)
+    return soft_bandpass_mask((size[1], size[0]), lp=lp, hp=hp, sigma=sigma, dtype=np.float64)
 
 
 def circ_mask(size=(128, 128), radius=32, sigma=3):
-    x = size[0]
-    y = size[1]
-    img = Image.new("I", size)
-    draw = ImageDraw.Draw(img)
-    draw.ellipse(
-        (x / 2 - radius, y / 2 - radius, x / 2 + radius, y / 2 + radius),
-        fill="white",
-        outline="white",
-    )
-    tmp = np.array(img, float) / 255
-    if sigma > 0:
-        mask = ndi.filters.gaussian_filter(tmp, sigma=sigma)
-    else:
-        mask = tmp
-    return mask
+    # size is (width, height)
+    return soft_circle_mask((size[1], size[0]), radius=radius, sigma=sigma, dtype=np.float64)
 
 # new masks below
 
 
 def create_circle_mask(shape: tuple = (128, 128), radius: int = 32, sigma: int = 3) -> np.ndarray:
-    """_summary_
+    """Create a centred circular mask with soft (gaussian) edges, see soft_circle_mask
 
     Args:
-        shape (tuple, optional): _description_. Defaults to (128, 128).
-        radius (int, optional): _description_. Defaults to 32.
-        sigma (int, optional): _description_. Defaults to 3.
+        shape (tuple, optional): mask shape (rows, cols). Defaults to (128, 128).
+        radius (int, optional): circle radius. Defaults to 32.
+        sigma (int, optional): gaussian blur sigma (softness). Defaults to 3.
 
     Returns:
-        np.ndarray: _description_
+        np.ndarray: mask
     """
-    distance = image_utils.create_distance_map_px(w = shape[1], h=shape[0])
-    mask = distance <= radius
-
-    if sigma:
-        mask = ndi.filters.gaussian_filter(mask, sigma=sigma)
-
-    return mask
+    return soft_circle_mask(shape, radius=radius, sigma=sigma, dtype=np.float64)
 
 
 def create_bandpass_mask(shape: tuple = (256, 256), lp: int = 32, hp: int = 2, sigma: int = 3) -> np.ndarray:
-    """_summary_
+    """Create a centred annular (bandpass) mask with soft (gaussian) edges, see soft_bandpass_mask
 
     Args:
-        shape (tuple, optional): _description_. Defaults to (256, 256).
-        lp (int, optional): _description_. Defaults to 32.
-        hp (int, optional): _description_. Defaults to 2.
-        sigma (int, optional): _description_. Defaults to 3.
+        shape (tuple, optional): mask shape (rows, cols). Defaults to (256, 256).
+        lp (int, optional): lowpass radius. Defaults to 32.
+        hp (int, optional): highpass radius. Defaults to 2.
+        sigma (int, optional): gaussian blur sigma (softness). Defaults to 3.
 
     Returns:
-        np.ndarray: _description_
+        np.ndarray: mask
     """
-    distance = image_utils.create_distance_map_px(w = shape[1], h=shape[0])
-    
-    lowpass = distance <= lp
-    highpass = distance >= hp
-
-    mask = lowpass * highpass
-    
-    if sigma:
-        mask = ndi.filters.gaussian_filter(mask, sigma=sigma)
-
-    return mask
+    return soft_bandpass_mask(shape, lp=lp, hp=hp, sigma=sigma, dtype=np.float64)
 
 
 
@@ -113,21 +75,193 @@ def _mask_rectangular(image_shape, sigma=5.0, *, start=None, extent=None):
     ndarray
         Rectangular mask with soft edges in array matching input image_shape.
     """
-    import skimage
+    if extent is None:
+        start = None  # default rectangle, leaves a 5% gap on each edge
+    return soft_rect_mask(image_shape, start=start, extent=extent, sigma=sigma, dtype=np.float64)
+
+
+
+
+
+### ANALYTIC MASKS
+# Soft masks evaluated in closed form, instead of rasterising a hard mask and blurring it.
+# A blurred rectangle is the outer product of 1D erf profiles, and a blurred disc
+# depends only on the radial distance (noncentral chi-squared cdf). Radii are offset
+# by half a pixel to match rasterised (PIL) masks. The mask builders above delegate here.
+
+
+def soft_rect_mask(
+    shape: tuple, start: tuple = None, extent: tuple = None, sigma: float = 5.0, dtype=np.float32
+) -> np.ndarray:
+    """Create a rectangular mask with soft (gaussian) edges.
+
+    Args:
+        shape (tuple): mask shape (([planes,] rows, cols)
+        start (tuple, optional): rectangle origin ([plane,] row, col). Defaults to 5% of the shape.
+        extent (tuple, optional): rectangle size ([planes,] rows, cols). Defaults to 90% of the shape.
+        sigma (float, optional): gaussian blur sigma (softness). Defaults to 5.0.
+        dtype (optional): output dtype. Defaults to np.float32.
 
+    Returns:
+        np.ndarray: mask
+    """
+    if start is None:
+        start = np.round(np.array(shape) * 0.05)
     if extent is None:
-        # leave at least a 5% gap on each edge
-        start = np.round(np.array(image_shape) * 0.05)
-        extent = np.round(np.array(image_shape) * 0.90)
-    rr, cc = skimage.draw.rectangle(start, extent=extent, shape=image_shape)
-    mask = np.zeros(image_shape)
-    mask[rr.astype(int), cc.astype(int)] = 1.0
-    mask = ndi.gaussian_filter(mask, sigma=sigma)
+        extent = np.round(np.array(shape) * 0.90)
+
+    # a blurred box is the outer product of the blurred 1D profiles
+    mask = np.ones((), dtype=dtype)
+    for n, lo, size in zip(shape, start, extent):
+        mask = np.multiply.outer(mask, _soft_box_profile(n, int(lo), int(lo + size), sigma).astype(dtype))
+
+    return mask
+
+
+def soft_circle_mask(shape: tuple, radius: int = 32, sigma: float = 3, dtype=np.float32) -> np.ndarray:
+    """Create a centred circular mask with soft (gaussian) edges.
+
+    Args:
+        shape (tuple): mask shape (rows, cols)
+        radius (int, optional): circle radius. Defaults to 32.
+        sigma (float, optional): gaussian blur sigma (softness). Defaults to 3.
+        dtype (optional): output dtype. Defaults to np.float32.
+
+    Returns:
+        np.ndarray: mask
+    """
+    return _radial_mask(shape, radii=(radius + 0.5,), signs=(1,), sigma=sigma, dtype=dtype)
+
+
+def soft_bandpass_mask(shape: tuple, lp: int = 32, hp: int = 2, sigma: float = 3, dtype=np.float32) -> np.ndarray:
+    """Create a centred annular (bandpass) mask with soft (gaussian) edges.
+
+    Args:
+        shape (tuple): mask shape (rows, cols)
+        lp (int, optional): lowpass radius. Defaults to 32.
+        hp (int, optional): highpass radius. Defaults to 2.
+        sigma (float, optional): gaussian blur sigma (softness). Defaults to 3.
+        dtype (optional): output dtype. Defaults to np.float32.
+
+    Returns:
+        np.ndarray: mask
+    """
+    # blurring is linear, so the annulus is the difference of the two blurred discs
+    return _radial_mask(shape, radii=(lp + 0.5, hp + 0.5), signs=(1, -1), sigma=sigma, dtype=dtype)
+
+
+def _soft_box_profile(n: int, lo: int, hi: int, sigma: float) -> np.ndarray:
+    """1D box covering pixels [lo, hi) convolved with a gaussian, with the box mirrored
+    about both borders (ndi reflect mode)."""
+    x = np.arange(n, dtype=np.float64)
+
+    if not sigma:
+        return ((x >= lo) & (x < hi)).astype(np.float64)
+
+    scale = sigma * np.sqrt(2)
+    profile = np.zeros(n)
+    for start, end in [(lo, hi), (-hi, -lo), (2 * n - hi, 2 * n - lo)]:
+        profile += special.erf((x - start + 0.5) / scale) - special.erf((x - end + 0.5) / scale)
+
+    return 0.5 * profile
+
+
+def _radial_mask(shape: tuple, radii: tuple, signs: tuple, sigma: float, dtype=np.float32) -> np.ndarray:
+    """Sum of centred (soft) discs, evaluated from the squared radial distance map.
+    The mask is symmetric, so only one quadrant is evaluated and then mirrored."""
+    h, w = shape
+    dy = np.abs(np.arange(h) - h // 2)
+    dx = np.abs(np.arange(w) - w // 2)
+    d2 = np.add.outer(
+        np.square(np.arange(dy.max() + 1, dtype=np.float32)),
+        np.square(np.arange(dx.max() + 1, dtype=np.float32)),
+    )
+
+    if not sigma:
+        quadrant = np.zeros(d2.shape, dtype=dtype)
+        for radius, sign in zip(radii, signs):
+            quadrant += sign * (d2 <= radius**2)
+    else:
+        # tabulate the radial profile, then interpolate over the distance map
+        r = np.arange(0, np.sqrt(d2[-1, -1]) + 1, 0.25)
+        profile = np.zeros_like(r)
+        for radius, sign in zip(radii, signs):
+            profile += sign * stats.ncx2.cdf((radius / sigma) ** 2, df=2, nc=(r / sigma) ** 2)
+        quadrant = np.interp(d2, r**2, profile).astype(dtype, copy=False)
+
+    return quadrant[np.ix_(dy, dx)]
+
+
+### CACHED MASKS
+MASK_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _cached_mask(kind: str, shape: tuple, lp: int, hp: int, sigma: float) -> np.ndarray:
+    if kind == "bandpass":
+        mask = soft_bandpass_mask(shape, lp=lp, hp=hp, sigma=sigma, dtype=np.float64)
+    elif kind == "circle":
+        mask = soft_circle_mask(shape, radius=lp, sigma=sigma, dtype=np.float64)
+    elif kind == "rectangular":
+        mask = soft_rect_mask(shape, sigma=sigma, dtype=np.float64)
+    else:
+        raise ValueError(f"Mask type {kind} is not supported.")
+
+    mask.flags.writeable = False
     return mask
 
 
+def get_bandpass_mask(shape: tuple, lp: int = 32, hp: int = 2, sigma: int = 3) -> np.ndarray:
+    """Get a (cached, read-only) bandpass mask. Equivalent to bandpass_mask.
+
+    Args:
+        shape (tuple): mask shape (rows, cols)
+        lp (int, optional): lowpass radius. Defaults to 32.
+        hp (int, optional): highpass radius. Defaults to 2.
+        sigma (int, optional): gaussian blur sigma. Defaults to 3.
+
+    Returns:
+        np.ndarray: read-only bandpass mask
+    """
+    return _cached_mask("bandpass", tuple(shape), lp, hp, sigma)
+
+
+def get_circle_mask(shape: tuple, radius: int = 32, sigma: int = 3) -> np.ndarray:
+    """Get a (cached, read-only) circular mask. Equivalent to circ_mask.
+
+    Args:
+        shape (tuple): mask shape (rows, cols)
+        radius (int, optional): circle radius. Defaults to 32.
+        sigma (int, optional): gaussian blur sigma. Defaults to 3.
+
+    Returns:
+        np.ndarray: read-only circular mask
+    """
+    return _cached_mask("circle", tuple(shape), radius, None, sigma)
+
+
+def get_rectangular_mask(shape: tuple, sigma: float = 5.0) -> np.ndarray:
+    """Get a (cached, read-only) soft edged rectangular mask. Equivalent to _mask_rectangular.
+
+    Args:
+        shape (tuple): mask shape (rows, cols)
+        sigma (float, optional): gaussian blur sigma. Defaults to 5.0.
+
+    Returns:
+        np.ndarray: read-only rectangular mask
+    """
+    return _cached_mask("rectangular", tuple(shape), None, None, sigma)
+
+
+def mask_cache_info():
+    """Mask cache statistics (hits, misses, maxsize, currsize)"""
+    return _cached_mask.cache_info()
 
 
+def clear_mask_cache() -> None:
+    """Clear the mask cache and reset the statistics"""
+    _cached_mask.cache_clear()
+
 
 def create_rect_mask(img: np.ndarray, w: int, h: int, sigma: int = 0, pt: Point= None) -> np.ndarray:
     """Create a rectangular mask at centred at the desired point.
@@ -146,17 +280,14 @@ def create_rect_mask(img: np.ndarray, w: int, h: int, sigma: int = 0, pt: Point=
     if pt is None:
         pt = Point(img.data.shape[1]//2, img.data.shape[0]//2)
 
-    mask = np.zeros_like(img)
-
-    y_min, y_max = int(np.clip(pt.y-h/2, 0, img.shape[1])), int(np.clip(pt.y+h/2, 0, img.shape[1]))
+    y_min, y_max = int(np.clip(pt.y-h/2, 0, img.shape[0])), int(np.clip(pt.y+h/2, 0, img.shape[0]))
     x_min, x_max = int(np.clip(pt.x-w/2, 0, img.shape[1])), int(np.clip(pt.x+w/2, 0, img.shape[1]))
 
-    mask[y_min:y_max, x_min:x_max] = 1
-
-    if sigma:
-        mask = ndi.filters.gaussian_filter(mask, sigma=sigma)
+    mask = soft_rect_mask(
+        img.shape, start=(y_min, x_min), extent=(y_max - y_min, x_max - x_min), sigma=sigma, dtype=np.float64
+    )
 
-    return mask 
+    return mask
 
 def create_lamella_mask(img: AdornedImage, protocol: dict, scale: int = 2, circ: bool = False, pt: Point = None, use_trench_height: bool = False) -> np.ndarray:
     """Create a mask based on the size of the lamella
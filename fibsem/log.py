@@ -0,0 +1,167 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from pathlib import Path
+
+import numpy as np
+
+LOG_FORMAT = "%(asctime)s — %(name)s — %(levelname)s — %(funcName)s:%(lineno)d — %(message)s"
+
+# attributes of every LogRecord, everything else on a record was passed as extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener = None
+_queue_handler: logging.Handler = None
+_handlers: list[logging.Handler] = []  # installed on the root logger by configure_handlers
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as json lines, with the fields passed as extra (e.g. beam, hfw, dx, dy) kept typed
+
+    e.g. logging.info("shift: %.2e, %.2e", dx, dy, extra={"dx": dx, "dy": dy})
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "name"):  # enums
+        return value.name
+    return str(value)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The default QueueHandler formats each message on the logging thread (so records can be
+    pickled); the queue here is in process, so records are queued as they are, and message
+    arguments are formatted later (so they shouldn't be modified after logging).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_handlers(handlers: list[logging.Handler], log_level: int = logging.INFO) -> None:
+    """Log to the handlers (synchronously), replacing the handlers (and queue listener) of a
+    previous configuration. Handlers added to the root logger elsewhere (e.g. by the host
+    application) are kept.
+
+    Args:
+        handlers (list[logging.Handler]): handlers to add to the root logger
+        log_level (int, optional): root log level. Defaults to logging.INFO.
+    """
+    global _handlers
+
+    stop_async_logging()
+
+    root = logging.getLogger()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(log_level)
+    _handlers = list(handlers)
+
+
+def configure_async_logging(handlers: list[logging.Handler], log_level: int = logging.INFO) -> logging.Handler:
+    """Log through a queue, so the handlers (e.g. file writes to slow network storage) run on
+    a background thread instead of the calling thread. Reconfiguring replaces the previous
+    queue handler and listener (or synchronous handlers).
+
+    Args:
+        handlers (list[logging.Handler]): handlers run by the listener thread
+        log_level (int, optional): root log level. Defaults to logging.INFO.
+
+    Returns:
+        logging.Handler: the queue handler (installed on the root logger)
+    """
+    global _listener, _queue_handler
+
+    stop_async_logging()
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = LazyQueueHandler(log_queue)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(log_level)
+
+    return _queue_handler
+
+
+def stop_async_logging() -> None:
+    """Flush the queued records, stop the listener thread and remove the queue handler
+    (and the handlers installed by configure_handlers)"""
+    global _listener, _queue_handler, _handlers
+
+    root = logging.getLogger()
+    for handler in _handlers:
+        root.removeHandler(handler)
+        handler.close()
+    _handlers = []
+
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def create_handlers(path: Path, log_filename: str, structured: bool = False) -> tuple[list[logging.Handler], str]:
+    """Create the session log handlers (file and terminal)
+
+    Args:
+        path (Path): log directory
+        log_filename (str): log filename (without extension)
+        structured (bool, optional): write json lines (log_filename.jsonl) instead of text. Defaults to False.
+
+    Returns:
+        tuple[list[logging.Handler], str]: handlers, log file path
+    """
+    if structured:
+        logfile = os.path.join(path, f"{log_filename}.jsonl")
+        file_formatter = JsonFormatter()
+    else:
+        logfile = os.path.join(path, f"{log_filename}.log")
+        file_formatter = logging.Formatter(LOG_FORMAT)
+
+    file_handler = logging.FileHandler(logfile)
+    file_handler.setFormatter(file_formatter)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    return [file_handler, stream_handler], logfile
+
+
+atexit.register(stop_async_logging)
@@ -1,5 +1,5 @@
 
-from fibsem import constants
+from fibsem import constants, property_cache, tracing
 import logging
 import numpy as np
 from autoscript_sdb_microscope_client import SdbMicroscopeClient
@@ -31,11 +31,12 @@ def setup_milling(
     microscope.patterning.set_default_application_file(application_file)
     microscope.patterning.mode = patterning_mode
     microscope.patterning.clear_patterns()  # clear any existing patterns
-    microscope.beams.ion_beam.horizontal_field_width.value = hfw
+    property_cache.write_property(microscope, "beams.ion_beam.horizontal_field_width", hfw)
     logging.info(f"setup ion beam milling")
     logging.info(f"application file:  {application_file}, pattern mode: {patterning_mode}, hfw: {hfw}")
 
 
+@tracing.traced("milling")
 def run_milling(
     microscope: SdbMicroscopeClient,
     milling_current: float,
@@ -49,13 +50,15 @@ def run_milling(
         milling_current (float, optional): ion beam milling current. Defaults to None.
         asynch (bool, optional): flag to run milling asynchronously. Defaults to False.
     """   
+    tracing.annotate(milling_current=milling_current, asynch=asynch)
+
     # change to milling current
     microscope.imaging.set_active_view(BeamType.ION.value)  # the ion beam view
     if microscope.beams.ion_beam.beam_current.value != milling_current:
         # if milling_current not in microscope.beams.ion_beam.beam_current.available_values:
         #   switch to closest # TODO: add check here
         logging.info(f"changing to milling current: {milling_current:.2e}")
-        microscope.beams.ion_beam.beam_current.value = milling_current
+        property_cache.write_property(microscope, "beams.ion_beam.beam_current", milling_current)
 
     # run milling (asynchronously)
     logging.info(f"running ion beam milling now... asynchronous={asynch}")
@@ -66,6 +69,7 @@ def run_milling(
         microscope.patterning.clear_patterns()
 
 
+@tracing.traced("milling")
 def finish_milling(microscope: SdbMicroscopeClient, imaging_current: float = 20e-12) -> None:
     """Clear milling patterns, and restore to the imaging current.   
     
@@ -77,7 +81,7 @@ def finish_milling(microscope: SdbMicroscopeClient, imaging_current: float = 20e
     # restore imaging current
     logging.info(f"changing to imaging current: {imaging_current:.2e}")
     microscope.patterning.clear_patterns()
-    microscope.beams.ion_beam.beam_current.value = imaging_current
+    property_cache.write_property(microscope, "beams.ion_beam.beam_current", imaging_current)
     microscope.patterning.mode = "Serial"
     logging.info("finished ion beam milling.")
 
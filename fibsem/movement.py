@@ -12,11 +12,13 @@ from autoscript_sdb_microscope_client.structures import (
     MoveSettings,
     StagePosition,
 )
+from fibsem import property_cache, tracing
 from fibsem.structures import BeamType, MicroscopeSettings
 
 ############################## NEEDLE ##############################
 
 
+@tracing.traced("movement")
 def insert_needle(
     microscope: SdbMicroscopeClient,
     insert_position: ManipulatorSavedPosition = ManipulatorSavedPosition.PARK,
@@ -46,6 +48,7 @@ def retract_multichem(microscope: SdbMicroscopeClient) -> None:
     return
 
 
+@tracing.traced("movement")
 def retract_needle(microscope: SdbMicroscopeClient) -> None:
     """Retract the needle and multichem, preserving the correct park position."""
 
@@ -155,6 +158,7 @@ def z_corrected_needle_movement(
     return ManipulatorPosition(x=0, y=y_move, z=z_move)
 
 
+@tracing.traced("movement")
 def move_needle_relative_with_corrected_movement(
     microscope: SdbMicroscopeClient,
     dx: float,
@@ -198,6 +202,7 @@ def move_needle_relative_with_corrected_movement(
 
 ############################## STAGE ##############################
 
+@tracing.traced("movement")
 def move_flat_to_beam(
     microscope: SdbMicroscopeClient,
     settings: MicroscopeSettings,
@@ -304,11 +309,13 @@ def safe_rotation_movement(
             ),
             stage_settings,
         )
+        property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
         logging.info(f"tilting to flat for large rotation.")
 
     return
 
 
+@tracing.traced("movement")
 def safe_absolute_stage_movement(
     microscope: SdbMicroscopeClient, stage_position: StagePosition
 ) -> None:
@@ -337,6 +344,7 @@ def safe_absolute_stage_movement(
     )
     logging.info(f"safe moving to {stage_position}")
     stage.absolute_move(stage_position, stage_settings)
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
     logging.info(f"safe movement complete.")
 
     return
@@ -418,6 +426,7 @@ def y_corrected_stage_movement(
 
     return StagePosition(x=0, y=y_move, z=z_move)
 
+@tracing.traced("movement")
 def move_stage_relative_with_corrected_movement(
     microscope: SdbMicroscopeClient,
     settings: MicroscopeSettings,
@@ -434,6 +443,7 @@ def move_stage_relative_with_corrected_movement(
         dy (float): distance along the y-axis (image coordinates)
         beam_type (BeamType): beam type to move in
     """
+    tracing.annotate(beam_type=beam_type.name)
     stage = microscope.specimen.stage
 
     # calculate stage movement
@@ -447,12 +457,17 @@ def move_stage_relative_with_corrected_movement(
 
     # move stage
     stage_position = StagePosition(x=x_move.x, y=yz_move.y, z=yz_move.z)
-    logging.info(f"moving stage: {stage_position}")
+    logging.info(
+        "moving stage: x: %.2em, y: %.2em, z: %.2em", x_move.x, yz_move.y, yz_move.z,
+        extra={"beam": beam_type.name, "dx": x_move.x, "dy": yz_move.y, "dz": yz_move.z},
+    )
     stage.relative_move(stage_position)
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
 
     return
 
 
+@tracing.traced("movement")
 def move_stage_eucentric_correction(microscope: SdbMicroscopeClient, dy: float) -> None:
     """Move the stage vertically to correct eucentric point
 
@@ -465,3 +480,4 @@ def move_stage_eucentric_correction(microscope: SdbMicroscopeClient, dy: float)
     move_settings = MoveSettings(link_z_y=True)
     z_move = StagePosition(z=z_move, coordinate_system="Specimen")
     microscope.specimen.stage.relative_move(z_move, move_settings)
+    property_cache.invalidate(microscope, property_cache.RAW_STAGE_POSITION)
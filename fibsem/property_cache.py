@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from autoscript_sdb_microscope_client import SdbMicroscopeClient
+
+from fibsem import config
+
+# cache key for the stage position (raw coordinates), invalidated by stage movements
+RAW_STAGE_POSITION = "specimen.stage.raw_position"
+
+BEAM_PROPERTIES = (
+    "working_distance",
+    "beam_current",
+    "horizontal_field_width",
+    "scanning.resolution",
+    "scanning.dwell_time",
+)
+
+
+def beam_property(beam: str, name: str) -> str:
+    """Property path for a beam (e.g. beam_property("electron_beam", "horizontal_field_width"))"""
+    return f"beams.{beam}.{name}"
+
+
+class PropertyCache:
+    """Cache of microscope property values (keyed by attribute path, e.g. beams.ion_beam.beam_current).
+
+    Each remote property read is a round trip to the microscope server. Values are reused for
+    ttl seconds, and invalidated when fibsem writes them (write_property) or moves the stage.
+    Changes made outside fibsem (e.g. on the microscope ui) are only seen once the ttl expires.
+
+    Args:
+        microscope (SdbMicroscopeClient): autoscript microscope client connection
+        ttl (float, optional): cache lifetime (s). Defaults to config.PROPERTY_CACHE_TTL.
+        max_workers (int, optional): concurrent reads for read_many (1: sequential). Defaults to config.PROPERTY_CACHE_WORKERS.
+    """
+
+    def __init__(self, microscope: SdbMicroscopeClient, ttl: float = None, max_workers: int = None) -> None:
+        self._microscope = _ref(microscope)
+        self.ttl = config.PROPERTY_CACHE_TTL if ttl is None else ttl
+        self.max_workers = max_workers or config.PROPERTY_CACHE_WORKERS
+        self._values = {}  # key: (timestamp, value)
+        self._generations = {}  # key: invalidation count, reads started before an invalidation aren't cached
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "hits": 0, "writes": 0, "invalidations": 0}
+
+    @property
+    def microscope(self) -> SdbMicroscopeClient:
+        return self._microscope()
+
+    def get(self, key: str, fetch):
+        """Get a cached value, or fetch (and cache) it if missing or expired
+
+        Args:
+            key (str): cache key
+            fetch: callable returning the value (a remote read)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["reads"] += 1
+            generation = self._generations.setdefault(key, 0)
+
+        value = fetch()
+
+        with self._lock:
+            # the value may have been written (or the stage moved) during the read
+            if self._generations[key] == generation:
+                self._values[key] = (now, value)
+
+        return value
+
+    def read(self, path: str):
+        """Read a property value (e.g. "beams.electron_beam.horizontal_field_width")"""
+        return self.get(path, lambda: _resolve(self.microscope, path).value)
+
+    def read_many(self, paths: list[str]) -> dict:
+        """Read property values. Expired / missing values are read together (concurrently with max_workers > 1).
+
+        Args:
+            paths (list[str]): property paths
+
+        Returns:
+            dict: path: value
+        """
+        if self.max_workers <= 1 or len(paths) <= 1:
+            return {path: self.read(path) for path in paths}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            values = list(executor.map(self.read, paths))
+
+        return dict(zip(paths, values))
+
+    def write(self, path: str, value) -> None:
+        """Write a property value, and invalidate the cached value (the microscope may adjust the value written)"""
+        _resolve(self.microscope, path).value = value
+        with self._lock:
+            self.stats["writes"] += 1
+            self._invalidate(path)
+
+    def invalidate(self, *keys: str) -> None:
+        """Invalidate cached values (keys, or key prefixes e.g. "beams.ion_beam"). Invalidates everything if no keys are given."""
+        with self._lock:
+            if not keys:
+                self.stats["invalidations"] += len(self._values)
+                for key in self._generations:
+                    self._generations[key] += 1
+                self._values.clear()
+                return
+            for key in keys:
+                self._invalidate(key)
+
+    def _invalidate(self, key: str) -> None:
+        for read in [k for k in self._generations if k == key or k.startswith(f"{key}.")]:
+            self._generations[read] += 1
+
+        for cached in [k for k in self._values if k == key or k.startswith(f"{key}.")]:
+            del self._values[cached]
+            self.stats["invalidations"] += 1
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+
+def _resolve(obj, path: str):
+    for attr in path.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _ref(obj):
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
+_CACHES = {}  # id(microscope): (weakref(microscope), PropertyCache)
+_CACHES_LOCK = threading.Lock()
+
+
+def get_property_cache(microscope: SdbMicroscopeClient) -> PropertyCache:
+    """Get the (shared) property cache for a microscope connection"""
+    key = id(microscope)
+
+    with _CACHES_LOCK:
+        if key in _CACHES:
+            ref, cache = _CACHES[key]
+            if ref() is microscope:
+                return cache
+
+        cache = PropertyCache(microscope)
+        _CACHES[key] = (_ref(microscope), cache)
+
+    return cache
+
+
+def read_properties(microscope: SdbMicroscopeClient, paths: list[str]) -> dict:
+    """Read (cached) property values, see PropertyCache.read_many"""
+    return get_property_cache(microscope).read_many(paths)
+
+
+def write_property(microscope: SdbMicroscopeClient, path: str, value) -> None:
+    """Write a property value, invalidating the cached value"""
+    get_property_cache(microscope).write(path, value)
+
+
+def invalidate(microscope: SdbMicroscopeClient, *keys: str) -> None:
+    """Invalidate cached property values (all values if no keys are given)"""
+    with _CACHES_LOCK:
+        entry = _CACHES.get(id(microscope))
+
+    if entry is not None and entry[0]() is microscope:
+        entry[1].invalidate(*keys)
+
+
+def property_cache_stats(microscope: SdbMicroscopeClient) -> dict:
+    """Get the number of remote reads, cache hits, writes and invalidations"""
+    stats = dict(get_property_cache(microscope).stats)
+    logging.debug(f"property cache: {stats}")
+    return stats
@@ -0,0 +1,605 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, fields
+from types import SimpleNamespace
+
+import numpy as np
+import scipy.ndimage as ndi
+from autoscript_sdb_microscope_client.structures import AdornedImage, ManipulatorPosition, StagePosition
+
+from fibsem import constants
+
+RESOLUTIONS = ["384x256", "768x512", "1536x1024", "3072x2048", "6144x4096"]
+ION_BEAM_CURRENTS = [1.0e-12, 20e-12, 60e-12, 0.2e-9, 0.74e-9, 2.0e-9, 7.6e-9, 28e-9]
+
+# default (total volume) sputter rate (um3/s), see config.MILLING_SPUTTER_RATE
+DEFAULT_SPUTTER_RATE = 3.920e-1
+
+
+@dataclass
+class SimulatorSettings:
+    """Simulated microscope settings
+
+    Latencies are in seconds. time_scale is the fraction of the real acquisition, milling and
+    stage movement times that is simulated (0: instant, 1: real time).
+    """
+
+    seed: int = 0
+    canvas_shape: tuple = (2048, 2048)  # (rows, cols)
+    canvas_pixel_size: float = 100e-9  # metres
+    noise: float = 0.05  # noise standard deviation (at 1us dwell time)
+    time_scale: float = 0.0
+    property_latency: float = 0.0  # per property read / write
+    command_latency: float = 0.0  # per command (grab frame, move, pattern, auto function)
+    stage_speed: float = 1e-3  # m/s
+    auto_function_time: float = 5.0  # seconds
+
+    @staticmethod
+    def __from_dict__(settings: dict) -> "SimulatorSettings":
+        names = {f.name for f in fields(SimulatorSettings)}
+        return SimulatorSettings(**{k: v for k, v in settings.items() if k in names})
+
+
+class Limits:
+    def __init__(self, min: float, max: float) -> None:
+        self.min = min
+        self.max = max
+
+    def is_in(self, value: float) -> bool:
+        return self.min <= value <= self.max
+
+    def __repr__(self) -> str:
+        return f"Limits(min={self.min}, max={self.max})"
+
+
+class Vector:
+    """2D vector (beam shift, stigmator), supporting += with tuples like the autoscript Point"""
+
+    def __init__(self, x: float = 0.0, y: float = 0.0) -> None:
+        self.x = x
+        self.y = y
+
+    def __add__(self, other) -> "Vector":
+        x, y = _xy(other)
+        return Vector(self.x + x, self.y + y)
+
+    def __repr__(self) -> str:
+        return f"Vector(x={self.x}, y={self.y})"
+
+
+def _xy(value) -> tuple[float, float]:
+    if isinstance(value, (tuple, list, np.ndarray)):
+        return float(value[0]), float(value[1])
+    return float(getattr(value, "x", 0.0) or 0.0), float(getattr(value, "y", 0.0) or 0.0)
+
+
+class _Component:
+    # base for the simulated api objects, sharing the microscope settings and lock
+
+    def __init__(self, sim: "SimulatedMicroscope") -> None:
+        self._sim = sim
+
+    def _command(self, duration: float = 0.0) -> None:
+        self._sim._sleep(self._sim.settings.command_latency + duration * self._sim.settings.time_scale)
+
+
+class Property(_Component):
+    """Simulated microscope property (value, limits, available values). Each read and write
+    takes settings.property_latency, modelling the client / server round trip."""
+
+    def __init__(self, sim, value, limits: Limits = None, available_values: list = None, convert=None) -> None:
+        super().__init__(sim)
+        self._convert = convert
+        self._value = convert(value) if convert else value
+        self.limits = limits
+        self.available_values = available_values
+
+    @property
+    def value(self):
+        self._sim._sleep(self._sim.settings.property_latency)
+        return self._value
+
+    @value.setter
+    def value(self, value) -> None:
+        self._sim._sleep(self._sim.settings.property_latency)
+        if self._convert is not None:
+            value = self._convert(value)
+        if self.limits is not None:
+            value = float(np.clip(value, self.limits.min, self.limits.max))
+        self._value = value
+
+
+class Scanning(_Component):
+    def __init__(self, sim, dwell_time: float = 1e-6) -> None:
+        super().__init__(sim)
+        self.resolution = Property(sim, "1536x1024", available_values=RESOLUTIONS)
+        self.dwell_time = Property(sim, dwell_time, limits=Limits(25e-9, 1e-3))
+        self.rotation = Property(sim, 0.0)
+
+
+class Beam(_Component):
+    def __init__(
+        self, sim, beam_type: str, hfw: float, hfw_max: float, working_distance: float, beam_current: float,
+        available_currents: list = None,
+    ) -> None:
+        super().__init__(sim)
+        self.beam_type = beam_type
+        self.horizontal_field_width = Property(sim, hfw, limits=Limits(1e-6, hfw_max))
+        self.working_distance = Property(sim, working_distance, limits=Limits(0.0, 0.1))
+        self.beam_current = Property(
+            sim, beam_current, limits=None if available_currents else Limits(1e-12, 100e-9),
+            available_values=available_currents,
+        )
+        self.beam_shift = Property(sim, Vector(), convert=lambda v: Vector(*_xy(v)))
+        self.stigmator = Property(sim, Vector(), convert=lambda v: Vector(*_xy(v)))
+        self.scanning = Scanning(sim)
+        self.is_blanked = False
+
+    def blank(self) -> None:
+        self._command()
+        self.is_blanked = True
+
+    def unblank(self) -> None:
+        self._command()
+        self.is_blanked = False
+
+
+class Beams:
+    def __init__(self, sim) -> None:
+        self.electron_beam = Beam(sim, "Electron", 150e-6, 2.6e-3, 3.91e-3, 50e-12)
+        self.ion_beam = Beam(sim, "Ion", 150e-6, 9.0e-4, 16.5e-3, 20e-12, available_currents=ION_BEAM_CURRENTS)
+
+
+class Imaging(_Component):
+    def __init__(self, sim) -> None:
+        super().__init__(sim)
+        self._active_view = 1
+        self._active_device = 1
+        self._last_images = {}
+
+    def set_active_view(self, view: int) -> None:
+        self._command()
+        self._active_view = int(view)
+
+    def get_active_view(self) -> int:
+        self._command()
+        return self._active_view
+
+    def set_active_device(self, device: int) -> None:
+        self._command()
+        self._active_device = int(device)
+
+    def get_active_device(self) -> int:
+        return self._active_device
+
+    def grab_frame(self, settings=None) -> AdornedImage:
+        """Acquire an image of the synthetic sample with the active view's beam
+
+        Args:
+            settings (GrabFrameSettings, optional): resolution, dwell time and reduced area. Defaults to the beam settings.
+
+        Returns:
+            AdornedImage: simulated image
+        """
+        beam = self._sim._beam(self._active_view)
+        resolution = getattr(settings, "resolution", None) or beam.scanning.resolution.value
+        dwell_time = getattr(settings, "dwell_time", None) or beam.scanning.dwell_time.value
+        reduced_area = getattr(settings, "reduced_area", None)
+
+        width, height = (int(v) for v in resolution.split("x"))
+        self._command(width * height * dwell_time)
+
+        image = self._sim._render(beam, width, height, dwell_time, reduced_area)
+        self._last_images[self._active_view] = image
+
+        return image
+
+    def get_image(self) -> AdornedImage:
+        self._command()
+        if self._active_view not in self._last_images:
+            return self.grab_frame()
+        return self._last_images[self._active_view]
+
+
+class Stage(_Component):
+    def __init__(self, sim) -> None:
+        super().__init__(sim)
+        self._position = {"x": 0.0, "y": 0.0, "z": 4.0e-3, "r": 0.0, "t": 0.0}
+        self.coordinate_system = "Specimen"
+        self.is_linked = True
+        self.is_homed = True
+
+    @property
+    def current_position(self) -> StagePosition:
+        self._sim._sleep(self._sim.settings.property_latency)
+        return StagePosition(coordinate_system=self.coordinate_system, **self._position)
+
+    def set_default_coordinate_system(self, coordinate_system) -> None:
+        self.coordinate_system = coordinate_system
+
+    def absolute_move(self, position: StagePosition, settings=None) -> None:
+        self._move({axis: getattr(position, axis, None) for axis in self._position})
+
+    def relative_move(self, position: StagePosition, settings=None) -> None:
+        self._move({
+            axis: self._position[axis] + value
+            for axis in self._position
+            if (value := getattr(position, axis, None)) is not None
+        })
+
+    def _move(self, target: dict) -> None:
+        target = {axis: value for axis, value in target.items() if value is not None}
+        distance = np.sqrt(sum((target[axis] - self._position[axis]) ** 2 for axis in target if axis in "xyz"))
+        self._command(distance / self._sim.settings.stage_speed)
+        with self._sim._lock:
+            self._position.update(target)
+
+    def link(self) -> None:
+        self._command(self._sim.settings.auto_function_time)
+        self.is_linked = True
+
+    def home(self) -> None:
+        self._move({"x": 0.0, "y": 0.0, "r": 0.0, "t": 0.0})
+        self.is_homed = True
+
+    def move_to_device(self, device=None) -> None:
+        self._move({"x": 0.0, "y": 0.0})
+
+
+class Manipulator(_Component):
+    def __init__(self, sim) -> None:
+        super().__init__(sim)
+        self._position = {"x": 0.0, "y": 0.0, "z": 0.0, "r": 0.0}
+        self._saved_positions = {}
+        self.coordinate_system = "Raw"
+        self.state = "Retracted"
+
+    @property
+    def current_position(self) -> ManipulatorPosition:
+        self._sim._sleep(self._sim.settings.property_latency)
+        return ManipulatorPosition(coordinate_system=self.coordinate_system, **self._position)
+
+    def set_default_coordinate_system(self, coordinate_system) -> None:
+        self.coordinate_system = coordinate_system
+
+    def get_saved_position(self, name, coordinate_system=None) -> ManipulatorPosition:
+        position = self._saved_positions.get(str(name), {"x": 0.0, "y": 0.0, "z": 0.0, "r": 0.0})
+        return ManipulatorPosition(coordinate_system=coordinate_system, **position)
+
+    def save_position(self, name) -> None:
+        self._saved_positions[str(name)] = dict(self._position)
+
+    def absolute_move(self, position: ManipulatorPosition, settings=None) -> None:
+        self._move({axis: getattr(position, axis, None) for axis in self._position})
+
+    def relative_move(self, position: ManipulatorPosition, settings=None) -> None:
+        self._move({
+            axis: self._position[axis] + value
+            for axis in self._position
+            if (value := getattr(position, axis, None)) is not None
+        })
+
+    def insert(self, position=None) -> None:
+        if position is not None:
+            self.absolute_move(position)
+        else:
+            self._command(self._sim.settings.auto_function_time)
+        self.state = "Inserted"
+
+    def retract(self) -> None:
+        self._command(self._sim.settings.auto_function_time)
+        self.state = "Retracted"
+
+    def _move(self, target: dict) -> None:
+        target = {axis: value for axis, value in target.items() if value is not None}
+        distance = np.sqrt(sum((target[axis] - self._position[axis]) ** 2 for axis in target if axis in "xyz"))
+        self._command(distance / self._sim.settings.stage_speed)
+        self._position.update(target)
+
+
+class Specimen:
+    def __init__(self, sim) -> None:
+        self.stage = Stage(sim)
+        self.manipulator = Manipulator(sim)
+
+
+class Pattern:
+    """Simulated milling pattern (rectangle, cleaning cross section or line)"""
+
+    def __init__(self, kind: str, **kwargs) -> None:
+        self.kind = kind
+        self.center_x = 0.0
+        self.center_y = 0.0
+        self.width = 0.0
+        self.height = 0.0
+        self.depth = 0.0
+        self.rotation = 0.0
+        self.scan_direction = "TopToBottom"
+        self.__dict__.update(kwargs)
+
+    @property
+    def volume(self) -> float:
+        # um3
+        return (
+            self.width * constants.METRE_TO_MICRON
+            * self.height * constants.METRE_TO_MICRON
+            * self.depth * constants.METRE_TO_MICRON
+        )
+
+
+class Patterning(_Component):
+    def __init__(self, sim) -> None:
+        super().__init__(sim)
+        self.patterns = []
+        self.mode = "Serial"
+        self.state = "Idle"
+        self.default_beam_type = 2
+        self.default_application_file = "Si"
+        self._thread = None
+        self._stop = threading.Event()
+
+    def set_default_beam_type(self, beam_type: int) -> None:
+        self.default_beam_type = int(beam_type)
+
+    def set_default_application_file(self, application_file: str) -> None:
+        self.default_application_file = application_file
+
+    def list_all_application_files(self) -> list[str]:
+        return ["Si", "Si-multipass", "Pt dep", "autolamella"]
+
+    def clear_patterns(self) -> None:
+        self.patterns = []
+
+    def create_rectangle(self, center_x, center_y, width, height, depth) -> Pattern:
+        return self._create("Rectangle", center_x=center_x, center_y=center_y, width=width, height=height, depth=depth)
+
+    def create_cleaning_cross_section(self, center_x, center_y, width, height, depth) -> Pattern:
+        return self._create(
+            "CleaningCrossSection", center_x=center_x, center_y=center_y, width=width, height=height, depth=depth
+        )
+
+    def create_line(self, start_x, start_y, end_x, end_y, depth) -> Pattern:
+        return self._create(
+            "Line",
+            center_x=(start_x + end_x) / 2,
+            center_y=(start_y + end_y) / 2,
+            width=float(np.hypot(end_x - start_x, end_y - start_y)),
+            height=self._sim.beams.ion_beam.horizontal_field_width._value / 1000,
+            depth=depth,
+        )
+
+    def _create(self, kind: str, **kwargs) -> Pattern:
+        self._command()
+        pattern = Pattern(kind, **kwargs)
+        self.patterns.append(pattern)
+        return pattern
+
+    def run(self) -> None:
+        """Mill the patterns (blocking)"""
+        self._stop.clear()
+        self.state = "Running"
+        try:
+            self._mill()
+        finally:
+            self.state = "Idle"
+
+    def start(self) -> None:
+        """Mill the patterns in the background"""
+        self._stop.clear()
+        self.state = "Running"
+
+        def _run():
+            try:
+                self._mill()
+            finally:
+                self.state = "Idle"
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _mill(self) -> None:
+        from fibsem import config
+
+        self._command()
+        beam = self._sim.beams.ion_beam
+        sputter_rate = config.MILLING_SPUTTER_RATE.get(beam.beam_current._value, DEFAULT_SPUTTER_RATE)
+
+        for pattern in list(self.patterns):
+            duration = pattern.volume / sputter_rate * self._sim.settings.time_scale
+            if self._stop.wait(duration):
+                logging.info("simulated milling stopped.")
+                return
+            self._sim._mill(beam, pattern)
+
+
+class AutoFunctions(_Component):
+    def run_auto_focus(self, settings=None) -> None:
+        self._command(self._sim.settings.auto_function_time)
+
+    def run_auto_cb(self, settings=None) -> None:
+        self._command(self._sim.settings.auto_function_time)
+
+
+class Detector:
+    def __init__(self, sim) -> None:
+        self.type = Property(sim, "ETD", available_values=["ETD", "TLD", "ICE"])
+        self.mode = Property(sim, "SecondaryElectrons", available_values=["SecondaryElectrons", "BackscatterElectrons"])
+
+
+class GasInjectionSystem(_Component):
+    def __init__(self, sim) -> None:
+        super().__init__(sim)
+        self.state = "Retracted"
+
+    def insert(self, position=None) -> None:
+        self._command(self._sim.settings.auto_function_time)
+        self.state = "Inserted"
+
+    def retract(self) -> None:
+        self._command(self._sim.settings.auto_function_time)
+        self.state = "Retracted"
+
+
+class Gas:
+    def __init__(self, sim) -> None:
+        self._multichem = GasInjectionSystem(sim)
+        self._gis = GasInjectionSystem(sim)
+
+    def get_multichem(self) -> GasInjectionSystem:
+        return self._multichem
+
+    def get_gis_port(self, name=None) -> GasInjectionSystem:
+        return self._gis
+
+
+class SimulatedMicroscope:
+    """Offline simulated microscope, implementing the subset of the SdbMicroscopeClient api used by fibsem.
+
+    Images are sampled from a synthetic sample canvas, at the stage position (plus beam shift)
+    and horizontal field width, with gaussian noise scaled by the dwell time. Milling darkens the
+    milled area of the canvas. Acquisition, milling and stage movement take (a time_scale fraction of)
+    their real durations, and property access / commands have configurable latencies.
+
+    The sample geometry is simplified: both beams image the canvas top down (stage tilt, scan
+    rotation and pattern rotation are not simulated), and the canvas repeats beyond its edges.
+
+    Args:
+        settings (SimulatorSettings, optional): simulator settings. Defaults to SimulatorSettings().
+    """
+
+    def __init__(self, settings: SimulatorSettings = None) -> None:
+        self.settings = settings if settings is not None else SimulatorSettings()
+        self._lock = threading.Lock()
+        self.canvas = synthetic_canvas(self.settings.canvas_shape, self.settings.seed)
+        self._rng = np.random.default_rng(self.settings.seed)
+
+        self.beams = Beams(self)
+        self.imaging = Imaging(self)
+        self.specimen = Specimen(self)
+        self.patterning = Patterning(self)
+        self.auto_functions = AutoFunctions(self)
+        self.detector = Detector(self)
+        self.gas = Gas(self)
+        self.vacuum = SimpleNamespace(chamber_state="Pumped")
+        self.state = SimpleNamespace(chamber_pressure=Property(self, 5e-6))
+        self.connected = False
+
+    def connect(self, ip_address: str = "localhost", port: int = None) -> None:
+        logging.info(f"Simulated microscope connected [{ip_address}]")
+        self.connected = True
+
+    def disconnect(self) -> None:
+        self.connected = False
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _beam(self, view: int) -> Beam:
+        return self.beams.ion_beam if int(view) == 2 else self.beams.electron_beam
+
+    def _field_centre(self, beam: Beam) -> tuple[float, float]:
+        # field of view centre in sample coordinates (metres)
+        stage = self.specimen.stage._position
+        return stage["x"] + beam.beam_shift._value.x, stage["y"] + beam.beam_shift._value.y
+
+    def _render(self, beam: Beam, width: int, height: int, dwell_time: float, reduced_area=None) -> AdornedImage:
+        hfw = beam.horizontal_field_width._value
+        pixel_size = hfw / width
+        cx, cy = self._field_centre(beam)
+
+        # sample coordinates of each pixel (image y is down, sample y is up)
+        xs = cx + (np.arange(width) - (width - 1) / 2) * pixel_size
+        ys = cy - (np.arange(height) - (height - 1) / 2) * pixel_size
+
+        if reduced_area is not None:
+            left, top = int(reduced_area.left * width), int(reduced_area.top * height)
+            xs = xs[left:left + max(1, int(reduced_area.width * width))]
+            ys = ys[top:top + max(1, int(reduced_area.height * height))]
+
+        rows, cols = self.canvas.shape
+        ri = np.floor(ys / self.settings.canvas_pixel_size + rows / 2).astype(np.int64) % rows
+        ci = np.floor(xs / self.settings.canvas_pixel_size + cols / 2).astype(np.int64) % cols
+
+        with self._lock:
+            img = self.canvas[np.ix_(ri, ci)]
+            noise = self._rng.standard_normal(img.shape, dtype=np.float32)
+
+        if beam.beam_type == "Ion":
+            img = 1.0 - img  # different (inverted) contrast for the ion beam
+
+        sigma = self.settings.noise / np.sqrt(max(dwell_time, 1e-9) / 1e-6)
+        img = img + sigma * noise
+        data = (np.clip(img, 0, 1) * 255).astype(np.uint8)
+
+        metadata = _image_metadata(beam, pixel_size, dwell_time, hfw)
+        return AdornedImage(data=data, metadata=metadata)
+
+    def _mill(self, beam: Beam, pattern: Pattern) -> None:
+        # darken the milled area of the canvas
+        cx, cy = self._field_centre(beam)
+        x, y = cx + pattern.center_x, cy + pattern.center_y
+        px = self.settings.canvas_pixel_size
+        rows, cols = self.canvas.shape
+
+        r0 = int(np.floor((y - pattern.height / 2) / px + rows / 2))
+        r1 = int(np.ceil((y + pattern.height / 2) / px + rows / 2))
+        c0 = int(np.floor((x - pattern.width / 2) / px + cols / 2))
+        c1 = int(np.ceil((x + pattern.width / 2) / px + cols / 2))
+
+        attenuation = np.exp(-pattern.depth * constants.METRE_TO_MICRON)
+        ri, ci = np.arange(r0, max(r1, r0 + 1)) % rows, np.arange(c0, max(c1, c0 + 1)) % cols
+        with self._lock:
+            self.canvas[np.ix_(ri, ci)] *= attenuation
+
+
+def synthetic_canvas(shape: tuple = (2048, 2048), seed: int = 0) -> np.ndarray:
+    """Generate a synthetic sample: multiscale texture, bright particles and a grid
+
+    Args:
+        shape (tuple, optional): canvas shape (rows, cols). Defaults to (2048, 2048).
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: float32 canvas (0 - 1)
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+
+    canvas = np.zeros(shape, dtype=np.float32)
+    for sigma, weight in ((32, 0.6), (8, 0.3), (2, 0.1)):
+        texture = ndi.gaussian_filter(rng.standard_normal(shape).astype(np.float32), sigma, mode="wrap")
+        canvas += weight * texture / (texture.std() + 1e-12)
+
+    # particles
+    particles = np.zeros(shape, dtype=np.float32)
+    n_particles = max(1, rows * cols // 20000)
+    particles[rng.integers(0, rows, n_particles), rng.integers(0, cols, n_particles)] = 1.0
+    particles = ndi.gaussian_filter(particles, 3, mode="wrap")
+    canvas += 4.0 * particles / (particles.max() + 1e-12)
+
+    # grid bars
+    period = max(8, min(rows, cols) // 8)
+    bars = ((np.arange(rows) % period) < period // 10)[:, None] | ((np.arange(cols) % period) < period // 10)[None, :]
+    canvas[bars] += 1.5
+
+    canvas -= canvas.min()
+    canvas /= canvas.max() + 1e-12
+
+    return canvas
+
+
+def _image_metadata(beam: Beam, pixel_size: float, dwell_time: float, hfw: float) -> SimpleNamespace:
+    # the subset of the AdornedImage metadata read by fibsem
+    return SimpleNamespace(
+        acquisition=SimpleNamespace(beam_type=beam.beam_type, working_distance=beam.working_distance._value),
+        binary_result=SimpleNamespace(pixel_size=SimpleNamespace(x=pixel_size, y=pixel_size)),
+        scan_settings=SimpleNamespace(dwell_time=dwell_time),
+        optics=SimpleNamespace(scan_field_of_view=SimpleNamespace(width=hfw)),
+    )
@@ -0,0 +1,319 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from fibsem import config
+
+TRACE_FILENAME = "trace.json"
+SUMMARY_FILENAME = "trace_summary.csv"
+
+
+class Span:
+    """A timed (nested) region of work, e.g. an image acquisition or stage move"""
+
+    __slots__ = ("name", "category", "start", "end", "thread_id", "depth", "attrs", "child_time")
+
+    def __init__(self, name: str, category: str, depth: int, attrs: dict) -> None:
+        self.name = name
+        self.category = category
+        self.depth = depth
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.child_time = 0
+        self.start = time.perf_counter_ns()
+        self.end = None
+
+    @property
+    def duration(self) -> float:
+        """Duration (s)"""
+        return ((self.end or time.perf_counter_ns()) - self.start) * 1e-9
+
+    @property
+    def self_time(self) -> float:
+        """Duration excluding nested spans (s)"""
+        return self.duration - self.child_time * 1e-9
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    # returned when tracing is disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _SpanContext:
+    def __init__(self, tracer: "Tracer", name: str, category: str, attrs: dict) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._attrs = attrs
+        self._span = None
+
+    def __enter__(self) -> Span:
+        self._span = self._tracer._start(self._name, self._category, self._attrs)
+        return self._span
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is not None:
+            self._span.attrs["error"] = exc_type.__name__
+        self._tracer._finish(self._span)
+
+
+class Tracer:
+    """Records nested timing spans (per thread), and exports them as a chrome trace
+    (chrome://tracing, perfetto) or a summary table.
+
+    Args:
+        max_spans (int, optional): max spans kept (the oldest are dropped). Defaults to config.TRACING_MAX_SPANS.
+    """
+
+    def __init__(self, max_spans: int = None) -> None:
+        self.enabled = False
+        self.spans = deque(maxlen=max_spans or config.TRACING_MAX_SPANS)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._thread_names = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self._thread_names.clear()
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name: str, category: str = "", **attrs):
+        """Context manager recording a span (a no-op when tracing is disabled)"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _SpanContext(self, name, category, attrs)
+
+    def current(self):
+        """Get the innermost active span on this thread"""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else _NULL_SPAN
+
+    def _start(self, name: str, category: str, attrs: dict) -> Span:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(name, category, len(stack), attrs)
+        stack.append(span)
+        return span
+
+    def _finish(self, span: Span) -> None:
+        span.end = time.perf_counter_ns()
+        stack = self._local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_time += span.end - span.start
+
+        with self._lock:
+            self.spans.append(span)
+            if span.thread_id not in self._thread_names:
+                self._thread_names[span.thread_id] = threading.current_thread().name
+
+    def chrome_trace(self) -> dict:
+        """Get the spans in the chrome trace event format"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            thread_names = dict(self._thread_names)
+
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        for span in spans:
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start - self._origin) / 1e3,  # us
+                "dur": (span.end - span.start) / 1e3,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {k: _jsonable(v) for k, v in span.attrs.items()},
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: Path) -> None:
+        """Save the spans as a chrome trace json (open with chrome://tracing or ui.perfetto.dev)"""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> list[dict]:
+        """Summarise the spans by name (count, total, self, mean and max time), sorted by total time"""
+        with self._lock:
+            spans = list(self.spans)
+
+        rows = {}
+        for span in spans:
+            row = rows.setdefault(span.name, {
+                "name": span.name, "category": span.category, "count": 0, "total": 0.0, "self": 0.0, "max": 0.0,
+            })
+            row["count"] += 1
+            row["total"] += span.duration
+            row["self"] += span.self_time
+            row["max"] = max(row["max"], span.duration)
+
+        for row in rows.values():
+            row["mean"] = row["total"] / row["count"]
+
+        return sorted(rows.values(), key=lambda row: row["total"], reverse=True)
+
+    def format_summary(self) -> str:
+        """Format the span summary as a table"""
+        lines = [f"{'name':<48} {'category':<12} {'count':>6} {'total (s)':>10} {'self (s)':>10} {'mean (s)':>10} {'max (s)':>10}"]
+        for row in self.summary():
+            lines.append(
+                f"{row['name'][:48]:<48} {row['category'][:12]:<12} {row['count']:>6} {row['total']:>10.3f} "
+                f"{row['self']:>10.3f} {row['mean']:>10.3f} {row['max']:>10.3f}"
+            )
+        return "\n".join(lines)
+
+    def save(self, path: Path) -> None:
+        """Save the chrome trace and summary table to a (session) directory"""
+        import csv
+
+        self.export_chrome_trace(os.path.join(path, TRACE_FILENAME))
+        with open(os.path.join(path, SUMMARY_FILENAME), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["name", "category", "count", "total", "self", "mean", "max"])
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+        logging.info(f"trace saved to {path}\n{self.format_summary()}")
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "name"):  # enums
+        return value.name
+    if isinstance(value, (tuple, list)):
+        return [_jsonable(v) for v in value]
+    return str(value)
+
+
+########################### DEFAULT TRACER
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def enable() -> None:
+    """Enable tracing (see config.TRACING_ENABLED)"""
+    _tracer.enable()
+
+
+def disable() -> None:
+    _tracer.disable()
+
+
+_session_path: Path = None
+
+
+def start_session(path: Path) -> None:
+    """Enable tracing for a (microscope) session. The spans are saved to the session directory
+    when the next session starts or at exit, and the tracer is cleared between sessions.
+
+    Args:
+        path (Path): session directory
+    """
+    global _session_path
+
+    save_session()
+    _tracer.clear()
+    _tracer.enable()
+    _session_path = path
+
+
+def save_session() -> None:
+    """Save the spans of the current session (if any) to its directory"""
+    global _session_path
+
+    if _session_path is None:
+        return
+
+    try:
+        _tracer.save(_session_path)
+    except OSError as e:
+        logging.warning(f"Unable to save the trace to {_session_path}: {e}")
+    _session_path = None
+
+
+atexit.register(save_session)
+
+
+def is_enabled() -> bool:
+    return _tracer.enabled
+
+
+def span(name: str, category: str = "", **attrs):
+    """Record a span around a block of work
+
+    Args:
+        name (str): span name
+        category (str, optional): span category (e.g. "acquisition", "movement"). Defaults to "".
+        **attrs: span attributes (e.g. beam_type, image_size)
+
+    Returns:
+        context manager, yielding the span (a no-op when tracing is disabled)
+    """
+    return _tracer.span(name, category, **attrs)
+
+
+def annotate(**attrs) -> None:
+    """Set attributes on the current span (e.g. the beam type or image size, once known)"""
+    if _tracer.enabled:
+        _tracer.current().set(**attrs)
+
+
+def traced(category: str = "", name: str = None):
+    """Decorator recording a span for each call (the function is called directly when tracing is disabled)
+
+    Args:
+        category (str, optional): span category. Defaults to "".
+        name (str, optional): span name. Defaults to the function module and name.
+    """
+
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.split('.')[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return fn(*args, **kwargs)
+            with _SpanContext(_tracer, span_name, category, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
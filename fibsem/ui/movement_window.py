@@ -7,7 +7,7 @@ import scipy.ndimage as ndi
 from autoscript_sdb_microscope_client import SdbMicroscopeClient
 from autoscript_sdb_microscope_client.structures import (MoveSettings,
                                                          StagePosition)
-from fibsem import acquire, conversions, movement, constants, alignment
+from fibsem import acquire, conversions, movement, constants, alignment, property_cache
 from fibsem.structures import BeamType, MicroscopeSettings
 from fibsem.ui import utils as fibsem_ui
 from fibsem.ui.qtdesigner_files import movement_dialog as movement_gui
@@ -261,6 +261,7 @@ class GUIMMovementWindow(movement_gui.Ui_Dialog, QtWidgets.QDialog):
         move_settings = MoveSettings(rotate_compucentric=True, tilt_compucentric=True)
         stage_position = StagePosition(t=stage_tilt_rad)
         stage.absolute_move(stage_position, move_settings)
+        property_cache.invalidate(self.microscope, property_cache.RAW_STAGE_POSITION)
 
         # update displays
         self.update_displays()
@@ -1,8 +1,11 @@
+import atexit
 import datetime
 import glob
 import json
 import logging
 import os
+import queue
+import threading
 import time
 from pathlib import Path
 
@@ -11,6 +14,7 @@ from autoscript_sdb_microscope_client import SdbMicroscopeClient
 from autoscript_sdb_microscope_client.structures import AdornedImage, ManipulatorPosition
 from PIL import Image
 import fibsem
+from fibsem import property_cache
 from fibsem.structures import (
     BeamType,
     MicroscopeSettings,
@@ -21,8 +25,15 @@ from fibsem.structures import (
 )
 
 
-def connect_to_microscope(ip_address="10.0.0.1"):
-    """Connect to the FIBSEM microscope."""
+def connect_to_microscope(ip_address="10.0.0.1", simulate: bool = False):
+    """Connect to the FIBSEM microscope (or an offline simulated microscope, see fibsem.simulator)."""
+    if simulate:
+        from fibsem.simulator import SimulatedMicroscope
+
+        microscope = SimulatedMicroscope()
+        microscope.connect(ip_address)
+        return microscope
+
     try:
         # TODO: get the port
         logging.info(f"Microscope client connecting to [{ip_address}]")
@@ -78,7 +89,7 @@ def sputter_platinum(
     time.sleep(3)
 
     # Create sputtering pattern
-    microscope.beams.electron_beam.horizontal_field_width.value = hfw
+    property_cache.write_property(microscope, "beams.electron_beam.horizontal_field_width", hfw)
     pattern = microscope.patterning.create_line(
         -line_pattern_length / 2,  # x_start
         +line_pattern_length,  # y_start
@@ -113,12 +124,189 @@ def sputter_platinum(
     logging.info("sputtering platinum finished.")
 
 
-def save_image(image: AdornedImage, save_path: Path, label:str="image"):
+def save_image(image: AdornedImage, save_path: Path, label:str="image", asynch: bool = False):
+    """Save an image to save_path/label.tif
+
+    Args:
+        image (AdornedImage): image to save
+        save_path (Path): directory to save the image in
+        label (str, optional): image filename (without extension). Defaults to "image".
+        asynch (bool, optional): queue the image on the background image writer. Defaults to False.
+    """
+    if asynch:
+        get_image_writer().save(image, save_path, label)
+        return
+
     os.makedirs(save_path, exist_ok=True)
     path = os.path.join(save_path, f"{label}.tif")
     image.save(path)
 
 
+class ImageWriter:
+    """Background image writer with a bounded queue.
+
+    save() blocks when the queue is full (backpressure), so queued images can't grow
+    memory without bound. Queued images are written in batches grouped by directory,
+    and each directory is only created once.
+
+    Args:
+        max_queue_size (int, optional): max queued images. Defaults to 32.
+        batch_size (int, optional): max images written per batch. Defaults to 16.
+    """
+
+    def __init__(self, max_queue_size: int = 32, batch_size: int = 16) -> None:
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._created_dirs = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # metrics
+        self._written = 0
+        self._errors = 0
+        self._batches = 0
+        self._write_time = 0.0
+        self._blocked_time = 0.0
+        self._max_depth = 0
+        self._start_time = time.perf_counter()
+
+        self._thread = threading.Thread(target=self._run, name="fibsem-image-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, image: AdornedImage, save_path: Path, label: str = "image") -> None:
+        """Queue an image to be saved to save_path/label.tif (blocks while the queue is full)"""
+        if self._closed:
+            raise RuntimeError("Unable to save image, the image writer is closed.")
+
+        if not self._thread.is_alive():
+            logging.warning("The image writer thread is not running, saving the image synchronously.")
+            self._write_batch([(image, save_path, label)])
+            return
+
+        t0 = time.perf_counter()
+        self._queue.put((image, save_path, label))
+
+        with self._lock:
+            self._blocked_time += time.perf_counter() - t0
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+
+    def flush(self) -> None:
+        """Wait until all queued images are written"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write all queued images, and stop the writer thread"""
+        if self._closed:
+            return
+
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self) -> dict:
+        """Get the writer metrics
+
+        Returns:
+            dict: queue depth (current, max), images written, write errors, batches,
+                throughput (images / s of write time), time spent blocked on a full queue (s)
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_depth,
+                "written": self._written,
+                "errors": self._errors,
+                "batches": self._batches,
+                "throughput": self._written / self._write_time if self._write_time else 0.0,
+                "blocked_time": self._blocked_time,
+                "uptime": time.perf_counter() - self._start_time,
+            }
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not None]
+            stop = len(items) < len(batch)
+
+            try:
+                self._write_batch(items)
+            except Exception as e:
+                # keep the writer thread running, the batch is counted as errors
+                logging.error(f"Unable to write image batch: {e}")
+                with self._lock:
+                    self._errors += len(items)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, items: list[tuple]) -> None:
+        t0 = time.perf_counter()
+
+        # group by directory
+        batches = {}
+        for image, save_path, label in items:
+            batches.setdefault(str(save_path), []).append((image, label))
+
+        written, errors = 0, 0
+        for save_path, images in batches.items():
+            if save_path not in self._created_dirs:
+                try:
+                    os.makedirs(save_path, exist_ok=True)
+                except Exception as e:
+                    errors += len(images)
+                    logging.error(f"Unable to create directory {save_path}, {len(images)} images not saved: {e}")
+                    continue
+                self._created_dirs.add(save_path)
+
+            for image, label in images:
+                try:
+                    image.save(os.path.join(save_path, f"{label}.tif"))
+                    written += 1
+                except Exception as e:
+                    errors += 1
+                    logging.error(f"Unable to save image {label} to {save_path}: {e}")
+
+        with self._lock:
+            self._written += written
+            self._errors += errors
+            self._batches += len(batches)
+            self._write_time += time.perf_counter() - t0
+
+
+_image_writer: ImageWriter = None
+_image_writer_lock = threading.Lock()
+
+
+def get_image_writer() -> ImageWriter:
+    """Get the shared background image writer (flushed at exit)"""
+    global _image_writer
+    from fibsem import config
+
+    with _image_writer_lock:
+        if _image_writer is None:
+            _image_writer = ImageWriter(
+                max_queue_size=config.IMAGE_WRITER_QUEUE_SIZE,
+                batch_size=config.IMAGE_WRITER_BATCH_SIZE,
+            )
+            atexit.register(_image_writer.close)
+
+    return _image_writer
+
+
+def flush_image_writer() -> None:
+    """Wait until all images queued on the background image writer are written"""
+    if _image_writer is not None:
+        _image_writer.flush()
+
+
 def current_timestamp():
     return datetime.datetime.fromtimestamp(time.time()).strftime("%Y-%m-%d.%I-%M-%S%p")
 
@@ -129,20 +317,37 @@ def _format_time_seconds(seconds: float) -> str:
 
 
 # TODO: better logs: https://www.toptal.com/python/in-depth-python-logging
-def configure_logging(path: Path = "", log_filename="logfile", log_level=logging.INFO):
-    """Log to the terminal and to file simultaneously."""
-    logfile = os.path.join(path, f"{log_filename}.log")
-
-    logging.basicConfig(
-        format="%(asctime)s — %(name)s — %(levelname)s — %(funcName)s:%(lineno)d — %(message)s",
-        level=log_level,
-        # Multiple handlers can be added to your logging configuration.
-        # By default log messages are appended to the file if it exists already
-        handlers=[
-            logging.FileHandler(logfile),
-            logging.StreamHandler(),
-        ],
-    )
+def configure_logging(
+    path: Path = "",
+    log_filename="logfile",
+    log_level=logging.INFO,
+    asynch: bool = None,
+    structured: bool = None,
+):
+    """Log to the terminal and to file simultaneously.
+
+    Args:
+        path (Path, optional): log directory. Defaults to "".
+        log_filename (str, optional): log filename (without extension). Defaults to "logfile".
+        log_level (optional): log level. Defaults to logging.INFO.
+        asynch (bool, optional): write the log on a background thread (see fibsem.log). Defaults to config.LOGGING_ASYNC.
+        structured (bool, optional): write the log file as json lines (log_filename.jsonl). Defaults to config.LOGGING_STRUCTURED.
+
+    Returns:
+        str: log file path
+    """
+    from fibsem import config, log
+
+    asynch = config.LOGGING_ASYNC if asynch is None else asynch
+    structured = config.LOGGING_STRUCTURED if structured is None else structured
+
+    # By default log messages are appended to the file if it exists already
+    handlers, logfile = log.create_handlers(path, log_filename, structured=structured)
+
+    if asynch:
+        log.configure_async_logging(handlers, log_level=log_level)
+    else:
+        log.configure_handlers(handlers, log_level=log_level)
 
     return logfile
 
@@ -191,19 +396,43 @@ def save_metadata(settings: MicroscopeSettings, path: Path):
     #     json.dump(settings_dict, fp, sort_keys=True, indent=4)
 
 
-def create_gif(path: Path, search: str, gif_fname: str, loop: int = 0) -> None:
-    filenames = glob.glob(os.path.join(path, search))
+def create_gif(
+    path: Path,
+    search: str,
+    gif_fname: str,
+    loop: int = 0,
+    duration: int = 100,
+    downsample: int = 1,
+    fmt: str = "gif",
+) -> None:
+    """Create an animation from the images in path matching search (in filename order).
 
-    imgs = [Image.fromarray(AdornedImage.load(fname).data) for fname in filenames]
+    Frames are streamed into the animation, so memory doesn't depend on the number of images.
+
+    Args:
+        path (Path): image directory (the animation is saved here)
+        search (str): glob pattern for the images
+        gif_fname (str): animation filename (without extension)
+        loop (int, optional): number of loops (gif only, 0: forever). Defaults to 0.
+        duration (int, optional): frame duration (ms). Defaults to 100.
+        downsample (int, optional): downsampling factor. Defaults to 1.
+        fmt (str, optional): animation format (gif, mp4, webm). Defaults to "gif".
+    """
+    from fibsem.imaging import animation
 
-    print(f"{len(filenames)} images added to gif.")
-    imgs[0].save(
-        os.path.join(path, f"{gif_fname}.gif"),
-        save_all=True,
-        append_images=imgs[1:],
+    flush_image_writer()
+    filenames = sorted(glob.glob(os.path.join(path, search)))
+
+    n_frames = animation.write_animation(
+        filenames,
+        os.path.join(path, f"{gif_fname}.{fmt}"),
+        duration=duration,
         loop=loop,
+        downsample=downsample,
     )
 
+    logging.info(f"{n_frames} images added to {fmt}.")
+
 
 def setup_session(
     config_path: Path = None, protocol_path: Path = None
@@ -218,6 +447,9 @@ def setup_session(
         tuple: microscope, settings, image_settings
     """
 
+    # finish writing images queued by a previous session
+    flush_image_writer()
+
     # load settings
     settings = load_settings_from_config(config_path, protocol_path)
 
@@ -229,6 +461,17 @@ def setup_session(
     # configure logging
     configure_logging(session_path)
 
+    # select the fastest fft backend for alignment
+    from fibsem import config
+    if config.FFT_AUTOTUNE:
+        from fibsem.imaging import fft
+        fft.autotune()
+
+    # record timing spans, saved to the session directory at exit (or when the next session starts)
+    if config.TRACING_ENABLED:
+        from fibsem import tracing
+        tracing.start_session(session_path)
+
     # connect to microscope
     microscope = connect_to_microscope(ip_address=settings.system.ip_address)
 
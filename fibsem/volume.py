@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import zarr
+from autoscript_sdb_microscope_client.structures import AdornedImage, StagePosition
+from numcodecs import Blosc
+
+from fibsem.structures import BeamType
+
+# per-slice metadata, stored as 1D arrays alongside each image stack
+METADATA_FIELDS = (
+    "timestamp",
+    "hfw",
+    "pixel_size_x",
+    "pixel_size_y",
+    "stage_x",
+    "stage_y",
+    "stage_z",
+    "stage_r",
+    "stage_t",
+)
+
+DEFAULT_CHUNKS = (1, 1024, 1024)  # (slices, rows, cols)
+
+
+def default_compressor() -> Blosc:
+    return Blosc(cname="zstd", clevel=3, shuffle=Blosc.BITSHUFFLE)
+
+
+class VolumeStore:
+    """Chunked, compressed, appendable image stacks (one per beam) in a zarr group.
+
+    Each appended slice is written as whole chunks, so appending doesn't rewrite
+    previous slices. Per-slice metadata (timestamp, hfw, pixel size, stage position)
+    is appended to 1D arrays in the same group. Stacks are read lazily (chunk by chunk).
+
+    Args:
+        path (Path): zarr store directory (e.g. session_path/volume.zarr)
+        mode (str, optional): zarr open mode ("a": read / append, "r": read only, "w": overwrite). Defaults to "a".
+        chunks (tuple, optional): chunk shape (slices, rows, cols). Defaults to DEFAULT_CHUNKS.
+        compressor (optional): numcodecs compressor. Defaults to blosc zstd (bitshuffle).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str = "a",
+        chunks: tuple = DEFAULT_CHUNKS,
+        compressor=None,
+    ) -> None:
+        self.path = str(path)
+        self.mode = mode
+        self.chunks = tuple(chunks)
+        self.compressor = compressor if compressor is not None else default_compressor()
+        self.root = zarr.open_group(self.path, mode=mode)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return max((self.n_slices(beam_type) for beam_type in self.beam_types()), default=0)
+
+    def beam_types(self) -> list[BeamType]:
+        """Get the beam types with a stack in the store"""
+        return [beam_type for beam_type in BeamType if _stack_name(beam_type) in self.root]
+
+    def n_slices(self, beam_type: BeamType) -> int:
+        name = _stack_name(beam_type)
+        return self.root[name].shape[0] if name in self.root else 0
+
+    def append(
+        self,
+        image,
+        beam_type: BeamType = None,
+        stage_position: StagePosition = None,
+        timestamp: float = None,
+    ) -> int:
+        """Append an image to the stack for its beam type
+
+        Args:
+            image (AdornedImage | np.ndarray): image to append
+            beam_type (BeamType, optional): image beam type. Defaults to the AdornedImage beam type
+                (required for arrays).
+            stage_position (StagePosition, optional): stage position for the slice. Defaults to None.
+            timestamp (float, optional): slice timestamp. Defaults to now.
+
+        Returns:
+            int: slice index
+        """
+        metadata = {
+            "timestamp": timestamp if timestamp is not None else time.time(),
+            **_image_metadata(image),
+            **_stage_metadata(stage_position),
+        }
+
+        if isinstance(image, AdornedImage):
+            if beam_type is None:
+                beam_type = BeamType[image.metadata.acquisition.beam_type.upper()]
+            data = image.data
+        else:
+            data = np.asarray(image)
+
+        if beam_type is None:
+            err = "The beam type is required to append image arrays to the volume."
+            logging.error(err)
+            raise ValueError(err)
+
+        with self._lock:
+            stack = self._get_or_create_stack(beam_type, data)
+
+            if data.shape != stack.shape[1:]:
+                err = f"Image shape {data.shape} does not match the {beam_type.name} volume shape {stack.shape[1:]}"
+                logging.error(err)
+                raise ValueError(err)
+
+            stack.append(data[np.newaxis], axis=0)
+
+            group = self.root[_metadata_name(beam_type)]
+            for field in METADATA_FIELDS:
+                group[field].append(np.array([metadata.get(field, np.nan)], dtype=np.float64))
+
+            return stack.shape[0] - 1
+
+    def append_slice(
+        self,
+        eb_image: AdornedImage,
+        ib_image: AdornedImage,
+        stage_position: StagePosition = None,
+    ) -> int:
+        """Append an electron and ion image pair (e.g. from acquire.take_reference_images)
+
+        Returns:
+            int: slice index
+        """
+        timestamp = time.time()
+        self.append(eb_image, BeamType.ELECTRON, stage_position, timestamp)
+        return self.append(ib_image, BeamType.ION, stage_position, timestamp)
+
+    def stack(self, beam_type: BeamType) -> zarr.Array:
+        """Get the (lazy) image stack for the beam type. Indexing reads only the required chunks.
+
+        Args:
+            beam_type (BeamType): beam type
+
+        Returns:
+            zarr.Array: image stack (slices, rows, cols)
+        """
+        return self.root[_stack_name(beam_type)]
+
+    def to_dask(self, beam_type: BeamType):
+        """Get the image stack for the beam type as a (lazy) dask array"""
+        import dask.array as da
+
+        return da.from_zarr(self.stack(beam_type))
+
+    def metadata(self, beam_type: BeamType) -> dict:
+        """Get the per-slice metadata for the beam type
+
+        Args:
+            beam_type (BeamType): beam type
+
+        Returns:
+            dict: field: per-slice values (np.ndarray), see METADATA_FIELDS
+        """
+        group = self.root[_metadata_name(beam_type)]
+        return {field: group[field][:] for field in METADATA_FIELDS}
+
+    def _get_or_create_stack(self, beam_type: BeamType, data: np.ndarray) -> zarr.Array:
+        name = _stack_name(beam_type)
+        if name in self.root:
+            return self.root[name]
+
+        chunks = (self.chunks[0], min(self.chunks[1], data.shape[0]), min(self.chunks[2], data.shape[1]))
+        stack = self.root.create_dataset(
+            name,
+            shape=(0,) + data.shape,
+            chunks=chunks,
+            dtype=data.dtype,
+            compressor=self.compressor,
+        )
+        stack.attrs["beam_type"] = beam_type.name
+
+        group = self.root.create_group(_metadata_name(beam_type))
+        for field in METADATA_FIELDS:
+            group.create_dataset(field, shape=(0,), chunks=(1024,), dtype=np.float64)
+
+        return stack
+
+
+def open_volume(path: Path) -> VolumeStore:
+    """Open a volume store read only (for analysis)"""
+    return VolumeStore(path, mode="r")
+
+
+def _stack_name(beam_type: BeamType) -> str:
+    return beam_type.name.lower()
+
+
+def _metadata_name(beam_type: BeamType) -> str:
+    return f"{beam_type.name.lower()}_metadata"
+
+
+def _image_metadata(image) -> dict:
+    if not isinstance(image, AdornedImage) or image.metadata is None:
+        return {}
+
+    try:
+        pixel_size = image.metadata.binary_result.pixel_size
+        return {
+            "hfw": image.width * pixel_size.x,
+            "pixel_size_x": pixel_size.x,
+            "pixel_size_y": pixel_size.y,
+        }
+    except AttributeError:
+        return {}
+
+
+def _stage_metadata(stage_position: StagePosition = None) -> dict:
+    if stage_position is None:
+        return {}
+
+    return {
+        f"stage_{axis}": getattr(stage_position, axis)
+        for axis in ("x", "y", "z", "r", "t")
+        if getattr(stage_position, axis) is not None
+    }
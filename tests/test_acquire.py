@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from fibsem import acquire
+from fibsem.simulator import SimulatedMicroscope, SimulatorSettings
+from fibsem.structures import BeamType, GammaSettings, ImageSettings
+
+
+def _image_settings(save_path, beam_type=BeamType.ELECTRON):
+    return ImageSettings(
+        resolution="384x256",
+        dwell_time=1e-6,
+        hfw=100e-6,
+        autocontrast=False,
+        beam_type=beam_type,
+        save=False,
+        save_path=save_path,
+        label="sim",
+        gamma=GammaSettings(enabled=False),
+    )
+
+
+def test_take_set_of_reference_images_async_order(tmp_path):
+
+    microscope = SimulatedMicroscope()
+    settings = _image_settings(str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        future = acquire.take_set_of_reference_images_async(
+            microscope, settings, hfws=(400e-6, 100e-6), label="ref", executor=executor
+        )
+        reference_images = future.result()
+
+    images = [
+        (reference_images.low_res_eb, "Electron", 400e-6),
+        (reference_images.high_res_eb, "Electron", 100e-6),
+        (reference_images.low_res_ib, "Ion", 400e-6),
+        (reference_images.high_res_ib, "Ion", 100e-6),
+    ]
+    for image, beam_type, hfw in images:
+        assert image.metadata.acquisition.beam_type == beam_type
+        assert np.isclose(image.metadata.binary_result.pixel_size.x, hfw / 384)
+
+    assert sorted(f.name for f in tmp_path.glob("*.tif")) == [
+        "ref_high_res_eb.tif", "ref_high_res_ib.tif", "ref_low_res_eb.tif", "ref_low_res_ib.tif"
+    ]
+
+
+def test_gather_propagates_exceptions():
+
+    futures = [Future(), Future()]
+    result = acquire._gather(futures, lambda *results: results)
+    futures[0].set_result(1)
+    assert not result.done()
+
+    futures[1].set_exception(ValueError("failed"))
+    with pytest.raises(ValueError):
+        result.result(timeout=1)
+
+
+def test_take_set_of_reference_images_async_save_error(tmp_path):
+
+    # the save directory can't be created (a file exists at the path)
+    save_path = tmp_path / "blocked"
+    save_path.write_text("")
+
+    microscope = SimulatedMicroscope()
+    future = acquire.take_set_of_reference_images_async(
+        microscope, _image_settings(str(save_path)), hfws=(400e-6, 100e-6)
+    )
+
+    with pytest.raises(OSError):
+        future.result(timeout=10)
+
+
+def test_new_image_async_overlaps_processing(tmp_path, monkeypatch):
+
+    microscope = SimulatedMicroscope(SimulatorSettings(time_scale=1.0))  # 384x256 @ 1us: ~0.1s grab
+    settings = _image_settings(str(tmp_path))
+    events = []
+    lock = threading.Lock()
+
+    def _record(name):
+        with lock:
+            events.append((name, time.perf_counter()))
+
+    acquire_image = acquire.acquire_image
+
+    def _acquire_image(*args, **kwargs):
+        _record("grab_start")
+        return acquire_image(*args, **kwargs)
+
+    def _process_image(image, gamma, save, save_path, label):
+        _record(f"process_start_{label}_{gamma.enabled}")
+        time.sleep(0.2)
+        _record(f"process_end_{label}")
+        return image
+
+    monkeypatch.setattr(acquire, "acquire_image", _acquire_image)
+    monkeypatch.setattr(acquire, "_process_image", _process_image)
+
+    # one worker, the ion frame is processed after the settings are modified
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        eb_future, ib_future = acquire.take_reference_images_async(microscope, settings, executor=executor)
+        settings.gamma.enabled = True  # modified after submission
+        eb_future.result(), ib_future.result()
+
+    times = dict(events)
+    grabs = [t for name, t in events if name == "grab_start"]
+
+    # the ion frame is grabbed while the electron frame is processed
+    assert len(grabs) == 2
+    assert times["process_start_sim_eb_False"] < grabs[1] < times["process_end_sim_eb"]
+    assert "process_start_sim_ib_False" in times
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+from autoscript_sdb_microscope_client.structures import AdornedImage
+from PIL import Image
+
+from fibsem import utils
+from fibsem.imaging import animation
+
+
+def _make_images(path, n=5, shape=(40, 60)):
+    filenames = []
+    for i in reversed(range(n)):
+        fname = os.path.join(path, f"image_{i:03d}.tif")
+        AdornedImage(data=np.full(shape, i * 20, dtype=np.uint8)).save(fname)
+        filenames.append(fname)
+    return sorted(filenames)
+
+
+def test_write_animation_gif(tmp_path):
+
+    filenames = _make_images(str(tmp_path))
+
+    n_frames = animation.write_animation(filenames, tmp_path / "test.gif", downsample=2, prefetch=2)
+    assert n_frames == 5
+
+    with Image.open(tmp_path / "test.gif") as gif:
+        assert gif.n_frames == 5
+        assert gif.size == (30, 20)
+        for i in range(5):
+            gif.seek(i)
+            assert np.array(gif.convert("L"))[0, 0] == i * 20
+
+
+def test_gif_writer_rgb_frames(tmp_path):
+
+    colours = [(255, 0, 0), (0, 0, 255), (0, 255, 0)]
+
+    with animation.GifWriter(tmp_path / "test.gif") as writer:
+        for colour in colours:
+            writer.append(np.full((20, 30, 3), colour, dtype=np.uint8))
+
+    with Image.open(tmp_path / "test.gif") as gif:
+        assert gif.n_frames == 3
+        for i, colour in enumerate(colours):
+            gif.seek(i)
+            assert tuple(np.array(gif.convert("RGB"))[0, 0]) == colour
+
+
+def test_iter_frames_is_ordered(tmp_path):
+
+    filenames = _make_images(str(tmp_path), n=10)
+
+    frames = list(animation.iter_frames(filenames, max_workers=4, prefetch=3))
+    assert [int(f[0, 0]) for f in frames] == [i * 20 for i in range(10)]
+
+
+def test_iter_frames_converts_to_uint8():
+
+    assert animation._to_uint8(np.array([[0, 65535]], dtype=np.uint16)).tolist() == [[0, 255]]
+    assert animation._to_uint8(np.array([[0.0, 0.5, 1.0]])).tolist() == [[0, 127, 255]]
+
+
+def test_create_gif(tmp_path):
+
+    _make_images(str(tmp_path), n=3)
+
+    utils.create_gif(str(tmp_path), "image_*.tif", "test")
+
+    with Image.open(tmp_path / "test.gif") as gif:
+        assert gif.n_frames == 3
+
+
+def test_write_animation_unsupported_format(tmp_path):
+
+    filenames = _make_images(str(tmp_path), n=1)
+
+    with pytest.raises(ValueError):
+        animation.write_animation(filenames, tmp_path / "test.avi")
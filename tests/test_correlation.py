@@ -0,0 +1,279 @@
+import numpy as np
+import pytest
+
+from fibsem.imaging import correlation, masks
+
+
+def _reference_crosscorrelation(img1, img2, lp=128, hp=6, sigma=6, bp=False):
+    # full complex fft implementation, as originally used in alignment.crosscorrelation
+    if bp:
+        bandpass = masks.bandpass_mask(size=(img1.shape[1], img1.shape[0]), lp=lp, hp=hp, sigma=sigma)
+        n_pixels = img1.shape[0] * img1.shape[1]
+        img1ft = np.fft.ifftshift(bandpass * np.fft.fftshift(np.fft.fft2(img1)))
+        img1ft = n_pixels * img1ft / np.sqrt((img1ft * np.conj(img1ft)).sum())
+        img2ft = np.fft.ifftshift(bandpass * np.fft.fftshift(np.fft.fft2(img2)))
+        img2ft[0, 0] = 0
+        img2ft = n_pixels * img2ft / np.sqrt((img2ft * np.conj(img2ft)).sum())
+        return np.real(np.fft.fftshift(np.fft.ifft2(img1ft * np.conj(img2ft))))
+
+    img1ft = np.fft.fft2(img1)
+    img1ft[0, 0] = 0
+    img2ft = np.conj(np.fft.fft2(img2))
+    return np.abs(np.fft.fftshift(np.fft.ifft2(img1ft * img2ft)))
+
+
+@pytest.mark.parametrize("shape", [(64, 96), (63, 95)])
+@pytest.mark.parametrize("bp", [True, False])
+def test_correlation_engine_matches_reference(shape, bp):
+
+    rng = np.random.default_rng(0)
+    img1 = rng.normal(size=shape)
+    img2 = np.roll(img1, (3, -5), axis=(0, 1))
+
+    engine = correlation.CorrelationEngine(shape, lp=20, hp=3, sigma=2, bp=bp)
+    xcorr = engine.correlate(img1, img2)
+    expected = _reference_crosscorrelation(img1, img2, lp=20, hp=3, sigma=2, bp=bp)
+
+    assert xcorr.shape == expected.shape
+    assert np.allclose(xcorr, expected, atol=1e-9 * np.abs(expected).max())
+
+
+def test_correlation_engine_shift():
+
+    rng = np.random.default_rng(0)
+    img1 = rng.normal(size=(128, 192))
+    img2 = np.roll(img1, (4, -7), axis=(0, 1))
+
+    engine = correlation.get_correlation_engine(img1.shape, img1.dtype, lp=48, hp=2, sigma=2)
+    dx, dy, xcorr = engine.shift(img1, img2)
+
+    assert (dx, dy) == (-7, 4)
+    assert xcorr.shape == img1.shape
+
+
+def test_get_correlation_engine_is_cached():
+
+    engine1 = correlation.get_correlation_engine((32, 32), np.float32, lp=8, hp=2, sigma=1)
+    engine2 = correlation.get_correlation_engine((32, 32), np.float32, lp=8, hp=2, sigma=1)
+    engine3 = correlation.get_correlation_engine((32, 32), np.float64, lp=8, hp=2, sigma=1)
+
+    assert engine1 is engine2
+    assert engine1 is not engine3
+
+
+def test_correlation_engine_shape_mismatch():
+
+    engine = correlation.CorrelationEngine((32, 32))
+
+    with pytest.raises(ValueError):
+        engine.correlate(np.zeros((32, 32)), np.zeros((32, 16)))
+
+
+def _fourier_shifted_pair(shape, shift):
+    import scipy.ndimage as ndi
+
+    rng = np.random.default_rng(1)
+    img1 = ndi.gaussian_filter(rng.normal(size=shape), 3)
+    img2 = np.fft.ifft2(ndi.fourier_shift(np.fft.fft2(img1), shift)).real
+
+    return img1, img2
+
+
+@pytest.mark.parametrize("shape", [(128, 192), (127, 191)])
+@pytest.mark.parametrize("subpixel, tol", [("parabolic", 0.1), ("gaussian", 0.1), ("upsampled", 0.05)])
+def test_correlation_engine_subpixel_shift(shape, subpixel, tol):
+
+    img1, img2 = _fourier_shifted_pair(shape, shift=(2.3, -4.7))
+
+    engine = correlation.CorrelationEngine(shape, lp=48, hp=2, sigma=3)
+    dx, dy, _ = engine.shift(img1, img2, subpixel=subpixel)
+
+    assert np.isclose(dx, -4.7, atol=tol)
+    assert np.isclose(dy, 2.3, atol=tol)
+
+
+def test_peak_confidence():
+
+    img1, img2 = _fourier_shifted_pair((128, 192), shift=(3, 5))
+
+    engine = correlation.CorrelationEngine((128, 192), lp=48, hp=2, sigma=3)
+    xcorr = engine.correlate(img1, img2)
+    noise = np.random.default_rng(2).normal(size=(128, 192))
+
+    assert correlation.peak_confidence(xcorr) > 3
+    assert correlation.peak_confidence(noise) < 1.5
+
+
+def test_gaussian_pyramid_is_cached():
+
+    img = np.random.default_rng(0).normal(size=(100, 150))
+
+    pyramid = correlation.gaussian_pyramid(img, levels=3, cache=True)
+
+    assert [level.shape for level in pyramid] == [(100, 150), (50, 75), (25, 38), (13, 19)]
+
+    cached = correlation.gaussian_pyramid(img, levels=3, cache=True)
+    assert cached[0] is img
+    assert all(a is b for a, b in zip(cached[1:], pyramid[1:]))
+    assert correlation.gaussian_pyramid(img.copy(), levels=3, cache=True)[1] is not pyramid[1]
+
+
+def test_gaussian_pyramid_cache_does_not_keep_the_image():
+    import gc
+    import weakref
+
+    img = np.random.default_rng(0).normal(size=(100, 150))
+    ref = weakref.ref(img)
+
+    correlation.gaussian_pyramid(img, levels=3, cache=True)
+    del img
+    gc.collect()
+
+    assert ref() is None
+
+
+@pytest.mark.parametrize("min_level", [0, 1])
+def test_pyramid_shift(min_level):
+
+    img1, img2 = _fourier_shifted_pair((256, 384), shift=(11.3, -17.6))
+
+    dx, dy, xcorr, levels = correlation.pyramid_shift(
+        img1, img2, levels=3, lp=64, hp=2, sigma=3, subpixel="parabolic", min_level=min_level
+    )
+
+    assert np.isclose(dx, -17.6, atol=0.25)
+    assert np.isclose(dy, 11.3, atol=0.25)
+    assert [level.level for level in levels] == list(range(3, min_level - 1, -1))
+    assert xcorr.shape == levels[0].shape
+
+
+def test_pyramid_shift_only_transforms_the_coarsest_level():
+    import time
+
+    import scipy.ndimage as ndi
+
+    from fibsem.imaging import fft
+
+    class RecordingBackend(fft.ScipyBackend):
+        shapes = []
+
+        def rfft2(self, x, workers=None):
+            RecordingBackend.shapes.append(x.shape)
+            return super().rfft2(x, workers)
+
+        def irfft2(self, x, s, workers=None, overwrite_x=False):
+            RecordingBackend.shapes.append(tuple(s))
+            return super().irfft2(x, s, workers, overwrite_x)
+
+    rng = np.random.default_rng(0)
+    img1 = ndi.gaussian_filter(rng.normal(size=(1024, 1536)), 3)
+    img2 = np.roll(img1, (7, -13), axis=(0, 1))
+
+    previous = fft.current_backend()
+    fft.register_backend("recording", RecordingBackend)
+    try:
+        fft.set_backend("recording")
+        dx, dy, xcorr, levels = correlation.pyramid_shift(img1, img2, levels=3, lp=64, hp=2, sigma=3)
+    finally:
+        fft.set_backend(previous)
+        fft.unregister_backend("recording")
+
+    # whole pixel accuracy at full resolution, without any full resolution transform
+    assert (dx, dy) == (-13, 7)
+    assert set(RecordingBackend.shapes) == {(128, 192)}
+    assert len(RecordingBackend.shapes) == 3
+
+    def best_time(func):
+        times = []
+        for _ in range(3):
+            t0 = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+    engine = correlation.get_correlation_engine(img1.shape, lp=64, hp=2, sigma=3)
+    full = best_time(lambda: engine.shift(img1, img2))
+    pyramid = best_time(lambda: correlation.pyramid_shift(img1, img2, levels=3, lp=64, hp=2, sigma=3))
+
+    assert engine.shift(img1, img2)[:2] == (-13, 7)
+    assert pyramid < full
+
+
+def test_correlation_engine_evaluate_matches_map():
+
+    img1, img2 = _fourier_shifted_pair((64, 95), shift=(2.0, -3.0))
+
+    engine = correlation.CorrelationEngine(img1.shape, lp=24, hp=2, sigma=2)
+    ft1, energy1 = engine.spectrum(img1)
+    ft2, energy2 = engine.spectrum(img2, zero_dc=True)
+    prod = engine.cross_power_spectrum(ft1, energy1, ft2, energy2)
+    xcorr = engine._inverse(prod)
+
+    rows, cols = np.arange(20, 30), np.arange(40, 47)
+    assert np.allclose(engine.evaluate(prod, rows, cols), xcorr[np.ix_(rows, cols)])
+
+    dx, dy, window = engine.shift(img1, img2, expected=(-2, 1), search=2)
+    assert (dx, dy) == (-3, 2)
+    assert window.shape == (7, 7)
+
+
+def test_reference_bank_matches_engine():
+
+    rng = np.random.default_rng(0)
+    img1 = rng.normal(size=(128, 192))
+    img2 = np.roll(img1, (4, -7), axis=(0, 1))
+
+    bank = correlation.ReferenceBank(lp=48, hp=2, sigma=2)
+    bank.add("a", img1)
+    dx, dy, xcorr = bank.shift("a", img2)
+
+    engine = correlation.get_correlation_engine(img1.shape, np.float64, lp=48, hp=2, sigma=2)
+    expected = engine.correlate(correlation._normalise(img1), correlation._normalise(img2))
+
+    assert (dx, dy) == (-7, 4)
+    assert np.allclose(xcorr, expected)
+
+
+def test_reference_bank_shift_all_and_batch():
+
+    rng = np.random.default_rng(0)
+    refs = {key: rng.normal(size=(96, 128)) for key in range(5)}
+    bank = correlation.ReferenceBank(lp=32, hp=2, sigma=2, use_rect_mask=True)
+    for key, ref in refs.items():
+        bank.add(key, ref)
+    bank.add("other_shape", rng.normal(size=(64, 64)))
+
+    new = np.roll(refs[3], (2, 5), axis=(0, 1))
+    results = bank.shift_all(new, chunk_size=2)
+
+    assert sorted(results) == list(refs)
+    assert results[3][:2] == (5, 2)
+    for key, (dx, dy, xcorr) in results.items():
+        assert np.allclose(xcorr, bank.shift(key, new)[2])
+
+    batch = bank.shift_batch([(key, np.roll(ref, (1, -3), axis=(0, 1))) for key, ref in refs.items()])
+    assert [(dx, dy) for dx, dy, _ in batch] == [(-3, 1)] * len(refs)
+
+    bank.remove(3)
+    assert 3 not in bank and len(bank) == 5
+
+
+def test_reference_bank_shape_and_replace():
+
+    rng = np.random.default_rng(0)
+    img1 = rng.normal(size=(64, 190))
+    img2 = rng.normal(size=(64, 190))
+
+    bank = correlation.ReferenceBank(lp=32, hp=2, sigma=2)
+    bank.add("a", img1)
+    assert bank.is_source("a", img1)
+
+    # same rfft width (w // 2 + 1), different image width
+    with pytest.raises(ValueError):
+        bank.shift("a", rng.normal(size=(64, 191)))
+
+    # re-adding a key replaces the reference
+    bank.add("a", img2)
+    assert bank.is_source("a", img2) and not bank.is_source("a", img1)
+    assert bank.shift("a", np.roll(img2, (3, -2), axis=(0, 1)))[:2] == (-2, 3)
+    assert list(bank.shift_all(img2)) == ["a"]
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+from autoscript_sdb_microscope_client.structures import AdornedImage
+
+from fibsem import config
+from fibsem.detection import dataset
+from fibsem.detection import utils as det_utils
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr(config, "USER_CACHE_DIR", str(path))
+    return path
+
+
+def _make_dataset(path, n=5):
+    labels = [f"20220101.12000{i}_label" for i in range(n)]
+    for i, label in enumerate(labels):
+        AdornedImage(data=np.full((20, 30), i, dtype=np.uint8)).save(os.path.join(path, f"{label}.tif"))
+        det_utils.write_data_to_csv(path, [label, "NeedleTip", 0.1, 0.2, "LamellaCentre", 0.5, 0.5])
+    return labels
+
+
+def test_detection_dataset(tmp_path):
+
+    labels = _make_dataset(str(tmp_path))
+
+    ds = dataset.DetectionDataset(tmp_path, prefetch=2)
+    assert len(ds) == 5
+    assert ds.labels == labels
+    assert ds.filename(labels[3]) == os.path.join(str(tmp_path), f"{labels[3]}.tif")
+    assert ds.get(labels[3]).adorned_image.data[0, 0] == 3
+
+    results = list(ds)
+    assert [int(r.adorned_image.data[0, 0]) for r in results] == list(range(5))
+
+
+def test_detection_dataset_index_is_cached(tmp_path, cache_dir, monkeypatch):
+
+    labels = _make_dataset(str(tmp_path), n=3)
+    files = sorted(os.listdir(tmp_path))
+    dataset.build_index(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == files  # nothing is written to the dataset directory
+    assert os.path.exists(det_utils.index_cache_path(tmp_path, dataset.INDEX_NAME))
+    assert str(cache_dir) in det_utils.index_cache_path(tmp_path, dataset.INDEX_NAME)
+
+    # cached index is used, also from disk (e.g. in a new process)
+    calls = []
+    read_detection_log = det_utils.read_detection_log
+    monkeypatch.setattr(det_utils, "read_detection_log", lambda path: calls.append(path) or read_detection_log(path))
+    assert [e["label"] for e in dataset.build_index(tmp_path)] == labels
+    dataset._INDEX_CACHE.clear()
+    assert [e["label"] for e in dataset.build_index(tmp_path)] == labels
+    assert calls == []
+
+    # modified dataset invalidates the index
+    os.utime(tmp_path / "data.csv", ns=(0, 0))
+    dataset._INDEX_CACHE.clear()
+    assert [e["label"] for e in dataset.build_index(tmp_path)] == labels
+    assert len(calls) == 1
+    assert [e["filename"] for e in dataset.build_index(tmp_path)] == [f"{label}.tif" for label in labels]
+    assert len(calls) == 1
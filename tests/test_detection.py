@@ -0,0 +1,176 @@
+import numpy as np
+from scipy.spatial import distance
+
+from fibsem.detection import detection
+from fibsem.structures import Point
+
+
+def _closest_edge_loop(mask, landing_pt):
+    # original python loop implementation
+    min_dst, closest = np.inf, (0, 0)
+    for px in zip(*np.where(mask)):
+        dst = distance.euclidean((landing_pt.y, landing_pt.x), px)
+        if dst < min_dst:
+            min_dst, closest = dst, px
+    return Point(x=closest[1], y=closest[0])
+
+
+def test_detect_closest_edge_matches_loop():
+
+    rng = np.random.default_rng(0)
+    mask = rng.random((60, 80)) > 0.995
+    mask[10, 10] = mask[10, 14] = True  # equidistant from (10, 12)
+
+    points = [Point(x=12, y=10), Point(x=0, y=0), Point(x=79, y=59), Point(x=40.5, y=30.2)]
+    expected = [_closest_edge_loop(mask, pt) for pt in points]
+
+    single = [detection.detect_closest_edge_v2(mask, pt) for pt in points]
+    batch = detection.detect_closest_edges(mask, points)
+
+    assert [(p.x, p.y) for p in single] == [(p.x, p.y) for p in expected]
+    assert [(p.x, p.y) for p in batch] == [(p.x, p.y) for p in expected]
+
+
+def test_detect_closest_edge_empty_mask():
+
+    mask = np.zeros((10, 10), dtype=bool)
+
+    point = detection.detect_closest_edge_v2(mask, Point(5, 5))
+    points = detection.detect_closest_edges(mask, [Point(5, 5), Point(1, 1)])
+
+    assert (point.x, point.y) == (0, 0)
+    assert [(p.x, p.y) for p in points] == [(0, 0), (0, 0)]
+
+
+def test_feature_context_is_shared(monkeypatch):
+
+    calls = []
+    edge_detection = detection.edge_detection
+
+    def _edge_detection(img, sigma=3):
+        calls.append(sigma)
+        return edge_detection(img, sigma=sigma)
+
+    monkeypatch.setattr(detection, "edge_detection", _edge_detection)
+
+    img = np.random.default_rng(0).normal(size=(64, 96))
+    context = detection.FeatureContext(img)
+
+    edges = context.edges(sigma=3)
+    assert context.edges(sigma=3) is edges
+    assert not edges.flags.writeable
+    assert np.array_equal(context.edge_px(sigma=3), np.argwhere(edges))
+    context.edges(sigma=2)
+
+    assert calls == [3, 2]
+
+
+def test_detect_features_shares_edges(monkeypatch):
+    from autoscript_sdb_microscope_client.structures import AdornedImage
+
+    from fibsem.detection.utils import DetectionFeature, DetectionType
+
+    calls = []
+    edge_detection = detection.edge_detection
+
+    def _edge_detection(img, sigma=3):
+        calls.append(sigma)
+        return edge_detection(img, sigma=sigma)
+
+    monkeypatch.setattr(detection, "edge_detection", _edge_detection)
+
+    image = AdornedImage(data=(_edge_image() > 0).astype(np.uint8) * 255)
+    features = [
+        DetectionFeature(DetectionType.NeedleTip, Point(x=100, y=100)),
+        DetectionFeature(DetectionType.LandingPost, Point(x=200, y=100)),
+    ]
+
+    # the full edge map is calculated once, and shared by both features
+    detection.detect_features(image, image, features)
+    assert calls == [3]
+
+    # a new call (e.g. after the image is updated in place) recalculates the edges
+    detection.detect_features(image, image, features)
+    assert calls == [3, 3]
+
+
+def _edge_image(shape=(256, 384)):
+    import scipy.ndimage as ndi
+
+    rng = np.random.default_rng(0)
+    return ndi.gaussian_filter(rng.normal(size=shape), 2) * 20
+
+
+def test_edge_detection_roi_matches_full_image():
+
+    img = _edge_image()
+    full = detection.edge_detection(img, sigma=3)
+
+    for roi in [(slice(50, 150), slice(100, 300)), (slice(None, 80), slice(200, None))]:
+        assert np.array_equal(detection.edge_detection_roi(img, roi, sigma=3), full[roi])
+
+
+def test_detect_closest_edge_roi_matches_full_image():
+
+    img = _edge_image()
+    sparse = np.zeros_like(img)
+    sparse[200:, 300:] = img[200:, 300:]  # edges only far from the centre
+
+    for image in [img, sparse]:
+        full = detection.edge_detection(image, sigma=3)
+        for pt in [Point(x=192, y=128), Point(x=10, y=250)]:
+            expected = detection.detect_closest_edge_v2(full, pt)
+            closest = detection.detect_closest_edge_roi(detection.FeatureContext(image), pt, sigma=3, size=32)
+            assert (closest.x, closest.y) == (expected.x, expected.y)
+
+
+def test_mask_statistics():
+
+    colours = [(255, 0, 0), (0, 255, 0), (255, 165, 0), (1, 2, 3)]
+    palette = np.array([(0, 0, 0)] + colours[:3], dtype=np.uint8)
+    labels = np.random.default_rng(0).integers(0, 4, size=(60, 80))
+    labels[:10] = 0
+    mask = palette[labels]
+
+    assert np.array_equal(detection.label_mask(mask, colours), labels)
+
+    statistics = detection.mask_statistics(mask, colours)
+    for colour in colours[:3]:
+        idx = np.where(np.all(mask == colour, axis=-1))
+        stats = statistics[colour]
+
+        assert stats.count == len(idx[0])
+        assert (stats.centre.x, stats.centre.y) == (int(np.mean(idx[1])), int(np.mean(idx[0])))
+        assert stats.bbox == (idx[0].min(), idx[1].min(), idx[0].max(), idx[1].max())
+        assert detection.detect_bounding_box(mask, colour) == stats.bbox
+        assert detection.detect_centre_point(mask, colour) == stats.centre
+
+    assert statistics[(1, 2, 3)].count == 0
+    assert detection.detect_centre_point(mask, (1, 2, 3)) == Point(0, 0)
+
+
+def test_label_mask_float_and_empty():
+
+    colours = [(255, 0, 0), (0, 255, 0), (1, 2, 3)]
+    palette = np.array([(0, 0, 0)] + colours, dtype=np.uint8)
+    labels = np.random.default_rng(0).integers(0, 4, size=(20, 30))
+    mask = palette[labels]
+
+    # float masks (e.g. loaded from disk) are labelled the same as uint8 masks
+    assert np.array_equal(detection.pack_rgb(mask.astype(np.float32)), detection.pack_rgb(mask))
+    assert np.array_equal(detection.label_mask(mask.astype(np.float32), colours), labels)
+
+    # no colours, everything is background
+    assert np.array_equal(detection.label_mask(mask, []), np.zeros(labels.shape, dtype=np.int32))
+
+
+def test_filter_selected_masks():
+    from fibsem.detection.detection import DETECTION_COLOURS_UINT8, DetectionType
+
+    shift_type = (DetectionType.NeedleTip, DetectionType.LamellaCentre)
+    colours = [DETECTION_COLOURS_UINT8[det_type] for det_type in DetectionType]
+    palette = np.array([(0, 0, 0)] + colours, dtype=np.uint8)
+    mask = palette[np.random.default_rng(0).integers(0, len(palette), size=(20, 30))]
+
+    expected = sum(detection.extract_class_pixels(mask, DETECTION_COLOURS_UINT8[t])[0] for t in shift_type)
+    assert np.array_equal(detection.filter_selected_masks(mask, shift_type), expected)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from fibsem.detection import utils as det_utils
+
+
+def _decode_segmap_loop(image, nc=3):
+    # original per-class implementation
+    label_colors = np.array([(0, 0, 0), (255, 0, 0), (0, 255, 0)])
+    r, g, b = (np.zeros_like(image, dtype=np.uint8) for _ in range(3))
+    for l in range(0, nc):
+        idx = image == l
+        r[idx], g[idx], b[idx] = label_colors[l]
+    return np.stack([r, g, b], axis=2)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int64])
+@pytest.mark.parametrize("nc", [2, 3])
+def test_decode_segmap_matches_loop(dtype, nc):
+
+    image = np.random.default_rng(0).integers(0, 5, size=(40, 60)).astype(dtype)
+
+    assert np.array_equal(det_utils.decode_segmap(image, nc=nc), _decode_segmap_loop(image, nc=nc))
+
+
+def test_decode_segmap_out_and_batch():
+
+    images = np.random.default_rng(0).integers(0, 6, size=(4, 40, 60)).astype(np.uint8)
+
+    out = np.empty((4, 40, 60, 3), dtype=np.uint8)
+    rgb = det_utils.decode_segmap_batch(images, nc=6, out=out)
+
+    assert rgb is out
+    for image, mask in zip(images, rgb):
+        assert np.array_equal(det_utils.decode_segmap(image, nc=6), mask)
+
+    # additional classes get distinct colours
+    assert len({tuple(c) for c in rgb.reshape(-1, 3)}) == 6
+
+    with pytest.raises(ValueError):
+        det_utils.decode_segmap_batch(images[0])
+
+
+def test_detection_log_append_and_load(tmp_path):
+    from autoscript_sdb_microscope_client.structures import AdornedImage
+
+    labels = ["20220101.120000_label", "20220101.120001_label", "20220101.120002_label"]
+    for i, label in enumerate(labels):
+        AdornedImage(data=np.zeros((20, 30), dtype=np.uint8)).save(str(tmp_path / f"{label}.tif"))
+        det_utils.write_data_to_csv(tmp_path, [label, "NeedleTip", 0.1 * i, 0.2, "LamellaCentre", 0.5, 0.5])
+
+        if i == 0:
+            # partially written row (e.g. crash during a write)
+            with open(tmp_path / "data.csv", "a") as f:
+                f.write("20220101.115959_label,NeedleTip,0.")
+
+    rows = list(det_utils.read_detection_log(tmp_path))
+    assert [row["label"] for row in rows] == labels
+
+    results = det_utils.load_detection_results(tmp_path)
+    assert not isinstance(results, list)  # lazy
+
+    results = list(results)
+    assert len(results) == 3
+    assert results[1].features[0].detection_type == det_utils.DetectionType.NeedleTip
+    assert results[2].features[1].feature_px == det_utils.scale_coordinate_to_image(
+        det_utils.Point(0.5, 0.5), (20, 30)
+    )
+
+
+def test_load_detection_result_missing_image(tmp_path):
+
+    row = {"label": "missing", "p1.type": "NeedleTip", "p1.x": 0.1, "p1.y": 0.2,
+           "p2.type": "LamellaCentre", "p2.x": 0.5, "p2.y": 0.5}
+
+    with pytest.raises(FileNotFoundError):
+        det_utils.load_detection_result(tmp_path, row)
+    with pytest.raises(FileNotFoundError):
+        det_utils.load_detection_result(tmp_path, row, filenames=[str(tmp_path / "other.tif")])
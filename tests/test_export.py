@@ -0,0 +1,33 @@
+import os
+
+from fibsem.detection import export
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def test_export_labelling_images(tmp_path):
+
+    sessions = [tmp_path / "session_1", tmp_path / "session_2"]
+    _write(sessions[0] / "a" / "1_label.tif", b"one")
+    _write(sessions[0] / "b" / "2_label.tif", b"two")
+    _write(sessions[0] / "3_image.tif", b"not for labelling")
+    _write(sessions[1] / "4_label.tif", b"one")  # duplicate content
+
+    dest = tmp_path / "retrain"
+    summary = export.export_labelling_images(sessions, dest, max_workers=2)
+
+    assert summary == {"found": 3, "exported": 2, "duplicate": 1, "skipped": 0, "failed": 0}
+    exported = sorted(f for f in os.listdir(dest) if f.endswith(".tif"))
+    assert len(exported) == 2
+    assert len(export.load_manifest(dest)) == 3
+
+    # resume: already exported images are skipped, new images are exported
+    _write(sessions[1] / "5_label.tif", b"three")
+    summary = export.export_labelling_images(sessions, dest, link=True)
+
+    assert summary == {"found": 4, "exported": 1, "duplicate": 0, "skipped": 3, "failed": 0}
+    assert len([f for f in os.listdir(dest) if f.endswith(".tif")]) == 3
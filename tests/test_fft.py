@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from fibsem import alignment
+from fibsem.imaging import correlation, fft
+
+
+@pytest.mark.parametrize("bp", [True, False])
+def test_backends_match(bp):
+
+    rng = np.random.default_rng(0)
+    img1 = rng.normal(size=(64, 96))
+    img2 = np.roll(img1, (3, -5), axis=(0, 1))
+
+    xcorrs = [
+        alignment.crosscorrelation(img1, img2, lp=20, hp=3, sigma=2, bp=bp, backend=name)
+        for name in fft.available_backends()
+    ]
+
+    for xcorr in xcorrs[1:]:
+        assert np.allclose(xcorr, xcorrs[0])
+
+    assert np.allclose(
+        alignment.crosscorrelation_v2_np(img1, img2, lp=20, hp=3, sigma=2, bp=bp), xcorrs[0]
+    )
+
+
+def test_set_backend():
+
+    previous = fft.current_backend()
+    try:
+        fft.set_backend("numpy")
+        engine = correlation.get_correlation_engine((32, 32), lp=8, hp=2, sigma=1)
+        assert fft.current_backend() == "numpy"
+        assert engine.backend == "numpy"
+
+        with pytest.raises(ValueError):
+            fft.set_backend("unknown")
+    finally:
+        fft.set_backend(previous)
+
+
+@pytest.fixture
+def counting_backend():
+    yield "counting"
+    fft.unregister_backend("counting")
+
+
+def test_backend_is_abstract():
+
+    with pytest.raises(TypeError):
+        fft.FFTBackend()
+
+
+def test_register_backend(counting_backend):
+
+    class CountingBackend(fft.ScipyBackend):
+        calls = 0
+
+        def rfft2(self, x, workers=None):
+            CountingBackend.calls += 1
+            return super().rfft2(x, workers)
+
+    fft.register_backend(counting_backend, CountingBackend)
+    engine = correlation.CorrelationEngine((32, 32), lp=8, hp=2, sigma=1, backend=counting_backend)
+    engine.correlate(np.ones((32, 32)), np.ones((32, 32)))
+
+    assert engine.backend == "counting"
+    assert CountingBackend.calls == 2
+
+
+def test_autotune():
+
+    previous = fft.current_backend()
+    try:
+        name = fft.autotune(shapes=[(64, 96), "128x64"], backends=["numpy", "scipy"], repeats=1)
+        assert name in ("numpy", "scipy")
+        assert fft.current_backend() == name
+    finally:
+        fft.set_backend(previous)
+
+
+def test_fftw_wisdom_round_trip(tmp_path):
+    from types import SimpleNamespace
+
+    wisdom = (b"(fftw-3.3.10 fftw_wisdom)", b"(fftw-3.3.10 fftwf_wisdom)", b"(fftw-3.3.10 fftwl_wisdom)")
+    imported = []
+
+    # without pyfftw installed, only the wisdom file handling is tested
+    backend = fft.FFTWBackend.__new__(fft.FFTWBackend)
+    backend._pyfftw = SimpleNamespace(export_wisdom=lambda: wisdom, import_wisdom=imported.append)
+    backend.wisdom_path = str(tmp_path / "cache" / "fftw_wisdom.json")
+
+    backend.save_wisdom()
+    backend.load_wisdom()
+
+    assert imported == [wisdom]
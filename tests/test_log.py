@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+
+import numpy as np
+import pytest
+
+from fibsem import log, utils
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    # pytest's log capture handlers are added / removed by pytest
+    handlers = [h for h in root.handlers if not type(h).__module__.startswith("_pytest")]
+    level = root.level
+    yield root
+    log.stop_async_logging()
+    for handler in root.handlers:
+        if handler not in handlers:
+            handler.close()
+    root.handlers, root.level = handlers, level
+
+
+def test_json_formatter():
+
+    record = logging.LogRecord("fibsem", logging.INFO, __file__, 1, "shift: %.2e", (1e-6,), None)
+    record.beam = "Electron"
+    record.dx = np.float64(1e-6)
+
+    entry = json.loads(log.JsonFormatter().format(record))
+
+    assert entry["message"] == "shift: 1.00e-06"
+    assert entry["level"] == "INFO"
+    assert entry["beam"] == "Electron"
+    assert entry["dx"] == 1e-6
+
+
+def test_async_structured_logging(root_logger, tmp_path):
+
+    class Arg:
+        # records the thread the message is formatted on
+        threads = []
+
+        def __str__(self):
+            Arg.threads.append(threading.current_thread())
+            return "arg"
+
+    root_logger.handlers = []  # pytest log capture
+    logfile = utils.configure_logging(tmp_path, asynch=True, structured=True)
+    assert logfile.endswith(".jsonl")
+    assert isinstance(root_logger.handlers[0], log.LazyQueueHandler)
+
+    logging.info("moving stage: %s", Arg(), extra={"beam": "Ion", "dx": 2e-6, "dy": -1e-6})
+    log.stop_async_logging()
+
+    with open(logfile) as f:
+        entries = [json.loads(line) for line in f]
+
+    assert entries[-1]["message"] == "moving stage: arg"
+    assert entries[-1]["beam"] == "Ion"
+    assert entries[-1]["dx"] == 2e-6 and entries[-1]["dy"] == -1e-6
+    assert threading.main_thread() not in Arg.threads  # formatted by the listener
+
+
+def test_sync_logging(root_logger, tmp_path):
+
+    root_logger.handlers = []  # pytest log capture
+    logfile = utils.configure_logging(tmp_path, asynch=False, structured=False)
+    logging.info("acquiring new %s image.", "ELECTRON")
+    for handler in root_logger.handlers:
+        handler.flush()
+
+    with open(logfile) as f:
+        assert "acquiring new ELECTRON image." in f.read()
+
+
+def test_reconfigure_async_logging(root_logger, tmp_path):
+
+    root_logger.handlers = []  # pytest log capture
+    first = utils.configure_logging(tmp_path, log_filename="first", asynch=True)
+    logging.info("first")
+
+    second = utils.configure_logging(tmp_path, log_filename="second", asynch=True)
+    logging.info("second")
+    log.stop_async_logging()
+
+    assert not any(isinstance(h, log.LazyQueueHandler) for h in root_logger.handlers)
+    with open(first) as f:
+        assert [line.split(" — ")[-1].strip() for line in f] == ["first"]
+    with open(second) as f:
+        assert [line.split(" — ")[-1].strip() for line in f] == ["second"]
+
+
+def test_async_logging_after_sync_logging(root_logger, tmp_path):
+
+    root_logger.handlers = []  # pytest log capture
+    host_handler = logging.NullHandler()  # e.g. configured by the host application
+    root_logger.addHandler(host_handler)
+
+    first = utils.configure_logging(tmp_path, log_filename="sync", asynch=False)
+    logging.info("sync")
+
+    second = utils.configure_logging(tmp_path, log_filename="async", asynch=True)
+    logging.info("async")
+    log.stop_async_logging()
+
+    assert root_logger.handlers == [host_handler]
+    with open(first) as f:
+        assert [line.split(" — ")[-1].strip() for line in f] == ["sync"]
+    with open(second) as f:
+        assert [line.split(" — ")[-1].strip() for line in f] == ["async"]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import scipy.ndimage as ndi
+
+from fibsem.imaging import masks
+
+
+def test_get_bandpass_mask_is_cached():
+
+    masks.clear_mask_cache()
+
+    mask1 = masks.get_bandpass_mask((64, 96), lp=16, hp=2, sigma=3)
+    mask2 = masks.get_bandpass_mask((64, 96), lp=16, hp=2, sigma=3)
+    info = masks.mask_cache_info()
+
+    assert mask1 is mask2
+    assert info.hits == 1
+    assert info.misses == 1
+    assert np.array_equal(mask1, masks.bandpass_mask(size=(96, 64), lp=16, hp=2, sigma=3))
+
+
+def test_cached_masks_are_read_only():
+
+    mask = masks.get_rectangular_mask((64, 96), sigma=5)
+
+    assert mask.shape == (64, 96)
+    with pytest.raises(ValueError):
+        mask[0, 0] = 1
+
+
+def test_cached_mask_kinds_do_not_collide():
+
+    masks.clear_mask_cache()
+
+    circle = masks.get_circle_mask((64, 64), radius=16, sigma=3)
+    bandpass = masks.get_bandpass_mask((64, 64), lp=16, hp=2, sigma=3)
+
+    assert circle is not bandpass
+    assert masks.mask_cache_info().misses == 2
+
+
+def _rasterised_disc(shape, radius):
+    # hard disc drawn with PIL, as the masks were built before the analytic masks
+    from PIL import Image, ImageDraw
+
+    h, w = shape
+    img = Image.new("I", (w, h))
+    ImageDraw.Draw(img).ellipse(
+        (w / 2 - radius, h / 2 - radius, w / 2 + radius, h / 2 + radius), fill="white", outline="white"
+    )
+    return np.array(img, float) / 255
+
+
+def _rasterised_rect(shape, start, extent):
+    mask = np.zeros(shape)
+    mask[start[0]:start[0] + extent[0], start[1]:start[1] + extent[1]] = 1.0
+    return mask
+
+
+@pytest.mark.parametrize("shape", [(128, 192), (127, 191)])
+def test_rect_masks_match_blurred_rectangle(shape):
+
+    start = np.round(np.array(shape) * 0.05).astype(int)
+    extent = np.round(np.array(shape) * 0.90).astype(int)
+    expected = ndi.gaussian_filter(_rasterised_rect(shape, start, extent), sigma=5)
+
+    mask = masks.soft_rect_mask(shape, sigma=5)
+    assert mask.dtype == np.float32
+    assert np.allclose(mask, expected, atol=2e-3)
+    assert np.allclose(masks._mask_rectangular(shape, sigma=5), expected, atol=2e-3)
+
+
+def test_create_rect_mask_matches_blurred_rectangle():
+
+    img = np.zeros((128, 192), dtype=np.uint8)
+    mask = masks.create_rect_mask(img, w=60, h=40, sigma=3)
+    expected = ndi.gaussian_filter(_rasterised_rect(img.shape, (44, 66), (40, 60)), sigma=3)
+
+    assert mask.shape == img.shape
+    assert np.allclose(mask, expected, atol=2e-3)
+
+
+@pytest.mark.parametrize("shape", [(128, 192), (127, 191)])
+@pytest.mark.parametrize("lp, hp, sigma", [(32, 2, 3), (48, 6, 6)])
+def test_bandpass_masks_match_blurred_annulus(shape, lp, hp, sigma):
+
+    annulus = _rasterised_disc(shape, lp) * (1 - _rasterised_disc(shape, hp))
+    expected = ndi.gaussian_filter(annulus, sigma=sigma)
+
+    mask = masks.soft_bandpass_mask(shape, lp=lp, hp=hp, sigma=sigma)
+    assert mask.dtype == np.float32
+    assert np.allclose(mask, expected, atol=5e-2)
+    assert np.allclose(masks.bandpass_mask(size=(shape[1], shape[0]), lp=lp, hp=hp, sigma=sigma), expected, atol=5e-2)
+    assert np.allclose(masks.create_bandpass_mask(shape, lp=lp, hp=hp, sigma=sigma), expected, atol=5e-2)
+
+
+def test_circle_masks_match_blurred_disc():
+
+    expected = ndi.gaussian_filter(_rasterised_disc((128, 192), 40), sigma=3)
+
+    assert np.allclose(masks.soft_circle_mask((128, 192), radius=40, sigma=3), expected, atol=5e-2)
+    assert np.allclose(masks.circ_mask(size=(192, 128), radius=40, sigma=3), expected, atol=5e-2)
+    assert np.allclose(masks.create_circle_mask((128, 192), radius=40, sigma=3), expected, atol=5e-2)
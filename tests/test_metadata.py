@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from fibsem import config
+from fibsem.detection import metadata
+from fibsem.detection import utils as det_utils
+
+METADATA = "[User]\r\nDate=01/01/2022\r\nUser=user\r\n\r\n[Beam]\r\nHV=30000\r\nHFW=0.00015\r\nBeam=EBeam\r\n"
+
+
+def _save_tiff(filename, hfw=0.00015):
+    Image.fromarray(np.zeros((20, 30), dtype=np.uint8)).save(
+        filename, tiffinfo={metadata.FIB_METADATA_TAG: METADATA.replace("0.00015", str(hfw))}
+    )
+
+
+def test_read_fib_metadata_matches_pil(tmp_path):
+
+    fname = str(tmp_path / "image.tif")
+    _save_tiff(fname)
+
+    assert metadata.read_fib_metadata(fname) == Image.open(fname).tag[34682][0]
+
+    df = det_utils.parse_metadata(fname)
+    assert df["[Beam].HV"][0] == "30000"
+    assert df["filename"][0] == fname
+
+
+@pytest.mark.parametrize("max_workers", [0, 2])
+def test_scan_metadata(tmp_path, tmp_path_factory, monkeypatch, max_workers):
+
+    cache_dir = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr(config, "USER_CACHE_DIR", str(cache_dir))
+
+    os.makedirs(tmp_path / "sub")
+    filenames = [str(tmp_path / f"image_{i}.tif") for i in range(3)] + [str(tmp_path / "sub" / "image.tif")]
+    for i, fname in enumerate(filenames):
+        _save_tiff(fname, hfw=i * 1e-6)
+
+    df = metadata.scan_metadata(tmp_path, max_workers=max_workers, chunk_size=1)
+
+    assert sorted(df["filename"]) == sorted(filenames)
+    assert df["[Beam].HV"].dtype == np.int64
+    assert df["[Beam].HFW"].dtype == np.float64
+    assert df["[Beam].Beam"].tolist() == ["EBeam"] * 4
+    assert sorted(os.listdir(tmp_path)) == ["image_0.tif", "image_1.tif", "image_2.tif", "sub"]
+    assert os.path.exists(det_utils.index_cache_path(tmp_path, metadata.INDEX_NAME))
+
+    # cached, only modified files are rescanned
+    _save_tiff(filenames[0], hfw=1.0)
+    os.utime(filenames[0], ns=(1, 1))
+    df = metadata.scan_metadata(tmp_path, max_workers=0)
+    assert df.set_index("filename").loc[filenames[0], "[Beam].HFW"] == 1.0
+    assert df.set_index("filename").loc[filenames[1], "[Beam].HFW"] == 1e-6
@@ -0,0 +1,108 @@
+from autoscript_sdb_microscope_client.structures import StagePosition
+
+from fibsem import acquire, calibration, property_cache
+from fibsem.property_cache import PropertyCache
+from fibsem.simulator import SimulatedMicroscope
+from fibsem.structures import BeamType, GammaSettings, ImageSettings
+
+N_STATE_READS = 11  # 5 properties per beam, and the stage position
+
+
+def test_microscope_state_is_cached():
+
+    microscope = SimulatedMicroscope()
+    cache = property_cache.get_property_cache(microscope)
+    assert property_cache.get_property_cache(microscope) is cache
+
+    state = calibration.get_current_microscope_state(microscope)
+    assert cache.stats["reads"] == N_STATE_READS
+
+    cached_state = calibration.get_current_microscope_state(microscope)
+    assert cache.stats["reads"] == N_STATE_READS
+    assert cache.stats["hits"] == N_STATE_READS
+    assert cached_state.eb_settings == state.eb_settings
+    assert cached_state.absolute_position is not state.absolute_position
+
+    calibration.get_current_microscope_state(microscope, use_cache=False)
+    assert cache.stats["reads"] == 2 * N_STATE_READS
+
+
+def test_writes_invalidate_cached_values():
+
+    microscope = SimulatedMicroscope()
+    cache = property_cache.get_property_cache(microscope)
+    calibration.get_current_microscope_state(microscope)
+
+    settings = ImageSettings(
+        resolution="384x256", dwell_time=1e-6, hfw=200e-6, autocontrast=False,
+        beam_type=BeamType.ION, save=False, label="test", gamma=GammaSettings(),
+    )
+    acquire.new_image(microscope, settings)
+    assert cache.stats["writes"] == 1
+
+    cache.reset_stats()
+    state = calibration.get_current_microscope_state(microscope)
+    assert state.ib_settings.hfw == 200e-6
+    assert cache.stats["reads"] == 1
+
+
+def test_stage_movement_invalidates_stage_position():
+
+    microscope = SimulatedMicroscope()
+    cache = property_cache.get_property_cache(microscope)
+    calibration.get_current_microscope_state(microscope)
+
+    state = calibration.get_current_microscope_state(microscope)
+    state.absolute_position = StagePosition(x=1e-3, y=0.0, z=4e-3, r=0.0, t=0.0)
+    calibration.set_microscope_state(microscope, state)
+
+    cache.reset_stats()
+    new_state = calibration.get_current_microscope_state(microscope)
+    assert new_state.absolute_position.x == 1e-3
+    assert cache.stats["reads"] == N_STATE_READS  # stage moved, and every beam property was written
+
+
+def test_ttl():
+
+    microscope = SimulatedMicroscope()
+    cache = PropertyCache(microscope, ttl=0)
+
+    path = property_cache.beam_property("electron_beam", "horizontal_field_width")
+    cache.read(path)
+    cache.read(path)
+    assert cache.stats == {"reads": 2, "hits": 0, "writes": 0, "invalidations": 0}
+
+
+def test_read_many_concurrent():
+
+    microscope = SimulatedMicroscope()
+    cache = PropertyCache(microscope, max_workers=4)
+
+    paths = [property_cache.beam_property("ion_beam", name) for name in property_cache.BEAM_PROPERTIES]
+    values = cache.read_many(paths)
+
+    assert list(values) == paths
+    assert values[property_cache.beam_property("ion_beam", "scanning.resolution")] == "1536x1024"
+
+    cache.invalidate("beams.ion_beam.scanning")
+    assert cache.stats["invalidations"] == 2
+
+
+def test_read_during_write_is_not_cached():
+
+    microscope = SimulatedMicroscope()
+    cache = PropertyCache(microscope, ttl=60)
+    path = property_cache.beam_property("electron_beam", "horizontal_field_width")
+
+    def _read_then_write():
+        value = microscope.beams.electron_beam.horizontal_field_width.value
+        cache.write(path, 50e-6)  # written (and invalidated) while the read is in progress
+        return value
+
+    assert cache.get(path, _read_then_write) != 50e-6
+    assert cache.read(path) == 50e-6
+
+    # invalidating a prefix also discards the value being read
+    prefix = property_cache.beam_property("electron_beam", "")[:-1]
+    cache.get(path, lambda: cache.invalidate(prefix) or 1.0)
+    assert cache.read(path) == 50e-6
@@ -0,0 +1,113 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from autoscript_sdb_microscope_client.structures import StagePosition
+
+from fibsem import acquire, calibration, milling, movement, utils
+from fibsem.simulator import SimulatedMicroscope, SimulatorSettings
+from fibsem.structures import BeamType, GammaSettings, ImageSettings
+
+
+def _image_settings(beam_type=BeamType.ELECTRON, resolution="768x512"):
+    return ImageSettings(
+        resolution=resolution,
+        dwell_time=1e-6,
+        hfw=100e-6,
+        autocontrast=False,
+        beam_type=beam_type,
+        save=False,
+        label="sim",
+        gamma=GammaSettings(),
+    )
+
+
+def test_new_image():
+
+    microscope = utils.connect_to_microscope(simulate=True)
+    assert isinstance(microscope, SimulatedMicroscope)
+
+    eb_image = acquire.new_image(microscope, _image_settings(BeamType.ELECTRON))
+    ib_image = acquire.new_image(microscope, _image_settings(BeamType.ION))
+
+    assert eb_image.data.shape == (512, 768)
+    assert eb_image.data.dtype == np.uint8
+    assert eb_image.metadata.acquisition.beam_type == "Electron"
+    assert ib_image.metadata.acquisition.beam_type == "Ion"
+    assert np.isclose(eb_image.metadata.binary_result.pixel_size.x, 100e-6 / 768)
+    assert microscope.beams.electron_beam.horizontal_field_width.value == 100e-6
+
+
+def test_images_follow_the_stage():
+
+    microscope = SimulatedMicroscope(SimulatorSettings(noise=0.0))
+    settings = _image_settings(resolution="384x256")
+
+    ref = acquire.new_image(microscope, settings)
+
+    # moving the stage by a whole number of pixels shifts the image
+    pixel_size = settings.hfw / 384
+    microscope.specimen.stage.relative_move(StagePosition(x=10 * pixel_size))
+    image = acquire.new_image(microscope, settings)
+
+    assert np.array_equal(image.data[:, :-10], ref.data[:, 10:])
+
+
+def test_move_stage_relative_with_corrected_movement():
+
+    microscope = SimulatedMicroscope()
+    settings = SimpleNamespace(
+        system=SimpleNamespace(
+            stage=SimpleNamespace(
+                tilt_flat_to_electron=27, tilt_flat_to_ion=52, rotation_flat_to_electron=49, rotation_flat_to_ion=229
+            )
+        )
+    )
+
+    movement.move_stage_relative_with_corrected_movement(microscope, settings, dx=10e-6, dy=0.0, beam_type=BeamType.ELECTRON)
+
+    assert np.isclose(microscope.specimen.stage.current_position.x, 10e-6)
+
+
+def test_run_milling():
+
+    microscope = SimulatedMicroscope(SimulatorSettings(noise=0.0))
+    settings = _image_settings(BeamType.ION, resolution="384x256")
+    ref = acquire.new_image(microscope, settings)
+
+    milling.setup_milling(microscope, application_file="Si", hfw=settings.hfw)
+    microscope.patterning.create_rectangle(center_x=0, center_y=0, width=20e-6, height=20e-6, depth=2e-6)
+    milling.run_milling(microscope, milling_current=2.0e-9)
+    milling.finish_milling(microscope)
+
+    assert microscope.patterning.patterns == []
+    assert microscope.beams.ion_beam.beam_current.value == 20e-12
+
+    # milled area is darker in the electron (brighter in the inverted ion) image
+    image = acquire.new_image(microscope, settings)
+    assert image.data[128, 192] > ref.data[128, 192]
+    assert np.array_equal(image.data[:10, :10], ref.data[:10, :10])
+
+
+def test_microscope_state():
+
+    microscope = SimulatedMicroscope()
+    state = calibration.get_current_microscope_state(microscope)
+
+    state.absolute_position = StagePosition(x=1e-3, y=2e-3, z=4e-3, r=0.0, t=0.0)
+    state.eb_settings.hfw = 300e-6
+    calibration.set_microscope_state(microscope, state)
+
+    new_state = calibration.get_current_microscope_state(microscope)
+    assert new_state.eb_settings.hfw == 300e-6
+    assert np.isclose(new_state.absolute_position.y, 2e-3)
+
+
+def test_latency():
+
+    microscope = SimulatedMicroscope(SimulatorSettings(property_latency=0.01))
+
+    t0 = time.perf_counter()
+    for _ in range(5):
+        microscope.beams.electron_beam.horizontal_field_width.value
+    assert time.perf_counter() - t0 >= 0.05
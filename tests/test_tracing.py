@@ -0,0 +1,117 @@
+import json
+import time
+
+import pytest
+
+from fibsem import acquire, tracing
+from fibsem.simulator import SimulatedMicroscope
+from fibsem.structures import BeamType, GammaSettings, ImageSettings
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.get_tracer()
+    tracer.clear()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.clear()
+
+
+def test_disabled_tracing_records_nothing():
+
+    tracer = tracing.get_tracer()
+    tracer.clear()
+    assert not tracing.is_enabled()
+
+    with tracing.span("outer") as span:
+        span.set(x=1)
+        tracing.annotate(y=2)
+
+    assert len(tracer.spans) == 0
+
+
+def test_nested_spans(tracer):
+
+    @tracing.traced("test")
+    def inner():
+        tracing.annotate(image_size=(512, 768))
+        time.sleep(0.01)
+
+    with tracing.span("outer", "test", beam_type=BeamType.ION):
+        inner()
+        inner()
+
+    spans = {span.name: span for span in tracer.spans}
+    assert [span.name for span in tracer.spans].count("test_tracing.test_nested_spans.<locals>.inner") == 2
+
+    outer = spans["outer"]
+    inner_span = spans["test_tracing.test_nested_spans.<locals>.inner"]
+    assert outer.depth == 0 and inner_span.depth == 1
+    assert inner_span.attrs["image_size"] == (512, 768)
+    assert outer.duration >= 0.02
+    assert outer.self_time < outer.duration
+
+    summary = {row["name"]: row for row in tracer.summary()}
+    assert summary["outer"]["count"] == 1
+    assert summary["test_tracing.test_nested_spans.<locals>.inner"]["count"] == 2
+
+
+def test_chrome_trace(tracer, tmp_path):
+
+    with tracing.span("outer", "test", beam_type=BeamType.ION):
+        with pytest.raises(ValueError):
+            with tracing.span("failing", "test"):
+                raise ValueError("error")
+
+    tracer.save(tmp_path)
+
+    with open(tmp_path / tracing.TRACE_FILENAME) as f:
+        trace = json.load(f)
+
+    events = {event["name"]: event for event in trace["traceEvents"] if event["ph"] == "X"}
+    assert events["outer"]["args"]["beam_type"] == "ION"
+    assert events["failing"]["args"]["error"] == "ValueError"
+    assert events["outer"]["ts"] <= events["failing"]["ts"]
+    assert events["outer"]["dur"] >= events["failing"]["dur"]
+    assert (tmp_path / tracing.SUMMARY_FILENAME).exists()
+
+
+def test_sessions_are_saved_separately(tracer, tmp_path):
+
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+
+    try:
+        tracing.start_session(first)
+        with tracing.span("first session"):
+            pass
+
+        tracing.start_session(second)
+        with tracing.span("second session"):
+            pass
+        tracing.save_session()
+        tracing.save_session()  # nothing left to save
+    finally:
+        tracing._session_path = None
+
+    for path, name in [(first, "first session"), (second, "second session")]:
+        with open(path / tracing.TRACE_FILENAME) as f:
+            trace = json.load(f)
+        assert [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"] == [name]
+
+
+def test_acquisition_spans(tracer):
+
+    microscope = SimulatedMicroscope()
+    settings = ImageSettings(
+        resolution="768x512", dwell_time=1e-6, hfw=100e-6, autocontrast=False,
+        beam_type=BeamType.ION, save=False, label="test", gamma=GammaSettings(),
+    )
+    acquire.new_image(microscope, settings)
+
+    spans = {span.name: span for span in tracer.spans}
+    assert spans["acquire.new_image"].attrs["beam_type"] == "ION"
+    assert spans["acquire.acquire_image"].attrs["image_size"] == (512, 768)
+    assert spans["acquire.acquire_image"].depth == 1
@@ -8,4 +8,64 @@ def test_load_protocol():
 
 def test_load_settings_from_config():
 
-    return
\ No newline at end of file
+    return
+
+class _Image:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def save(self, path):
+        import time
+        time.sleep(self.delay)
+        with open(path, "w") as f:
+            f.write("image")
+
+
+def test_image_writer(tmp_path):
+    from fibsem import utils
+
+    writer = utils.ImageWriter(max_queue_size=2, batch_size=4)
+    for i in range(10):
+        save_path = tmp_path / f"dir_{i % 2}"
+        writer.save(_Image(delay=0.001), save_path, label=f"image_{i}")
+    writer.flush()
+
+    stats = writer.stats()
+    assert stats["written"] == 10
+    assert stats["errors"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] <= 2
+    assert len(list(tmp_path.glob("dir_*/*.tif"))) == 10
+
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.save(_Image(), tmp_path, label="closed")
+
+
+def test_image_writer_errors(tmp_path):
+    import threading
+
+    from fibsem import utils
+
+    # the save directory can't be created (a file exists at the path)
+    blocked = tmp_path / "blocked"
+    blocked.write_text("")
+
+    writer = utils.ImageWriter(max_queue_size=2, batch_size=4)
+    writer.save(_Image(), blocked / "dir", label="image_0")
+    writer.save(_Image(), tmp_path / "dir", label="image_1")
+    writer.flush()
+
+    stats = writer.stats()
+    assert stats["errors"] == 1
+    assert stats["written"] == 1
+    assert writer._thread.is_alive()
+
+    # images are saved synchronously if the writer thread has stopped
+    writer._thread = threading.Thread(target=lambda: None)
+    writer._thread.start()
+    writer._thread.join()
+    writer.save(_Image(), tmp_path / "dir", label="image_2")
+
+    assert (tmp_path / "dir" / "image_2.tif").exists()
+    assert writer.stats()["written"] == 2
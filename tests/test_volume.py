@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from autoscript_sdb_microscope_client.structures import StagePosition
+
+from fibsem import volume
+from fibsem.structures import BeamType
+
+
+def test_volume_store_append_and_read(tmp_path):
+
+    path = tmp_path / "volume.zarr"
+    store = volume.VolumeStore(path, chunks=(1, 16, 16))
+
+    rng = np.random.default_rng(0)
+    slices = [rng.integers(0, 255, size=(40, 60), dtype=np.uint8) for _ in range(5)]
+    for i, img in enumerate(slices):
+        position = StagePosition(x=i * 1e-6, y=0, z=0, r=0, t=0)
+        assert store.append(img, BeamType.ELECTRON, stage_position=position, timestamp=i) == i
+    store.append(slices[0], BeamType.ION)
+
+    assert len(store) == 5
+    assert store.n_slices(BeamType.ION) == 1
+    assert store.beam_types() == [BeamType.ELECTRON, BeamType.ION]
+
+    # read back lazily
+    reader = volume.open_volume(path)
+    stack = reader.stack(BeamType.ELECTRON)
+    assert stack.shape == (5, 40, 60)
+    assert stack.chunks == (1, 16, 16)
+    assert np.array_equal(stack[3], slices[3])
+    assert np.array_equal(stack[:, 10, 20], [img[10, 20] for img in slices])
+
+    metadata = reader.metadata(BeamType.ELECTRON)
+    assert np.array_equal(metadata["timestamp"], np.arange(5))
+    assert np.allclose(metadata["stage_x"], np.arange(5) * 1e-6)
+    assert np.all(np.isnan(metadata["hfw"]))
+
+
+def test_volume_store_shape_mismatch(tmp_path):
+
+    store = volume.VolumeStore(tmp_path / "volume.zarr")
+    store.append(np.zeros((32, 32), dtype=np.uint8), BeamType.ELECTRON)
+
+    with pytest.raises(ValueError):
+        store.append(np.zeros((32, 16), dtype=np.uint8), BeamType.ELECTRON)
+
+    with pytest.raises(ValueError):
+        store.append(np.zeros((32, 32), dtype=np.uint8))